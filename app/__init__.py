@@ -1,10 +1,27 @@
 # app/__init__.py
 
 from flask import Flask
-from app.models import close_db, get_publications_by_lecturer, get_all_lecturers
+import time
+from app.models import close_db, init_db
+from app.telemetry import init_telemetry
+from app.profiler import init_profiler
+from app.provisioning import provision_users_command
+from app.viewmodels import init_viewmodels
+from app.startup import init_template_cache, finish_startup
+from app.assets import init_assets
+from app.compression import init_compression
+from app.writer import init_writer
+from app.memo import init_memo
+from app.denorm import check_authors_command
+from app.analytics import rebuild_cube_command
+from app.deadlines import check_deadlines_command, init_deadlines
+from app.mailer import init_mailer, send_mail_command
+from app.logarchive import archive_logs_command, init_log_archive
+from app.background import init_background
 import os
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__, static_folder='static', template_folder='templates')
     app.config.from_pyfile(os.path.join(os.path.dirname(__file__), '..', 'config.py'))
     app.secret_key = app.config.get('SECRET_KEY', 'default_secret_key')
@@ -21,15 +38,53 @@ def create_app():
     # Ограничение размера загружаемого файла (например, 16 МБ)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+    # Журнал WAL: читатели (соединения только для чтения) не ждут писателей
+    init_db(wal=app.config.get('DB_WAL', True))
+    # Записи запроса фиксируются одним коммитом в конце запроса
+    init_writer(app)
+    # Повторные чтения моделей в запросе — из памяти запроса
+    init_memo(app)
+
+    # Сбор метрик (/metrics) — до blueprint'а, чтобы замерять и его хуки
+    init_telemetry(app)
+    # Сжатие ответов; регистрируется после телеметрии, чтобы та видела
+    # размер уже сжатого тела (after_request вызываются в обратном порядке)
+    init_compression(app)
+
     # Регистрация blueprint'а
     from app.routes import bp
     app.register_blueprint(bp)
 
+    # Профилирование отдельных запросов (после blueprint'а: нужен g.user)
+    init_profiler(app, base_dir)
+
+    # Команды flask CLI
+    app.cli.add_command(provision_users_command)
+    app.cli.add_command(check_authors_command)
+    app.cli.add_command(rebuild_cube_command)
+    app.cli.add_command(check_deadlines_command)
+    app.cli.add_command(send_mail_command)
+    app.cli.add_command(archive_logs_command)
+
+    # Фоновые задачи (рассылка из outbox, планировщик сроков, архивация журнала) —
+    # потоки запускаются в каждом процессе при первом запросе
+    init_background(app)
+    init_mailer(app)
+    init_deadlines(app)
+    init_log_archive(app)
+
     # Автоматическое закрытие соединения с БД
     app.teardown_appcontext(close_db)
 
-    # Делаем функции доступными во всех шаблонах
-    app.jinja_env.globals['get_publications_by_lecturer'] = get_publications_by_lecturer
-    app.jinja_env.globals['get_all_lecturers'] = get_all_lecturers
+    # Шаблоны получают данные от обработчиков (app/viewmodels.py),
+    # а не обращаются к БД сами; строгий режим это проверяет
+    init_viewmodels(app)
+
+    # Статика с отпечатками и заранее сжатыми вариантами (flask build-assets)
+    init_assets(app)
+
+    # Кэш байткода шаблонов и (по настройке) их предкомпиляция
+    init_template_cache(app, base_dir)
+    finish_startup(app, started)
 
     return app
@@ -0,0 +1,349 @@
+# app/analytics.py
+
+"""
+Аналитический куб публикаций: кафедра × год × источник × статус.
+
+Таблица analytics_cube хранит число публикаций и сумму цитирований для
+каждой комбинации измерений и поддерживается триггерами: перед изменением
+публикации, её связей с авторами или кафедры преподавателя вклад
+затронутых публикаций вычитается, после — добавляется заново. Публикация
+учитывается один раз в каждой кафедре своих авторов и один раз в строке
+кафедры ALL ('*'), поэтому итоги без разбивки по кафедрам точные.
+
+Любой срез или свёртка считается только по кубу: cube_slice() отвечает из
+снимка куба в памяти (на NumPy, если он установлен), который обновляется
+при смене версии данных в data_versions.
+"""
+
+import threading
+from collections import OrderedDict
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен — тогда агрегируем на чистом Python
+    np = None
+
+from app.telemetry import record_cache
+
+DIMENSIONS = ('department', 'year', 'source', 'status')
+MEASURES = ('publications', 'citations')
+# Строка «все кафедры»: публикация с авторами из разных кафедр учитывается в ней один раз
+ALL_DEPARTMENTS = '*'
+
+
+# ==== Схема и триггеры ====
+
+# Добавить (sign=1) или вычесть (sign=-1) вклад публикаций из {pubs};
+# публикации без авторов попадают в кафедру с пустым названием. Год
+# приводится к целому: нечисловой год (TEXT в publications.year) не должен
+# попасть в куб строкой — значения измерения сортируются в CubeSnapshot
+_CONTRIBUTION_SQL = """
+    INSERT INTO analytics_cube (department, year, source, status, publications, citations)
+    SELECT d.department, COALESCE(CAST(p.year AS INTEGER), 0), COALESCE(p.source, ''), COALESCE(p.status, ''),
+           {sign}, {sign} * COALESCE(CAST(p.citations AS INTEGER), 0)
+    FROM (
+        SELECT lp.publication_id AS pid, COALESCE(l.department, '') AS department
+        FROM lecturer_publications lp JOIN lecturers l ON l.id = lp.lecturer_id
+        WHERE lp.publication_id IN ({pubs})
+        UNION
+        SELECT id, '*' FROM publications WHERE id IN ({pubs})
+        UNION
+        SELECT id, '' FROM publications
+        WHERE id IN ({pubs})
+          AND NOT EXISTS (SELECT 1 FROM lecturer_publications lp WHERE lp.publication_id = publications.id)
+    ) d JOIN publications p ON p.id = d.pid
+    WHERE 1
+    ON CONFLICT (department, year, source, status) DO UPDATE SET
+        publications = analytics_cube.publications + excluded.publications,
+        citations = analytics_cube.citations + excluded.citations
+"""
+
+_BUMP_SQL = "UPDATE data_versions SET version = version + 1 WHERE name = 'analytics'"
+# Ячейки, вклад в которые полностью вычтен, удаляются, чтобы не копиться в кубе
+_PRUNE_SQL = "DELETE FROM analytics_cube WHERE publications = 0 AND citations = 0"
+
+
+def _delta_triggers(name, event, table, pubs, when=''):
+    """Пара триггеров: BEFORE вычитает вклад публикаций, AFTER добавляет заново."""
+    subtract = _CONTRIBUTION_SQL.format(sign=-1, pubs=pubs)
+    add = _CONTRIBUTION_SQL.format(sign=1, pubs=pubs)
+    return {
+        name + '_before': 'CREATE TRIGGER %s_before BEFORE %s ON %s %s BEGIN %s; END'
+                          % (name, event, table, when, subtract),
+        name + '_after': 'CREATE TRIGGER %s_after AFTER %s ON %s %s BEGIN %s; %s; %s; END'
+                         % (name, event, table, when, add, _PRUNE_SQL, _BUMP_SQL),
+    }
+
+
+TRIGGERS = {}
+TRIGGERS.update(_delta_triggers('trg_cube_lp_insert', 'INSERT', 'lecturer_publications', 'NEW.publication_id'))
+TRIGGERS.update(_delta_triggers('trg_cube_lp_delete', 'DELETE', 'lecturer_publications', 'OLD.publication_id'))
+TRIGGERS.update(_delta_triggers('trg_cube_lp_update', 'UPDATE', 'lecturer_publications',
+                                'OLD.publication_id, NEW.publication_id'))
+TRIGGERS.update(_delta_triggers('trg_cube_pub_update', 'UPDATE OF year, source, status, citations',
+                                'publications', 'NEW.id'))
+TRIGGERS.update(_delta_triggers(
+    'trg_cube_lecturer_department', 'UPDATE OF department', 'lecturers',
+    'SELECT publication_id FROM lecturer_publications WHERE lecturer_id = NEW.id',
+    'WHEN NEW.department IS NOT OLD.department'))
+TRIGGERS['trg_cube_pub_insert'] = (
+    'CREATE TRIGGER trg_cube_pub_insert AFTER INSERT ON publications BEGIN %s; %s; END'
+    % (_CONTRIBUTION_SQL.format(sign=1, pubs='NEW.id'), _BUMP_SQL))
+# Связи удаляемой публикации удаляются каскадно уже после самой строки,
+# поэтому её вклад целиком вычитается здесь
+TRIGGERS['trg_cube_pub_delete'] = (
+    'CREATE TRIGGER trg_cube_pub_delete BEFORE DELETE ON publications BEGIN %s; END'
+    % _CONTRIBUTION_SQL.format(sign=-1, pubs='OLD.id'))
+# При удалении преподавателя каскад срабатывает, когда его строки уже нет
+# и кафедру не узнать, — поэтому связи удаляются заранее, пока она известна
+TRIGGERS['trg_cube_lecturer_delete'] = (
+    'CREATE TRIGGER trg_cube_lecturer_delete BEFORE DELETE ON lecturers BEGIN '
+    'DELETE FROM lecturer_publications WHERE lecturer_id = OLD.id; END')
+TRIGGERS['trg_cube_pub_delete_version'] = (
+    'CREATE TRIGGER trg_cube_pub_delete_version AFTER DELETE ON publications BEGIN %s; %s; END'
+    % (_PRUNE_SQL, _BUMP_SQL))
+
+
+def rebuild_cube(db):
+    """Пересчитать куб целиком по исходным таблицам."""
+    db.execute("DELETE FROM analytics_cube")
+    db.execute(_CONTRIBUTION_SQL.format(sign=1, pubs='SELECT id FROM publications'))
+    db.execute(_PRUNE_SQL)
+    db.execute(_BUMP_SQL)
+
+
+def install_analytics_cube(db):
+    """Миграция: таблицы куба и версий данных, триггеры, первоначальный расчёт."""
+    db.execute("""
+        CREATE TABLE data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    db.execute("INSERT INTO data_versions (name, version) VALUES ('analytics', 0)")
+    db.execute("""
+        CREATE TABLE analytics_cube (
+            department TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            publications INTEGER NOT NULL DEFAULT 0,
+            citations INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department, year, source, status)
+        ) WITHOUT ROWID
+    """)
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+    rebuild_cube(db)
+
+
+def reinstall_cube_triggers(db):
+    """Миграция: пересоздать триггеры куба по текущему TRIGGERS и пересчитать куб."""
+    for name in TRIGGERS:
+        db.execute("DROP TRIGGER IF EXISTS %s" % name)
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+    rebuild_cube(db)
+
+
+def data_version(db, name):
+    row = db.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+# ==== Запросы к кубу ====
+
+def _check_slice(by, filters):
+    for dim in tuple(by) + tuple(filters):
+        if dim not in DIMENSIONS:
+            raise ValueError('Неизвестное измерение куба: %s' % dim)
+
+
+def _departments_rule(by, filters):
+    """Без разбивки и фильтра по кафедре берём строку ALL, иначе — реальные кафедры."""
+    return 'department' in by or 'department' in filters
+
+
+def query_cube(db, by=(), **filters):
+    """
+    Срез куба средствами SQL: группировка по измерениям by, фильтры
+    измерение=значение. Возвращает список словарей (измерения + меры).
+    """
+    by = tuple(by)
+    _check_slice(by, filters)
+    where, params = [], []
+    if _departments_rule(by, filters):
+        where.append("department != ?")
+    else:
+        where.append("department = ?")
+    params.append(ALL_DEPARTMENTS)
+    for dim, value in sorted(filters.items()):
+        where.append("%s = ?" % dim)
+        params.append(value)
+    columns = ', '.join(by + ('SUM(publications) AS publications', 'SUM(citations) AS citations'))
+    sql = "SELECT %s FROM analytics_cube WHERE %s" % (columns, ' AND '.join(where))
+    if by:
+        sql += " GROUP BY %s HAVING SUM(publications) > 0 ORDER BY %s" % (', '.join(by), ', '.join(by))
+    rows = [dict(row) for row in db.execute(sql, params).fetchall()]
+    if not by and rows and rows[0]['publications'] is None:
+        rows = [{'publications': 0, 'citations': 0}]
+    return rows
+
+
+class CubeSnapshot:
+    """
+    Копия куба в памяти. Измерения закодированы целыми числами, меры —
+    массивы int64; срез — маска и группировка по кодам (bincount).
+    Без NumPy — те же операции над списками.
+    """
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.size = len(rows)
+        self.labels = {}  # измерение -> список значений (код = индекс)
+        self.index = {}   # измерение -> {значение: код}
+        codes = {}
+        for i, dim in enumerate(DIMENSIONS):
+            labels = sorted({row[i] for row in rows})
+            self.labels[dim] = labels
+            self.index[dim] = {label: code for code, label in enumerate(labels)}
+            codes[dim] = [self.index[dim][row[i]] for row in rows]
+        measures = {name: [row[len(DIMENSIONS) + i] for row in rows] for i, name in enumerate(MEASURES)}
+        if np is not None:
+            codes = {dim: np.asarray(values, dtype=np.int64) for dim, values in codes.items()}
+            measures = {name: np.asarray(values, dtype=np.int64) for name, values in measures.items()}
+        self.codes = codes
+        self.measures = measures
+
+    def _mask(self, by, filters):
+        """Номера строк (или булева маска), попадающих в срез; None — срез пуст."""
+        conditions = []
+        all_code = self.index['department'].get(ALL_DEPARTMENTS)
+        if all_code is not None:
+            conditions.append(('department', all_code, not _departments_rule(by, filters)))
+        for dim, value in filters.items():
+            code = self.index[dim].get(value)
+            if code is None:
+                return None
+            conditions.append((dim, code, True))
+        if np is not None:
+            mask = np.ones(self.size, dtype=bool)
+            for dim, code, equal in conditions:
+                mask &= (self.codes[dim] == code) if equal else (self.codes[dim] != code)
+            return mask
+        return [
+            i for i in range(self.size)
+            if all((self.codes[dim][i] == code) == equal for dim, code, equal in conditions)
+        ]
+
+    def query(self, by=(), **filters):
+        by = tuple(by)
+        _check_slice(by, filters)
+        mask = self._mask(by, filters)
+        if mask is None:
+            return [] if by else [{'publications': 0, 'citations': 0}]
+        if np is not None:
+            return self._query_numpy(by, mask)
+        groups = {}
+        for i in mask:
+            key = tuple(self.codes[dim][i] for dim in by)
+            acc = groups.setdefault(key, [0, 0])
+            acc[0] += self.measures['publications'][i]
+            acc[1] += self.measures['citations'][i]
+        if not by:
+            publications, citations = groups.get((), (0, 0))
+            return [{'publications': publications, 'citations': citations}]
+        return self._rows(by, sorted(groups.items()))
+
+    def _query_numpy(self, by, mask):
+        publications = self.measures['publications'][mask]
+        citations = self.measures['citations'][mask]
+        if not by:
+            return [{'publications': int(publications.sum()), 'citations': int(citations.sum())}]
+        keys = np.stack([self.codes[dim][mask] for dim in by], axis=1)
+        if not len(keys):
+            return []
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        pub_sums = np.bincount(inverse, weights=publications, minlength=len(unique))
+        cit_sums = np.bincount(inverse, weights=citations, minlength=len(unique))
+        groups = [
+            (tuple(int(c) for c in key), (int(p), int(s)))
+            for key, p, s in zip(unique, pub_sums, cit_sums)
+        ]
+        return self._rows(by, groups)
+
+    def _rows(self, by, groups):
+        rows = []
+        for key, (publications, citations) in groups:
+            if publications <= 0:
+                continue
+            row = {dim: self.labels[dim][code] for dim, code in zip(by, key)}
+            row['publications'] = publications
+            row['citations'] = citations
+            rows.append(row)
+        return rows
+
+
+_snapshot = {'cube': None}
+_slices = OrderedDict()  # (версия, by, фильтры) -> результат, LRU
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(db):
+    """Снимок куба для текущей версии данных (перечитывается после изменений)."""
+    version = data_version(db, 'analytics')
+    cube = _snapshot['cube']
+    if cube is not None and cube.version == version:
+        return cube
+    with _snapshot_lock:
+        cube = _snapshot['cube']
+        if cube is None or cube.version != version:
+            rows = db.execute(
+                "SELECT department, year, source, status, publications, citations FROM analytics_cube"
+            ).fetchall()
+            cube = _snapshot['cube'] = CubeSnapshot([tuple(row) for row in rows], version)
+            _slices.clear()
+    return cube
+
+
+def cube_slice(db, by=(), **filters):
+    """
+    Срез куба (см. query_cube). Отвечает из снимка в памяти, последние
+    ANALYTICS_SLICE_CACHE срезов запоминаются до следующего изменения данных.
+    Каждый вызывающий получает свои копии строк.
+    """
+    if has_app_context() and not current_app.config.get('ANALYTICS_IN_MEMORY', True):
+        return query_cube(db, by, **filters)
+    cube = get_snapshot(db)
+    key = (cube.version, tuple(by), tuple(sorted(filters.items())))
+    with _snapshot_lock:
+        rows = _slices.get(key)
+        if rows is not None:
+            _slices.move_to_end(key)
+    record_cache('analytics_slice', rows is not None)
+    if rows is None:
+        rows = cube.query(by, **filters)
+        # Фильтры приходят из запроса, поэтому кэш ограничен по числу срезов
+        limit = current_app.config.get('ANALYTICS_SLICE_CACHE', 256) if has_app_context() else 256
+        with _snapshot_lock:
+            _slices[key] = rows
+            while len(_slices) > limit:
+                _slices.popitem(last=False)
+    return [dict(row) for row in rows]
+
+
+@click.command('rebuild-cube')
+@with_appcontext
+def rebuild_cube_command():
+    """Пересчитать аналитический куб по исходным таблицам."""
+    from app.models import get_db
+    from app.writer import run_write
+
+    run_write(lambda: rebuild_cube(get_db()))
+    click.echo('Куб пересчитан, строк: %d' % get_db(write=False).execute(
+        "SELECT COUNT(*) FROM analytics_cube").fetchone()[0])
@@ -0,0 +1,183 @@
+# app/assets.py
+
+"""
+Сборка статических файлов: минификация, отпечатки содержимого в именах
+и заранее сжатые варианты (.gz и, если установлен пакет brotli, .br).
+
+Сборка (``flask build-assets``) складывает файлы в static/dist и пишет
+manifest.json. Если манифест есть, url_for('static', filename='css/style.css')
+выдаёт имя с отпечатком, а такие файлы отдаются с бессрочным кэшированием
+и в сжатом виде согласно Accept-Encoding.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен — тогда собираем только .gz
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Какие файлы собирать: все .css и .js из static, кроме самой сборки
+ASSET_EXTENSIONS = ('.css', '.js')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+# Строки CSS в кавычках и комментарии: строки переносятся как есть
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    # Пробел перед «:» не трогаем: «.nav :hover» и «.nav:hover» — разные селекторы
+    code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+    return code.replace(';}', '}')
+
+
+def minify_css(text):
+    parts = []
+    pos = 0
+    for match in _CSS_TOKENS.finditer(text):
+        parts.append(_minify_css_code(text[pos:match.start()]))
+        # Комментарий заменяется пробелом, строка остаётся без изменений
+        parts.append(match.group(1) or ' ')
+        pos = match.end()
+    parts.append(_minify_css_code(text[pos:]))
+    return re.sub(r' {2,}', ' ', ''.join(parts)).strip()
+
+
+def minify_js(text):
+    """
+    Консервативно: убираем отступы, пустые строки и комментарии, целиком
+    занимающие строки, но сохраняем переводы строк (автовставка «;»).
+    Файлы с шаблонными строками (`...`) не трогаем: в них важны и отступы,
+    и строки, похожие на комментарии.
+    """
+    if '`' in text:
+        return text
+    lines = []
+    comment = None  # строки незакрытого /* ... */, начатого с начала строки
+    for line in text.splitlines():
+        line = line.strip()
+        if comment is not None:
+            comment.append(line)
+            end = line.find('*/')
+            if end != -1:
+                # Код после «*/» — комментарий не целиком на строках, оставляем всё
+                if line[end + 2:].strip():
+                    lines.extend(comment)
+                comment = None
+            continue
+        if line.startswith('/*'):
+            end = line.find('*/', 2)
+            if end == -1:
+                comment = [line]
+                continue
+            if not line[end + 2:].strip():
+                continue
+        if line and not line.startswith('//'):
+            lines.append(line)
+    if comment:
+        lines.extend(comment)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def build_assets(static_folder):
+    """Собрать статические файлы. Возвращает манифест {исходное имя: имя сборки}."""
+    manifest = {}
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_root)):
+            continue
+        for name in sorted(files):
+            base, ext = os.path.splitext(name)
+            if ext not in ASSET_EXTENSIONS:
+                continue
+            source = os.path.join(root, name)
+            rel = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            target_rel = '%s/%s.%s%s' % (DIST_DIR, rel[:-len(ext)], digest, ext)
+            target = os.path.join(static_folder, target_rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[rel] = target_rel
+    with open(os.path.join(dist_root, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _static_url_defaults(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        manifest = current_app.extensions.get('asset_manifest') or {}
+        values['filename'] = manifest.get(values['filename'], values['filename'])
+
+
+def _serve_static(filename):
+    """Отдача статики: файлы сборки — сжатыми и с бессрочным кэшированием."""
+    app = current_app
+    if not filename.startswith(DIST_DIR + '/'):
+        return app.send_static_file(filename)
+    folder = app.static_folder
+    encoding = None
+    for candidate in ('br', 'gzip'):
+        suffix = '.br' if candidate == 'br' else '.gz'
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(folder, filename + suffix)):
+            encoding = candidate
+            break
+    if encoding:
+        response = send_from_directory(folder, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetypes.guess_type(filename)[0], max_age=31536000)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(folder, filename, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Минифицировать статику, добавить отпечатки и сжатые варианты."""
+    manifest = build_assets(current_app.static_folder)
+    for source, target in sorted(manifest.items()):
+        click.echo('%s -> %s' % (source, target))
+    if brotli is None:
+        click.echo('Пакет brotli не установлен: собраны только .gz-варианты', err=True)
+
+
+def init_assets(app):
+    """Подключить манифест сборки, url_for-подстановку и отдачу сжатых файлов."""
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.url_defaults(_static_url_defaults)
+    app.view_functions['static'] = _serve_static
+    app.cli.add_command(build_assets_command)
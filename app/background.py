@@ -0,0 +1,114 @@
+# app/background.py
+
+"""
+Периодические фоновые задачи процесса (рассылка писем, планировщик
+сроков и т. п.).
+
+Задача регистрируется при создании приложения (register_periodic), а
+поток для неё запускается лениво — при первом запросе в каждом процессе:
+потоки не переживают fork, поэтому воркеры serve.py запускают свои, а
+мастер до fork не запускает ни одного. Задача выполняется в контексте
+приложения раз в interval секунд или сразу после wake(name).
+"""
+
+import os
+import random
+import threading
+
+from app.telemetry import inc
+
+
+class PeriodicTask:
+    """Поток, вызывающий fn() раз в interval секунд (с небольшим разбросом)."""
+
+    def __init__(self, app, name, interval, fn):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='bg-' + name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Разброс, чтобы воркеры, запущенные одновременно, не работали в такт
+            self._wake.wait(self.interval * random.uniform(0.9, 1.1))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                self.fn()
+            except Exception:
+                inc('background_errors_total', task=self.name)
+                self.app.logger.exception('Фоновая задача %s завершилась ошибкой', self.name)
+            else:
+                inc('background_runs_total', task=self.name)
+
+
+_state = {'pid': None, 'tasks': {}}
+_state_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Потоки родителя в дочернем процессе не существуют
+    _state['pid'] = None
+    _state['tasks'] = {}
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def register_periodic(app, name, interval, fn):
+    """Зарегистрировать задачу (interval <= 0 — не запускать)."""
+    if interval and interval > 0:
+        app.extensions.setdefault('background', {})[name] = (interval, fn)
+
+
+def ensure_started(app):
+    """Запустить потоки зарегистрированных задач в текущем процессе (один раз)."""
+    if _state['pid'] == os.getpid():
+        return
+    with _state_lock:
+        if _state['pid'] == os.getpid():
+            return
+        tasks = {}
+        for name, (interval, fn) in app.extensions.get('background', {}).items():
+            tasks[name] = PeriodicTask(app, name, interval, fn)
+            tasks[name].start()
+        _state['tasks'] = tasks
+        _state['pid'] = os.getpid()
+
+
+def wake(name):
+    """Выполнить задачу name в этом процессе без ожидания интервала (если она запущена)."""
+    task = _state['tasks'].get(name)
+    if task is not None and _state['pid'] == os.getpid():
+        task.wake()
+
+
+def stop_all(timeout=None):
+    for task in list(_state['tasks'].values()):
+        task.stop(timeout)
+    _state['tasks'] = {}
+    _state['pid'] = None
+
+
+def init_background(app):
+    """Фоновые задачи стартуют с первым запросом процесса."""
+    app.before_request(lambda: ensure_started(app))
@@ -0,0 +1,254 @@
+# app/coauthors.py
+
+"""
+Граф соавторства преподавателей.
+
+Из lecturer_publications строится разреженная матрица инцидентности
+A (преподаватель × публикация), а из неё — взвешенная матрица
+сотрудничества C = A·Aᵀ без диагонали: C[i, j] — число совместных
+публикаций. По ней считаются степень (число соавторов), взвешенная
+степень, центральность (степенная и по собственному вектору), компоненты
+связности и число совместных публикаций между кафедрами.
+
+SciPy необязателен: без него те же величины считаются по спискам авторов
+публикаций (пары соавторов, система непересекающихся множеств). Результат
+кэшируется до смены версии данных 'links'.
+"""
+
+import threading
+from collections import defaultdict
+
+from flask import current_app, has_app_context
+
+try:
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+except ImportError:  # SciPy необязателен — тогда считаем на чистом Python
+    sparse = None
+
+from app.analytics import data_version
+from app.telemetry import record_cache
+
+_BUMP_SQL = "UPDATE data_versions SET version = version + 1 WHERE name = 'links'"
+
+# Связи и кафедры/ФИО преподавателей увеличивают версию 'links'
+TRIGGERS = {
+    'trg_version_links_insert':
+        "CREATE TRIGGER trg_version_links_insert AFTER INSERT ON lecturer_publications "
+        "BEGIN %s; END" % _BUMP_SQL,
+    'trg_version_links_update':
+        "CREATE TRIGGER trg_version_links_update AFTER UPDATE ON lecturer_publications "
+        "BEGIN %s; END" % _BUMP_SQL,
+    'trg_version_links_delete':
+        "CREATE TRIGGER trg_version_links_delete AFTER DELETE ON lecturer_publications "
+        "BEGIN %s; END" % _BUMP_SQL,
+    'trg_version_links_lecturer':
+        "CREATE TRIGGER trg_version_links_lecturer AFTER UPDATE OF fio, department ON lecturers "
+        "WHEN NEW.fio IS NOT OLD.fio OR NEW.department IS NOT OLD.department "
+        "BEGIN %s; END" % _BUMP_SQL,
+    'trg_version_links_lecturer_insert':
+        "CREATE TRIGGER trg_version_links_lecturer_insert AFTER INSERT ON lecturers "
+        "BEGIN %s; END" % _BUMP_SQL,
+    'trg_version_links_lecturer_delete':
+        "CREATE TRIGGER trg_version_links_lecturer_delete AFTER DELETE ON lecturers "
+        "BEGIN %s; END" % _BUMP_SQL,
+}
+
+
+def install_links_version(db):
+    """Миграция: версия данных 'links' и триггеры, её увеличивающие."""
+    db.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('links', 0)")
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+
+
+# ==== Вычисления ====
+
+def _compute_sparse(n, links, departments, iterations, tolerance):
+    """links: пары (индекс преподавателя, id публикации); departments: индекс кафедры каждого."""
+    rows = np.fromiter((i for i, _ in links), dtype=np.int64, count=len(links))
+    pub_ids = np.fromiter((p for _, p in links), dtype=np.int64, count=len(links))
+    _, cols = np.unique(pub_ids, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(links)), (rows, cols.ravel())), shape=(n, int(cols.max()) + 1 if len(links) else 0))
+    collab = (incidence @ incidence.T).tocsr()
+    collab.setdiag(0)
+    collab.eliminate_zeros()
+
+    degree = np.diff(collab.indptr)
+    weighted = np.asarray(collab.sum(axis=1)).ravel()
+    eigen = np.ones(n)
+    for _ in range(iterations):
+        # (C + I)·x — сдвиг избавляет от колебаний на двудольных компонентах
+        step = collab @ eigen + eigen
+        step /= step.max()
+        done = np.abs(step - eigen).max() < tolerance
+        eigen = step
+        if done:
+            break
+    eigen[degree == 0] = 0.0
+    _, labels = connected_components(collab, directed=False)
+
+    # Совместные публикации между кафедрами: Dᵀ·C·D по индикаторной матрице кафедр
+    dep_count = max(departments) + 1 if departments else 0
+    indicator = sparse.csr_matrix((np.ones(n), (np.arange(n), departments)), shape=(n, dep_count))
+    between = (indicator.T @ collab @ indicator).toarray()
+    pairs = {}
+    for a, b in zip(*np.nonzero(np.triu(between))):
+        # Пары внутри одной кафедры посчитаны дважды (i, j и j, i)
+        pairs[(int(a), int(b))] = int(round(between[a, b] / (2 if a == b else 1)))
+
+    neighbours = [
+        list(zip(collab.indices[collab.indptr[i]:collab.indptr[i + 1]].tolist(),
+                 collab.data[collab.indptr[i]:collab.indptr[i + 1]].astype(int).tolist()))
+        for i in range(n)
+    ]
+    return degree.tolist(), weighted.astype(int).tolist(), eigen.tolist(), labels.tolist(), pairs, neighbours
+
+
+def _compute_python(n, links, departments, iterations, tolerance):
+    """То же на словарях: пары соавторов по каждой публикации."""
+    authors = defaultdict(list)
+    for i, pub_id in links:
+        authors[pub_id].append(i)
+    adjacency = [defaultdict(int) for _ in range(n)]
+    for members in authors.values():
+        for a in members:
+            for b in members:
+                if a != b:
+                    adjacency[a][b] += 1
+
+    degree = [len(adj) for adj in adjacency]
+    weighted = [sum(adj.values()) for adj in adjacency]
+
+    eigen = [1.0] * n
+    for _ in range(iterations):
+        step = [x + sum(w * eigen[j] for j, w in adj.items()) for x, adj in zip(eigen, adjacency)]
+        top = max(step)
+        step = [v / top for v in step]
+        done = max(abs(a - b) for a, b in zip(step, eigen)) < tolerance
+        eigen = step
+        if done:
+            break
+    eigen = [0.0 if not adj else x for x, adj in zip(eigen, adjacency)]
+
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for members in authors.values():
+        for b in members[1:]:
+            ra, rb = find(members[0]), find(b)
+            if ra != rb:
+                parent[rb] = ra
+    roots = {}
+    labels = [roots.setdefault(find(i), len(roots)) for i in range(n)]
+
+    pairs = defaultdict(int)
+    for a, adj in enumerate(adjacency):
+        for b, w in adj.items():
+            if a < b:
+                pairs[tuple(sorted((departments[a], departments[b])))] += w
+    neighbours = [sorted(adj.items()) for adj in adjacency]
+    return degree, weighted, eigen, labels, dict(pairs), neighbours
+
+
+class CoauthorGraph:
+    """Рассчитанный граф соавторства для одной версии данных."""
+
+    def __init__(self, lecturers, links, version, iterations=100, tolerance=1e-8):
+        self.version = version
+        self.lecturers = [row['id'] for row in lecturers]
+        self.fio = {row['id']: row['fio'] for row in lecturers}
+        self.department = {row['id']: row['department'] or '' for row in lecturers}
+        index = {lid: i for i, lid in enumerate(self.lecturers)}
+        self.departments = sorted(set(self.department.values()))
+        dep_index = {dep: i for i, dep in enumerate(self.departments)}
+        departments = [dep_index[self.department[lid]] for lid in self.lecturers]
+        links = [(index[lid], pub_id) for lid, pub_id in links if lid in index]
+
+        compute = _compute_sparse if sparse is not None else _compute_python
+        n = len(self.lecturers)
+        degree, weighted, eigen, labels, pairs, neighbours = (
+            compute(n, links, departments, iterations, tolerance) if n else ([], [], [], [], {}, []))
+
+        ids = self.lecturers
+        self._scores = {
+            lid: {
+                'degree': degree[i],
+                'weighted_degree': weighted[i],
+                'centrality': degree[i] / (n - 1) if n > 1 else 0.0,
+                'eigenvector': float(eigen[i]),
+                'component': labels[i],
+            }
+            for i, lid in enumerate(ids)
+        }
+        self._neighbours = {
+            lid: sorted(((ids[j], w) for j, w in neighbours[i]), key=lambda item: (-item[1], item[0]))
+            for i, lid in enumerate(ids)
+        }
+        members = defaultdict(list)
+        for i, label in enumerate(labels):
+            members[label].append(ids[i])
+        self._component_size = {label: len(c) for label, c in members.items()}
+        # Компоненты по убыванию размера; одиночки без соавторов — тоже компоненты
+        self.components = sorted(members.values(), key=lambda c: (-len(c), c[0]))
+        self.department_pairs = sorted(
+            ({'departments': (self.departments[a], self.departments[b]), 'joint': joint}
+             for (a, b), joint in pairs.items() if a != b and joint),
+            key=lambda p: (-p['joint'], p['departments']))
+        self.department_internal = {
+            self.departments[a]: joint for (a, b), joint in pairs.items() if a == b and joint}
+
+    def for_lecturer(self, lecturer_id):
+        """Показатели преподавателя и его соавторы [{'id', 'fio', 'joint'}] или None."""
+        scores = self._scores.get(lecturer_id)
+        if scores is None:
+            return None
+        return dict(
+            scores,
+            component_size=self._component_size[scores['component']],
+            coauthors=[{'id': lid, 'fio': self.fio[lid], 'joint': joint}
+                       for lid, joint in self._neighbours[lecturer_id]],
+        )
+
+    def summary(self):
+        """Сводка для отчётов: размеры компонент и связи между кафедрами."""
+        connected = [c for c in self.components if len(c) > 1]
+        return {
+            'lecturers': len(self.lecturers),
+            'isolated': len(self.components) - len(connected),
+            'components': [
+                {'size': len(c), 'members': [{'id': lid, 'fio': self.fio[lid]} for lid in c]}
+                for c in connected
+            ],
+            'department_pairs': self.department_pairs,
+            'department_internal': self.department_internal,
+        }
+
+
+_cache = {'graph': None}
+_cache_lock = threading.Lock()
+
+
+def get_coauthor_graph(db):
+    """Граф соавторства для текущей версии связей."""
+    version = data_version(db, 'links')
+    graph = _cache['graph']
+    hit = graph is not None and graph.version == version
+    record_cache('coauthors', hit)
+    if hit:
+        return graph
+    iterations = current_app.config.get('COAUTHOR_MAX_ITERATIONS', 100) if has_app_context() else 100
+    with _cache_lock:
+        graph = _cache['graph']
+        if graph is None or graph.version != version:
+            lecturers = db.execute("SELECT id, fio, department FROM lecturers ORDER BY id").fetchall()
+            links = db.execute("SELECT lecturer_id, publication_id FROM lecturer_publications").fetchall()
+            graph = _cache['graph'] = CoauthorGraph(lecturers, [tuple(row) for row in links], version,
+                                                    iterations=iterations)
+    return graph
@@ -0,0 +1,132 @@
+# app/compression.py
+
+"""
+Сжатие ответов gzip «на лету».
+
+Сжимаются ответы из списка COMPRESS_MIMETYPES размером от COMPRESS_MIN_SIZE.
+Потоковые ответы сжимаются по частям (каждая часть сбрасывается в сеть
+сразу, выгрузка остаётся потоковой). Сжатый результат запоминается по
+хэшу содержимого только для ответов, одинаковых для всех пользователей:
+с Cache-Control: public или эндпоинтов из COMPRESS_CACHE_ENDPOINTS.
+Остальные (личные страницы) сжимаются сразу, без хэширования.
+"""
+
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from app.telemetry import record_cache
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/csv', 'text/plain', 'text/css',
+    'application/javascript', 'application/json',
+)
+
+
+class _CompressedCache:
+    """LRU сжатых тел ответов, ограниченный суммарным размером."""
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value, max_bytes):
+        if len(value) > max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > max_bytes:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+
+_cache = _CompressedCache()
+
+
+def _gzip_compressor(level):
+    # wbits = 16 + MAX_WBITS — формат gzip (с заголовком и CRC)
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def gzip_bytes(data, level):
+    compressor = _gzip_compressor(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_stream(chunks, level, charset='utf-8'):
+    """Сжать поток частей; каждая часть сразу доступна клиенту (Z_SYNC_FLUSH)."""
+    compressor = _gzip_compressor(level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _is_cacheable(response):
+    cache_control = response.cache_control
+    if request.method != 'GET' or cache_control.no_store or cache_control.private:
+        return False
+    return bool(cache_control.public) or request.endpoint in current_app.config.get(
+        'COMPRESS_CACHE_ENDPOINTS', ())
+
+
+def compress_response(response):
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return response
+    if (request.method == 'HEAD'
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+
+    level = config.get('COMPRESS_LEVEL', 6)
+    if response.is_streamed:
+        response.response = gzip_stream(response.response, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        if _is_cacheable(response):
+            key = (hashlib.sha1(data).digest(), level)
+            compressed = _cache.get(key)
+            record_cache('compression', compressed is not None)
+            if compressed is None:
+                compressed = gzip_bytes(data, level)
+                _cache.put(key, compressed, config.get('COMPRESS_CACHE_BYTES', 32 * 1024 * 1024))
+        else:
+            compressed = gzip_bytes(data, level)
+        response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,290 @@
+# app/deadlines.py
+
+"""
+Сроки доработки публикаций.
+
+publications.revision_deadline хранится как дата ISO (YYYY-MM-DD):
+триггеры отклоняют другие значения, а частичный индекс по сроку среди
+публикаций на доработке позволяет сортировать их и считать просроченные
+без просмотра всей таблицы.
+
+Планировщик (run_deadline_scheduler) ведёт таблицу deadline_alerts —
+публикации, срок которых истёк ('overdue') или наступит в ближайшие
+DEADLINE_DUE_SOON_DAYS дней ('due_soon'). За один запуск он проверяет
+только публикации, изменившиеся с прошлого запуска (их id записывают
+триггеры в deadline_changes), и те, чей срок за это время пересёк
+границу окна, — диапазонами по индексу. Новые предупреждения попадают
+в сводку проверяющего, пока он её не просмотрит.
+"""
+
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+
+from app.background import register_periodic
+
+STATES = ('overdue', 'due_soon')
+
+# Форматы, в которых сроки могли быть введены до перехода на ISO
+_INPUT_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y', '%Y/%m/%d', '%d/%m/%Y', '%Y.%m.%d')
+
+_INVALID_DEADLINE = "SELECT RAISE(ABORT, 'revision_deadline: ожидается дата YYYY-MM-DD')"
+_CHECK_WHEN = ("WHEN NEW.revision_deadline IS NOT NULL "
+               "AND NEW.revision_deadline IS NOT date(NEW.revision_deadline)")
+
+TRIGGERS = {
+    'trg_deadline_check_insert':
+        "CREATE TRIGGER trg_deadline_check_insert BEFORE INSERT ON publications "
+        "%s BEGIN %s; END" % (_CHECK_WHEN, _INVALID_DEADLINE),
+    'trg_deadline_check_update':
+        "CREATE TRIGGER trg_deadline_check_update BEFORE UPDATE OF revision_deadline ON publications "
+        "%s BEGIN %s; END" % (_CHECK_WHEN, _INVALID_DEADLINE),
+    'trg_deadline_changes_insert':
+        "CREATE TRIGGER trg_deadline_changes_insert AFTER INSERT ON publications "
+        "WHEN NEW.status = 'revision_required' BEGIN "
+        "INSERT OR IGNORE INTO deadline_changes (publication_id) VALUES (NEW.id); END",
+    'trg_deadline_changes_update':
+        "CREATE TRIGGER trg_deadline_changes_update "
+        "AFTER UPDATE OF status, revision_deadline, reviewer_id ON publications "
+        "WHEN NEW.status IS NOT OLD.status OR NEW.revision_deadline IS NOT OLD.revision_deadline "
+        "OR NEW.reviewer_id IS NOT OLD.reviewer_id BEGIN "
+        "INSERT OR IGNORE INTO deadline_changes (publication_id) VALUES (NEW.id); END",
+}
+
+
+def parse_deadline(value):
+    """
+    Срок доработки в виде 'YYYY-MM-DD' (None для пустого значения).
+    Принимает и старые форматы вроде 'ДД.ММ.ГГГГ'; иначе — ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value).strip()
+    if not value:
+        return None
+    for fmt in _INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError('Некорректный срок доработки: %r' % value)
+
+
+def install_revision_deadlines(db):
+    """
+    Миграция: сроки приводятся к ISO (нераспознанные переносятся в
+    комментарий проверяющего), индекс, таблицы планировщика и триггеры.
+    """
+    rows = db.execute(
+        "SELECT id, revision_deadline, review_comment FROM publications WHERE revision_deadline IS NOT NULL"
+    ).fetchall()
+    for pub_id, deadline, comment in rows:
+        try:
+            normalized = parse_deadline(deadline)
+        except ValueError:
+            normalized = None
+            note = 'Срок доработки: %s' % deadline
+            comment = '%s\n%s' % (comment, note) if comment else note
+        if normalized != deadline:
+            db.execute(
+                "UPDATE publications SET revision_deadline = ?, review_comment = ? WHERE id = ?",
+                (normalized, comment, pub_id)
+            )
+    db.execute(
+        "CREATE INDEX idx_publications_revision_deadline ON publications (revision_deadline) "
+        "WHERE status = 'revision_required'"
+    )
+    db.execute("""
+        CREATE TABLE deadline_changes (
+            publication_id INTEGER PRIMARY KEY REFERENCES publications(id) ON DELETE CASCADE
+        )
+    """)
+    db.execute("""
+        CREATE TABLE deadline_alerts (
+            publication_id INTEGER PRIMARY KEY REFERENCES publications(id) ON DELETE CASCADE,
+            reviewer_id INTEGER,
+            deadline TEXT NOT NULL,
+            state TEXT NOT NULL,
+            since TEXT NOT NULL,
+            seen INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    db.execute("CREATE INDEX idx_deadline_alerts_reviewer ON deadline_alerts (reviewer_id, seen)")
+    db.execute("""
+        CREATE TABLE deadline_scheduler (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_run TEXT
+        )
+    """)
+    db.execute("INSERT INTO deadline_scheduler (id, last_run) VALUES (1, NULL)")
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+
+
+def _due_soon_days():
+    return current_app.config.get('DEADLINE_DUE_SOON_DAYS', 7) if has_app_context() else 7
+
+
+def _window(today):
+    today = today or date.today()
+    return today.isoformat(), (today + timedelta(days=_due_soon_days())).isoformat()
+
+
+def deadline_counts(db, today=None):
+    """Число просроченных и подходящих к сроку публикаций (по индексу, без полного просмотра)."""
+    today, soon = _window(today)
+    row = db.execute(
+        "SELECT "
+        "  (SELECT COUNT(*) FROM publications "
+        "   WHERE status = 'revision_required' AND revision_deadline < ?), "
+        "  (SELECT COUNT(*) FROM publications "
+        "   WHERE status = 'revision_required' AND revision_deadline >= ? AND revision_deadline < ?)",
+        (today, today, soon)
+    ).fetchone()
+    return {'overdue': row[0], 'due_soon': row[1]}
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _state(row, today, soon):
+    if row is None or row['status'] != 'revision_required' or row['revision_deadline'] is None:
+        return None
+    if row['revision_deadline'] < today:
+        return 'overdue'
+    if row['revision_deadline'] < soon:
+        return 'due_soon'
+    return None
+
+
+def scheduler_pending(db, today=None):
+    """Есть ли работа для планировщика: изменения или новый день с прошлого запуска."""
+    today, _ = _window(today)
+    row = db.execute(
+        "SELECT last_run, EXISTS (SELECT 1 FROM deadline_changes) FROM deadline_scheduler WHERE id = 1"
+    ).fetchone()
+    return row[0] != today or bool(row[1])
+
+
+def run_deadline_scheduler(db, today=None):
+    """
+    Обновить deadline_alerts с прошлого запуска. Возвращает новые
+    предупреждения: {'overdue': [id публикации], 'due_soon': [...]}.
+    """
+    today_date = today or date.today()
+    today, soon = _window(today_date)
+    last_run = db.execute("SELECT last_run FROM deadline_scheduler WHERE id = 1").fetchone()[0]
+
+    candidates = {row[0] for row in db.execute("SELECT publication_id FROM deadline_changes")}
+    if last_run is None or last_run > today:
+        # Первый запуск или часы переведены назад — проверяем всё окно и все предупреждения
+        crossed = db.execute(
+            "SELECT id FROM publications WHERE status = 'revision_required' AND revision_deadline < ? "
+            "UNION SELECT publication_id FROM deadline_alerts",
+            (soon,)
+        )
+    else:
+        # Срок истёк: [прошлый запуск, сегодня); срок вошёл в окно: [прошлый запуск + N, сегодня + N)
+        last_soon = (date.fromisoformat(last_run) + timedelta(days=_due_soon_days())).isoformat()
+        crossed = db.execute(
+            "SELECT id FROM publications WHERE status = 'revision_required' "
+            "AND revision_deadline >= ? AND revision_deadline < ? "
+            "UNION "
+            "SELECT id FROM publications WHERE status = 'revision_required' "
+            "AND revision_deadline >= ? AND revision_deadline < ?",
+            (last_run, today, last_soon, soon)
+        )
+    candidates.update(row[0] for row in crossed)
+
+    new = {state: [] for state in STATES}
+    for chunk in _chunks(sorted(candidates)):
+        marks = ', '.join('?' * len(chunk))
+        pubs = {row['id']: row for row in db.execute(
+            "SELECT id, status, revision_deadline, reviewer_id FROM publications WHERE id IN (%s)" % marks,
+            chunk
+        )}
+        alerts = {row['publication_id']: row for row in db.execute(
+            "SELECT * FROM deadline_alerts WHERE publication_id IN (%s)" % marks, chunk
+        )}
+        for pub_id in chunk:
+            pub, alert = pubs.get(pub_id), alerts.get(pub_id)
+            state = _state(pub, today, soon)
+            if state is None:
+                if alert is not None:
+                    db.execute("DELETE FROM deadline_alerts WHERE publication_id = ?", (pub_id,))
+            elif alert is None or alert['state'] != state or alert['deadline'] != pub['revision_deadline']:
+                db.execute(
+                    "INSERT OR REPLACE INTO deadline_alerts "
+                    "(publication_id, reviewer_id, deadline, state, since, seen) VALUES (?, ?, ?, ?, ?, 0)",
+                    (pub_id, pub['reviewer_id'], pub['revision_deadline'], state, today)
+                )
+                new[state].append(pub_id)
+            elif alert['reviewer_id'] != pub['reviewer_id']:
+                db.execute(
+                    "UPDATE deadline_alerts SET reviewer_id = ?, seen = 0 WHERE publication_id = ?",
+                    (pub['reviewer_id'], pub_id)
+                )
+        db.execute("DELETE FROM deadline_changes WHERE publication_id IN (%s)" % marks, chunk)
+    if last_run != today:
+        db.execute("UPDATE deadline_scheduler SET last_run = ? WHERE id = 1", (today,))
+    return new
+
+
+def refresh_deadlines(today=None):
+    """Запустить планировщик отдельной записью, если с прошлого запуска есть что проверять."""
+    from app.models import get_db
+    from app.writer import run_write
+
+    if not scheduler_pending(get_db(write=False), today):
+        return None
+    return run_write(lambda: run_deadline_scheduler(get_db(), today))
+
+
+def reviewer_digest(db, reviewer_id):
+    """
+    Сводка проверяющего: {'overdue': [...], 'due_soon': [...], 'new': n}.
+    Строки — публикации с полями предупреждения; new — ещё не просмотренные.
+    """
+    digest = {state: [] for state in STATES}
+    digest['new'] = 0
+    for row in db.execute(
+        "SELECT a.state, a.deadline, a.since, a.seen, p.id, p.title, p.year, p.review_comment "
+        "FROM deadline_alerts a JOIN publications p ON p.id = a.publication_id "
+        "WHERE a.reviewer_id = ? ORDER BY a.deadline, p.id",
+        (reviewer_id,)
+    ):
+        digest[row['state']].append(row)
+        digest['new'] += not row['seen']
+    return digest
+
+
+def unseen_digests(db):
+    """Проверяющие с непросмотренными предупреждениями: {reviewer_id: сводка}."""
+    reviewers = [row[0] for row in db.execute(
+        "SELECT DISTINCT reviewer_id FROM deadline_alerts WHERE seen = 0 AND reviewer_id IS NOT NULL")]
+    return {reviewer_id: reviewer_digest(db, reviewer_id) for reviewer_id in reviewers}
+
+
+def init_deadlines(app):
+    """Фоновый запуск планировщика раз в DEADLINE_SCHEDULER_INTERVAL секунд."""
+    register_periodic(app, 'deadlines', app.config.get('DEADLINE_SCHEDULER_INTERVAL', 3600), refresh_deadlines)
+
+
+@click.command('check-deadlines')
+@with_appcontext
+def check_deadlines_command():
+    """Обновить предупреждения о сроках доработки и вывести сводки проверяющих."""
+    from app.models import get_db
+
+    new = refresh_deadlines() or {state: [] for state in STATES}
+    click.echo('Новых просроченных: %d, подходящих к сроку: %d' % (len(new['overdue']), len(new['due_soon'])))
+    for reviewer_id, digest in unseen_digests(get_db(write=False)).items():
+        click.echo('Проверяющий #%s: просрочено %d, скоро срок %d, новых %d' % (
+            reviewer_id, len(digest['overdue']), len(digest['due_soon']), digest['new']))
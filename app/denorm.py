@@ -0,0 +1,143 @@
+# app/denorm.py
+
+"""
+Денормализованный список авторов публикации.
+
+publications.authors_display — ФИО авторов через запятую (в порядке id
+преподавателя), publications.author_ids — JSON-массив их id. Оба поля
+пересчитываются триггерами при изменении lecturer_publications и ФИО
+преподавателей, поэтому списки и выгрузки получают авторов без
+дополнительных запросов. ``flask check-authors`` находит расхождения,
+с флагом --repair — исправляет.
+"""
+
+import json
+
+import click
+from flask.cli import with_appcontext
+
+AUTHORS_SEPARATOR = ', '
+
+# Пересчёт полей для публикаций, отобранных условием {where}
+_REFRESH_SQL = """
+    UPDATE publications SET
+        authors_display = COALESCE((
+            SELECT group_concat(fio, '{sep}') FROM (
+                SELECT l.fio FROM lecturer_publications lp
+                JOIN lecturers l ON l.id = lp.lecturer_id
+                WHERE lp.publication_id = publications.id ORDER BY l.id
+            )
+        ), ''),
+        author_ids = (
+            SELECT json_group_array(lecturer_id) FROM (
+                SELECT lecturer_id FROM lecturer_publications
+                WHERE publication_id = publications.id ORDER BY lecturer_id
+            )
+        )
+    WHERE {where}
+"""
+
+# То же значение, вычисленное заново, — для проверки расхождений
+_DRIFT_SQL = """
+    SELECT id, authors_display, author_ids, expected_display, expected_ids FROM (
+        SELECT p.id, p.authors_display, p.author_ids,
+            COALESCE((
+                SELECT group_concat(fio, '{sep}') FROM (
+                    SELECT l.fio FROM lecturer_publications lp
+                    JOIN lecturers l ON l.id = lp.lecturer_id
+                    WHERE lp.publication_id = p.id ORDER BY l.id
+                )
+            ), '') AS expected_display,
+            (
+                SELECT json_group_array(lecturer_id) FROM (
+                    SELECT lecturer_id FROM lecturer_publications
+                    WHERE publication_id = p.id ORDER BY lecturer_id
+                )
+            ) AS expected_ids
+        FROM publications p
+    )
+    WHERE authors_display IS NOT expected_display OR author_ids IS NOT expected_ids
+"""
+
+
+def _refresh(where):
+    return _REFRESH_SQL.format(sep=AUTHORS_SEPARATOR, where=where)
+
+
+TRIGGERS = {
+    'trg_lp_insert_authors': """
+        CREATE TRIGGER trg_lp_insert_authors AFTER INSERT ON lecturer_publications
+        BEGIN {} ; END
+    """.format(_refresh('id = NEW.publication_id')),
+    'trg_lp_delete_authors': """
+        CREATE TRIGGER trg_lp_delete_authors AFTER DELETE ON lecturer_publications
+        BEGIN {} ; END
+    """.format(_refresh('id = OLD.publication_id')),
+    'trg_lp_update_authors': """
+        CREATE TRIGGER trg_lp_update_authors AFTER UPDATE ON lecturer_publications
+        BEGIN {} ; END
+    """.format(_refresh('id IN (OLD.publication_id, NEW.publication_id)')),
+    'trg_lecturer_fio_authors': """
+        CREATE TRIGGER trg_lecturer_fio_authors AFTER UPDATE OF fio ON lecturers
+        WHEN NEW.fio IS NOT OLD.fio
+        BEGIN {} ; END
+    """.format(_refresh(
+        'id IN (SELECT publication_id FROM lecturer_publications WHERE lecturer_id = NEW.id)')),
+}
+
+
+def install_author_columns(db):
+    """Миграция: колонки, триггеры и первоначальное заполнение."""
+    db.execute("ALTER TABLE publications ADD COLUMN authors_display TEXT NOT NULL DEFAULT ''")
+    db.execute("ALTER TABLE publications ADD COLUMN author_ids TEXT NOT NULL DEFAULT '[]'")
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+    db.execute(_refresh('1'))
+
+
+def find_author_drift(db):
+    """Публикации, у которых сохранённые авторы не совпадают с фактическими."""
+    return db.execute(_DRIFT_SQL.format(sep=AUTHORS_SEPARATOR)).fetchall()
+
+
+def rebuild_authors(db, pub_ids=None):
+    """Пересчитать поля авторов (pub_ids=None — у всех публикаций)."""
+    if pub_ids is None:
+        db.execute(_refresh('1'))
+    else:
+        db.executemany(_refresh('id = ?'), [(pub_id,) for pub_id in pub_ids])
+
+
+def publication_authors(pub):
+    """
+    Авторы из денормализованных полей строки publications:
+    список {'id', 'fio'} в том же виде, что и get_authors_for_publications.
+    """
+    ids = json.loads(pub['author_ids'])
+    if not ids:
+        return []
+    names = pub['authors_display'].split(AUTHORS_SEPARATOR)
+    if len(names) != len(ids):
+        # В ФИО встретился разделитель — имена по одному не восстановить
+        return [{'id': ids[0], 'fio': pub['authors_display']}]
+    return [{'id': lid, 'fio': fio} for lid, fio in zip(ids, names)]
+
+
+@click.command('check-authors')
+@click.option('--repair', is_flag=True, help='Пересчитать расходящиеся записи.')
+@with_appcontext
+def check_authors_command(repair):
+    """Проверить денормализованные списки авторов публикаций."""
+    from app.models import get_db
+    from app.writer import run_write
+
+    drift = find_author_drift(get_db(write=False))
+    for row in drift:
+        click.echo('#%d: %r %s -> %r %s' % (
+            row['id'], row['authors_display'], row['author_ids'],
+            row['expected_display'], row['expected_ids']))
+    click.echo('Расхождений: %d' % len(drift))
+    if drift and repair:
+        ids = [row['id'] for row in drift]
+        run_write(lambda: rebuild_authors(get_db(), ids))
+        click.echo('Исправлено: %d' % len(ids))
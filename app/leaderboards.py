@@ -0,0 +1,284 @@
+# app/leaderboards.py
+
+"""
+Рейтинги преподавателей: top-K и процентили по каждому показателю —
+по всему университету и внутри кафедры.
+
+Рейтинг хранится в памяти процесса как отсортированные списки
+(-значение, id преподавателя) для каждой пары «показатель × кафедра»;
+место и процентиль находятся двоичным поиском, top-K — срезом списка.
+Полный пересчёт — одна сортировка на показатель (NumPy lexsort, если
+установлен).
+
+Триггеры записывают id преподавателей, чьи показатели могли измениться
+(метрики, связи с публикациями, цитирования публикаций, ФИО и кафедра),
+в журнал leaderboard_changes. Каждый процесс помнит последнюю применённую
+запись и при обращении перечитывает показатели только этих
+преподавателей; если изменений слишком много или журнал уже обрезан —
+пересчитывает рейтинг целиком.
+"""
+
+import bisect
+import math
+import threading
+
+from flask import current_app, has_app_context
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен — тогда сортируем на чистом Python
+    np = None
+
+from app.analytics import ALL_DEPARTMENTS
+from app.telemetry import record_cache
+from app.trends import INDICATOR_NAMES
+
+# Показатели: сводка по публикациям в системе и последняя строка метрик
+METRICS = ('citations', 'publications', 'total_citations', 'h_index', 'scopus', 'wos', 'rinz')
+METRIC_NAMES = dict(INDICATOR_NAMES, citations='Цитирований в системе', publications='Публикаций в системе')
+
+# Сколько последних записей журнала изменений хранится
+CHANGELOG_SIZE = 1000
+
+_SCORES_SQL = """
+    SELECT l.id AS lecturer_id, l.fio, COALESCE(l.department, '') AS department,
+           m.total_citations, m.h_index, m.scopus, m.wos, m.rinz,
+           (SELECT COUNT(*) FROM lecturer_publications lp WHERE lp.lecturer_id = l.id) AS publications,
+           (SELECT COALESCE(SUM(CAST(p.citations AS INTEGER)), 0)
+            FROM lecturer_publications lp JOIN publications p ON p.id = lp.publication_id
+            WHERE lp.lecturer_id = l.id) AS citations
+    FROM lecturers l
+    LEFT JOIN metrics m ON m.id = (
+        SELECT id FROM metrics WHERE lecturer_id = l.id ORDER BY year DESC, id DESC LIMIT 1)
+    WHERE {where}
+"""
+
+
+def _log(*lecturer_ids):
+    return ' UNION '.join('SELECT %s' % lid for lid in lecturer_ids)
+
+
+TRIGGERS = {
+    'trg_lb_metrics_insert':
+        "CREATE TRIGGER trg_lb_metrics_insert AFTER INSERT ON metrics BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('NEW.lecturer_id'),
+    'trg_lb_metrics_update':
+        "CREATE TRIGGER trg_lb_metrics_update AFTER UPDATE ON metrics BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('OLD.lecturer_id', 'NEW.lecturer_id'),
+    'trg_lb_metrics_delete':
+        "CREATE TRIGGER trg_lb_metrics_delete AFTER DELETE ON metrics BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('OLD.lecturer_id'),
+    'trg_lb_lp_insert':
+        "CREATE TRIGGER trg_lb_lp_insert AFTER INSERT ON lecturer_publications BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('NEW.lecturer_id'),
+    'trg_lb_lp_update':
+        "CREATE TRIGGER trg_lb_lp_update AFTER UPDATE ON lecturer_publications BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('OLD.lecturer_id', 'NEW.lecturer_id'),
+    'trg_lb_lp_delete':
+        "CREATE TRIGGER trg_lb_lp_delete AFTER DELETE ON lecturer_publications BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('OLD.lecturer_id'),
+    'trg_lb_pub_citations':
+        "CREATE TRIGGER trg_lb_pub_citations AFTER UPDATE OF citations ON publications "
+        "WHEN NEW.citations IS NOT OLD.citations BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) "
+        "SELECT lecturer_id FROM lecturer_publications WHERE publication_id = NEW.id; END",
+    'trg_lb_lecturer_insert':
+        "CREATE TRIGGER trg_lb_lecturer_insert AFTER INSERT ON lecturers BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('NEW.id'),
+    'trg_lb_lecturer_update':
+        "CREATE TRIGGER trg_lb_lecturer_update AFTER UPDATE OF fio, department ON lecturers "
+        "WHEN NEW.fio IS NOT OLD.fio OR NEW.department IS NOT OLD.department BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('NEW.id'),
+    'trg_lb_lecturer_delete':
+        "CREATE TRIGGER trg_lb_lecturer_delete AFTER DELETE ON lecturers BEGIN "
+        "INSERT INTO leaderboard_changes (lecturer_id) %s; END" % _log('OLD.id'),
+    'trg_lb_changes_prune':
+        "CREATE TRIGGER trg_lb_changes_prune AFTER INSERT ON leaderboard_changes BEGIN "
+        "DELETE FROM leaderboard_changes WHERE seq <= NEW.seq - %d; END" % CHANGELOG_SIZE,
+}
+
+
+def install_leaderboard_changes(db):
+    """Миграция: журнал изменений для рейтингов, его триггеры и индекс метрик по году."""
+    db.execute("""
+        CREATE TABLE leaderboard_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            lecturer_id INTEGER NOT NULL
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_lecturer_year ON metrics (lecturer_id, year)")
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+
+
+# ==== Рейтинги ====
+
+def _sort_keys(values, ids):
+    """Порядок индексов по убыванию значения (при равенстве — по id)."""
+    if np is not None and values:
+        return np.lexsort((np.asarray(ids), -np.asarray(values, dtype=float))).tolist()
+    return sorted(range(len(values)), key=lambda i: (-values[i], ids[i]))
+
+
+class Leaderboards:
+    """Отсортированные рейтинги по всем показателям и кафедрам."""
+
+    def __init__(self, rows, seq):
+        self.seq = seq
+        self._lecturers = {row['lecturer_id']: self._entry(row) for row in rows}
+        self._boards = {}
+        for metric in METRICS:
+            scored = [(lid, e) for lid, e in self._lecturers.items() if e[metric] is not None]
+            ids = [lid for lid, _ in scored]
+            values = [e[metric] for _, e in scored]
+            for i in _sort_keys(values, ids):
+                key = (-values[i], ids[i])
+                self._boards.setdefault((metric, ALL_DEPARTMENTS), []).append(key)
+                self._boards.setdefault((metric, scored[i][1]['department']), []).append(key)
+
+    @staticmethod
+    def _entry(row):
+        entry = {metric: row[metric] for metric in METRICS}
+        entry['fio'] = row['fio']
+        entry['department'] = row['department']
+        return entry
+
+    def _replace(self, lecturer_id, entry):
+        """Заменить показатели преподавателя (entry=None — удалить из рейтингов)."""
+        old = self._lecturers.get(lecturer_id)
+        for metric in METRICS:
+            changes = {}
+            if old is not None and old[metric] is not None:
+                changes.setdefault(old['department'], []).append(('remove', old[metric]))
+                changes.setdefault(ALL_DEPARTMENTS, []).append(('remove', old[metric]))
+            if entry is not None and entry[metric] is not None:
+                changes.setdefault(entry['department'], []).append(('add', entry[metric]))
+                changes.setdefault(ALL_DEPARTMENTS, []).append(('add', entry[metric]))
+            for department, ops in changes.items():
+                # Новый список вместо изменения на месте: _boards — копия
+                # словаря опубликованных рейтингов, а списки в нём общие
+                board = list(self._boards.get((metric, department), ()))
+                for op, value in ops:
+                    key = (-value, lecturer_id)
+                    if op == 'remove':
+                        i = bisect.bisect_left(board, key)
+                        if i < len(board) and board[i] == key:
+                            del board[i]
+                    else:
+                        bisect.insort(board, key)
+                self._boards[(metric, department)] = board
+        if entry is None:
+            self._lecturers.pop(lecturer_id, None)
+        else:
+            self._lecturers[lecturer_id] = entry
+
+    def apply(self, rows, lecturer_ids, seq):
+        """
+        Новые рейтинги с перечитанными показателями преподавателей
+        lecturer_ids. Сам объект не меняется: читатели в других потоках
+        продолжают работать со старыми рейтингами, пока новые не опубликованы.
+        """
+        boards = object.__new__(Leaderboards)
+        boards._lecturers = dict(self._lecturers)
+        boards._boards = dict(self._boards)
+        fresh = {row['lecturer_id']: self._entry(row) for row in rows}
+        for lecturer_id in lecturer_ids:
+            boards._replace(lecturer_id, fresh.get(lecturer_id))
+        boards.seq = seq
+        return boards
+
+    def position(self, lecturer_id, metric, department=ALL_DEPARTMENTS):
+        """
+        {'rank', 'total', 'percentile'} преподавателя в рейтинге или None.
+        Равные значения делят место; процентиль — доля остальных участников
+        рейтинга с меньшим значением.
+        """
+        entry = self._lecturers.get(lecturer_id)
+        if entry is None or entry[metric] is None:
+            return None
+        board = self._boards.get((metric, department), ())
+        total = len(board)
+        above = bisect.bisect_left(board, (-entry[metric],))
+        below = total - bisect.bisect_right(board, (-entry[metric], math.inf))
+        return {
+            'rank': above + 1,
+            'total': total,
+            'percentile': 100.0 * below / (total - 1) if total > 1 else 100.0,
+        }
+
+    def for_lecturer(self, lecturer_id):
+        """{показатель: {'name', 'value', 'overall', 'department'}} или None."""
+        entry = self._lecturers.get(lecturer_id)
+        if entry is None:
+            return None
+        return {
+            metric: {
+                'name': METRIC_NAMES[metric],
+                'value': entry[metric],
+                'overall': self.position(lecturer_id, metric),
+                'department': self.position(lecturer_id, metric, entry['department']),
+            }
+            for metric in METRICS if entry[metric] is not None
+        }
+
+    def top(self, metric, department=ALL_DEPARTMENTS, k=10):
+        """Первые k участников рейтинга: [{'lecturer_id', 'fio', 'department', 'value', 'rank'}]."""
+        board = self._boards.get((metric, department), ())
+        result = []
+        for i, (neg_value, lecturer_id) in enumerate(board[:k]):
+            entry = self._lecturers[lecturer_id]
+            tied = i and board[i - 1][0] == neg_value
+            result.append({
+                'lecturer_id': lecturer_id,
+                'fio': entry['fio'],
+                'department': entry['department'],
+                'value': -neg_value,
+                'rank': result[-1]['rank'] if tied else i + 1,
+            })
+        return result
+
+
+_state = {'boards': None}
+_state_lock = threading.Lock()
+
+
+def _last_seq(db):
+    return db.execute("SELECT COALESCE(MAX(seq), 0) FROM leaderboard_changes").fetchone()[0]
+
+
+def rebuild_leaderboards(db):
+    """Пересчитать рейтинги процесса целиком."""
+    with _state_lock:
+        seq = _last_seq(db)
+        boards = _state['boards'] = Leaderboards(db.execute(_SCORES_SQL.format(where='1')).fetchall(), seq)
+    return boards
+
+
+def get_leaderboards(db):
+    """Рейтинги, догнанные до последнего изменения в БД."""
+    boards = _state['boards']
+    seq = _last_seq(db)
+    record_cache('leaderboards', boards is not None and boards.seq == seq)
+    if boards is not None and boards.seq == seq:
+        return boards
+    limit = current_app.config.get('LEADERBOARD_INCREMENTAL_MAX', 200) if has_app_context() else 200
+    with _state_lock:
+        boards = _state['boards']
+        if boards is not None and boards.seq == seq:
+            return boards
+        if boards is not None and boards.seq < seq:
+            changes = db.execute(
+                "SELECT seq, lecturer_id FROM leaderboard_changes WHERE seq > ? ORDER BY seq",
+                (boards.seq,)
+            ).fetchall()
+            lecturer_ids = sorted({row['lecturer_id'] for row in changes})
+            # Первая непрочитанная запись уже обрезана — изменения известны не все
+            complete = bool(changes) and changes[0]['seq'] == boards.seq + 1
+            if complete and len(lecturer_ids) <= limit:
+                rows = db.execute(
+                    _SCORES_SQL.format(where='l.id IN (%s)' % ', '.join('?' * len(lecturer_ids))),
+                    lecturer_ids
+                ).fetchall()
+                boards = _state['boards'] = boards.apply(rows, lecturer_ids, changes[-1]['seq'])
+                return boards
+    return rebuild_leaderboards(db)
@@ -0,0 +1,277 @@
+# app/logarchive.py
+
+"""
+Хранение журнала действий: «горячая» таблица logs и архив по месяцам.
+
+В logs остаются записи за последние LOG_RETENTION_DAYS дней (плюс
+неполный месяц). Более старые месяцы фоновая задача ('log-archive')
+переносит в сжатые файлы LOG_ARCHIVE_DIR/logs-ГГГГ-ММ.jsonl.gz — по одной
+JSON-строке на запись, с ФИО пользователя на момент архивации. Перенос
+идёт порциями по LOG_ARCHIVE_BATCH записей: порция читается без
+блокировок, дописывается в файл отдельным членом gzip, а затем короткой
+операцией писателя удаляется из logs вместе с обновлением таблицы
+log_archives (месяц, файл, число записей, размер файла). Перед записью
+файл обрезается до размера из log_archives, поэтому прерванная порция
+не попадает в архив дважды. log_action при этом не ждёт дольше одного
+небольшого DELETE. Воркеры serve.py запускают задачу каждый у себя;
+одновременно архивирует только один — остальные пропускают запуск
+(блокировка файла .lock в каталоге архива).
+"""
+
+import fcntl
+import gzip
+import heapq
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.background import register_periodic
+from app.records import records
+
+_COLUMNS = ('id', 'timestamp', 'user_id', 'user_fio', 'action', 'description')
+
+# Фильтры просмотра: параметр -> условие по таблице logs
+_FILTERS = {
+    'user_id': 'logs.user_id = ?',
+    'action': 'logs.action = ?',
+    'date_from': 'logs.timestamp >= ?',
+    'date_to': 'logs.timestamp < ?',
+}
+
+
+def install_log_storage(db):
+    """Миграция: индексы для фильтров журнала и таблица архивных периодов."""
+    db.execute("CREATE INDEX idx_logs_timestamp ON logs (timestamp)")
+    db.execute("CREATE INDEX idx_logs_user ON logs (user_id, timestamp)")
+    db.execute("CREATE INDEX idx_logs_action ON logs (action, timestamp)")
+    db.execute("""
+        CREATE TABLE log_archives (
+            period TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _archive_dir():
+    return current_app.config.get('LOG_ARCHIVE_DIR') or os.path.join(
+        current_app.root_path, '..', 'archive', 'logs')
+
+
+def _next_month(period):
+    year, month = int(period[:4]), int(period[5:7])
+    return '%04d-%02d' % (year + month // 12, month % 12 + 1)
+
+
+def normalize_filters(user_id=None, action=None, date_from=None, date_to=None):
+    """
+    Фильтры просмотра журнала в виде, пригодном для запроса: даты 'ГГГГ-ММ-ДД'
+    (date_to включительно), пустые значения отбрасываются. ValueError — неверная дата.
+    """
+    filters = {}
+    if user_id:
+        filters['user_id'] = int(user_id)
+    if action:
+        filters['action'] = action
+    if date_from:
+        filters['date_from'] = date.fromisoformat(date_from).isoformat()
+    if date_to:
+        filters['date_to'] = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+    return filters
+
+
+def logs_query(filters, limit=-1, offset=0):
+    """(SQL, параметры) выборки горячей таблицы по фильтрам, новые первыми (по индексам logs)."""
+    where = [_FILTERS[name] for name in filters] or ['1']
+    return (
+        "SELECT logs.*, u.fio AS user_fio FROM logs "
+        "LEFT JOIN users u ON logs.user_id = u.id "
+        "WHERE %s ORDER BY logs.timestamp DESC, logs.id DESC LIMIT ? OFFSET ?" % ' AND '.join(where),
+        list(filters.values()) + [limit, offset]
+    )
+
+
+def query_logs(db, filters, limit, offset=0):
+    """Страница записей горячей таблицы по фильтрам."""
+    return records(db, 'LogEntry', *logs_query(filters, limit, offset))
+
+
+def _matches(record, filters):
+    if 'user_id' in filters and record['user_id'] != filters['user_id']:
+        return False
+    if 'action' in filters and record['action'] != filters['action']:
+        return False
+    if 'date_from' in filters and (record['timestamp'] or '') < filters['date_from']:
+        return False
+    if 'date_to' in filters and (record['timestamp'] or '') >= filters['date_to']:
+        return False
+    return True
+
+
+def read_archive(db, period, filters, limit, offset=0):
+    """
+    Записи архивного месяца по тем же фильтрам, новые первыми. Файл
+    читается потоком, в памяти — не больше offset + limit записей.
+    """
+    row = db.execute("SELECT path, bytes FROM log_archives WHERE period = ?", (period,)).fetchone()
+    if row is None or not os.path.exists(row['path']) or limit <= 0:
+        return []
+    with open(row['path'], 'rb') as raw:
+        # Хвост за пределами зафиксированного размера — незавершённая порция
+        with gzip.open(_Limited(raw, row['bytes']), 'rt', encoding='utf-8') as f:
+            matched = (record for record in map(json.loads, f) if _matches(record, filters))
+            newest = heapq.nlargest(offset + limit, matched, key=lambda r: (r['timestamp'] or '', r['id']))
+    return newest[offset:]
+
+
+class _Limited:
+    """Файл, читаемый только до заданного размера."""
+
+    def __init__(self, raw, size):
+        self.raw = raw
+        self.left = size
+
+    def read(self, n=-1):
+        if n is None or n < 0 or n > self.left:
+            n = self.left
+        data = self.raw.read(n)
+        self.left -= len(data)
+        return data
+
+
+def archived_periods(db):
+    return db.execute("SELECT period, rows, bytes FROM log_archives ORDER BY period DESC").fetchall()
+
+
+# ==== Архивация ====
+
+def _oldest_period(db, cutoff):
+    """Самый старый месяц, целиком старше cutoff ('ГГГГ-ММ-ДД'), или None."""
+    row = db.execute("SELECT MIN(timestamp) FROM logs WHERE timestamp IS NOT NULL").fetchone()
+    if row[0] is None:
+        return None
+    period = row[0][:7]
+    return period if _next_month(period) + '-01' <= cutoff else None
+
+
+def archive_batch(db, cutoff, batch):
+    """
+    Перенести в архив одну порцию самого старого подходящего месяца.
+    Возвращает (месяц, число записей) или None, если переносить нечего.
+    """
+    from app.models import get_db
+    from app.writer import run_write
+
+    period = _oldest_period(db, cutoff)
+    if period is None:
+        return None
+    rows = db.execute(
+        "SELECT logs.id, logs.timestamp, logs.user_id, u.fio AS user_fio, logs.action, logs.description "
+        "FROM logs LEFT JOIN users u ON logs.user_id = u.id "
+        "WHERE logs.timestamp >= ? AND logs.timestamp < ? ORDER BY logs.timestamp, logs.id LIMIT ?",
+        (period + '-01', _next_month(period) + '-01', batch)
+    ).fetchall()
+    if not rows:
+        return None
+
+    path = os.path.abspath(os.path.join(_archive_dir(), 'logs-%s.jsonl.gz' % period))
+    state = db.execute("SELECT bytes FROM log_archives WHERE period = ?", (period,)).fetchone()
+    committed = state['bytes'] if state else 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as raw:
+        raw.truncate(committed)
+        raw.seek(committed)
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(_COLUMNS, row)), ensure_ascii=False).encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+        size = raw.tell()
+
+    ids = [(row['id'],) for row in rows]
+
+    def commit():
+        wdb = get_db()
+        wdb.executemany("DELETE FROM logs WHERE id = ?", ids)
+        wdb.execute(
+            "INSERT INTO log_archives (period, path, rows, bytes, last_id) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (period) DO UPDATE SET rows = rows + excluded.rows, bytes = excluded.bytes, "
+            "last_id = MAX(last_id, excluded.last_id), path = excluded.path, updated_at = CURRENT_TIMESTAMP",
+            (period, path, len(ids), size, max(i for i, in ids))
+        )
+    run_write(commit)
+    return period, len(ids)
+
+
+def drop_expired_archives(db, keep_months):
+    """Удалить архивы старше keep_months месяцев (None — хранить всегда)."""
+    from app.models import get_db
+    from app.writer import run_write
+
+    if not keep_months:
+        return []
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - keep_months
+    oldest = '%04d-%02d' % (months // 12, months % 12 + 1)
+    expired = db.execute("SELECT period, path FROM log_archives WHERE period < ?", (oldest,)).fetchall()
+    if not expired:
+        return []
+    periods = [(row['period'],) for row in expired]
+    run_write(lambda: get_db().executemany("DELETE FROM log_archives WHERE period = ?", periods))
+    for row in expired:
+        if os.path.exists(row['path']):
+            os.remove(row['path'])
+    return [row['period'] for row in expired]
+
+
+def archive_logs(max_batches=None):
+    """
+    Перенести в архив все месяцы старше срока хранения (не больше
+    max_batches порций). Возвращает {месяц: перенесено записей}.
+    """
+    from app.models import get_db
+
+    config = current_app.config
+    cutoff = (datetime.utcnow() - timedelta(days=config.get('LOG_RETENTION_DAYS', 90))).strftime('%Y-%m-%d')
+    batch = config.get('LOG_ARCHIVE_BATCH', 5000)
+    directory = _archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    moved = {}
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return moved
+        db = get_db(write=False)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            result = archive_batch(db, cutoff, batch)
+            if result is None:
+                break
+            moved[result[0]] = moved.get(result[0], 0) + result[1]
+            batches += 1
+        drop_expired_archives(db, config.get('LOG_ARCHIVE_KEEP_MONTHS'))
+    return moved
+
+
+def init_log_archive(app):
+    """Фоновая архивация журнала раз в LOG_ARCHIVE_INTERVAL секунд."""
+    register_periodic(
+        app, 'log-archive', app.config.get('LOG_ARCHIVE_INTERVAL', 3600),
+        lambda: archive_logs(app.config.get('LOG_ARCHIVE_MAX_BATCHES', 20)))
+
+
+@click.command('archive-logs')
+@with_appcontext
+def archive_logs_command():
+    """Перенести старые записи журнала действий в сжатый архив."""
+    moved = archive_logs()
+    for period, count in sorted(moved.items()):
+        click.echo('%s: %d' % (period, count))
+    click.echo('Перенесено записей: %d' % sum(moved.values()))
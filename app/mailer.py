@@ -0,0 +1,284 @@
+# app/mailer.py
+
+"""
+Почтовые уведомления через outbox.
+
+Решение по публикации (update_publication_status) в той же транзакции
+записывает письма авторам в таблицу outbox, поэтому письмо появляется
+тогда и только тогда, когда зафиксировано само решение, а запрос
+проверяющего не ждёт SMTP-сервер. Фоновая задача ('mailer',
+app/background.py) забирает готовые к отправке письма пачками, отправляет
+их через одно долгоживущее SMTP-соединение процесса и отмечает результат;
+при временной ошибке письмо откладывается с растущей паузой, после
+MAIL_MAX_ATTEMPTS попыток или при постоянной ошибке — помечается 'failed'.
+
+Дедупликация: среди неотправленных писем dedup_key уникален (частичный
+уникальный индекс), так что повторная запись того же уведомления
+игнорируется; пачка забирается с арендой (locked_until), чтобы несколько
+процессов не отправили одно письмо одновременно.
+
+Для проверки подойдёт локальный SMTP-сервер, например
+``python -m aiosmtpd -n -l localhost:1025`` и MAIL_PORT = 1025;
+``flask send-mail`` отправляет всё накопившееся сразу.
+"""
+
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.background import register_periodic
+from app.telemetry import inc
+
+REVIEW_SUBJECTS = {
+    'approved': 'Публикация утверждена',
+    'rejected': 'Публикация отклонена',
+    'revision_required': 'Публикация отправлена на доработку',
+}
+
+# Ошибки, при которых повтор не поможет (а также ответы сервера с кодом 5xx)
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError)
+
+
+def _permanent(error):
+    if isinstance(error, PERMANENT_ERRORS):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def install_outbox(db):
+    """Миграция: таблица outbox и её индексы."""
+    db.execute("""
+        CREATE TABLE outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            locked_until REAL NOT NULL DEFAULT 0,
+            sent_at TEXT,
+            last_error TEXT
+        )
+    """)
+    db.execute("CREATE UNIQUE INDEX idx_outbox_dedup ON outbox (dedup_key) WHERE status = 'pending'")
+    db.execute("CREATE INDEX idx_outbox_pending ON outbox (next_attempt) WHERE status = 'pending'")
+
+
+# ==== Постановка в очередь ====
+
+def enqueue(db, kind, recipient, subject, body, dedup_key):
+    """Записать письмо в outbox (в текущей транзакции). Дубликат неотправленного игнорируется."""
+    db.execute(
+        "INSERT OR IGNORE INTO outbox (kind, recipient, subject, body, dedup_key) VALUES (?, ?, ?, ?, ?)",
+        (kind, recipient, subject, body, dedup_key)
+    )
+
+
+def enqueue_review_notification(db, pub_id, title, status, comment=None, deadline=None):
+    """
+    Письма авторам публикации о решении проверяющего. Адрес — email
+    учётной записи преподавателя, а если её нет — email из справочника.
+    Возвращает число адресатов.
+    """
+    subject = REVIEW_SUBJECTS.get(status)
+    if subject is None:
+        return 0
+    recipients = sorted({
+        row[0] for row in db.execute(
+            "SELECT COALESCE(NULLIF(u.email, ''), NULLIF(l.email, '')) "
+            "FROM lecturer_publications lp JOIN lecturers l ON l.id = lp.lecturer_id "
+            "LEFT JOIN users u ON u.lecturer_id = l.id "
+            "WHERE lp.publication_id = ?",
+            (pub_id,)
+        ) if row[0]
+    })
+    lines = ['%s: «%s».' % (subject, title)]
+    if deadline:
+        lines.append('Срок доработки: %s.' % deadline)
+    if comment:
+        lines.append('Комментарий проверяющего: %s' % comment)
+    body = '\n\n'.join(lines)
+    for recipient in recipients:
+        enqueue(db, 'review', recipient, subject, body,
+                'review:%d:%s:%s:%s' % (pub_id, status, deadline or '', recipient))
+    return len(recipients)
+
+
+# ==== SMTP ====
+
+class SMTPPool:
+    """
+    Одно SMTP-соединение процесса, переиспользуемое между пачками.
+    Простаивавшее дольше MAIL_KEEPALIVE секунд проверяется NOOP и при
+    необходимости открывается заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_used = 0.0
+
+    def _connect(self, config):
+        cls = smtplib.SMTP_SSL if config.get('MAIL_USE_SSL') else smtplib.SMTP
+        conn = cls(config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25),
+                   timeout=config.get('MAIL_TIMEOUT', 10))
+        if config.get('MAIL_USE_TLS') and not config.get('MAIL_USE_SSL'):
+            conn.starttls()
+        if config.get('MAIL_USERNAME'):
+            conn.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        inc('mail_connections_total')
+        return conn
+
+    def _connection(self, config):
+        if self._conn is not None and time.monotonic() - self._last_used > config.get('MAIL_KEEPALIVE', 60):
+            try:
+                alive = self._conn.noop()[0] == 250
+            except smtplib.SMTPException:
+                alive = False
+            if not alive:
+                self.close()
+        if self._conn is None:
+            self._conn = self._connect(config)
+        return self._conn
+
+    def send(self, config, messages):
+        """
+        Отправить письма [(id, EmailMessage)]. Возвращает {id: None | исключение}.
+        Обрыв соединения — временная ошибка для оставшихся писем пачки.
+        """
+        results = {}
+        with self._lock:
+            try:
+                conn = self._connection(config)
+            except (OSError, smtplib.SMTPException) as e:
+                return {msg_id: e for msg_id, _ in messages}
+            for msg_id, message in messages:
+                try:
+                    conn.send_message(message)
+                    results[msg_id] = None
+                except smtplib.SMTPServerDisconnected as e:
+                    self.close()
+                    results.update({mid: e for mid, _ in messages if mid not in results})
+                    break
+                except (OSError, smtplib.SMTPException) as e:
+                    results[msg_id] = e
+            self._last_used = time.monotonic()
+        return results
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+            self._conn = None
+
+
+_pool = SMTPPool()
+
+
+def _reset_after_fork():
+    # Сокет родителя дочернему процессу не принадлежит — просто забываем его
+    global _pool
+    _pool = SMTPPool()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ==== Отправка ====
+
+def _claim(db, now, batch, lease):
+    rows = db.execute(
+        "SELECT id, recipient, subject, body, attempts FROM outbox "
+        "WHERE status = 'pending' AND next_attempt <= ? AND locked_until <= ? "
+        "ORDER BY next_attempt, id LIMIT ?",
+        (now, now, batch)
+    ).fetchall()
+    if rows:
+        db.executemany("UPDATE outbox SET locked_until = ? WHERE id = ?", [(now + lease, row['id']) for row in rows])
+    return [dict(row) for row in rows]
+
+
+def _record(db, rows, results, now, max_attempts, backoff):
+    sent, retried, failed = [], [], []
+    for row in rows:
+        error = results.get(row['id'])
+        if error is None:
+            sent.append((row['id'],))
+        elif _permanent(error) or row['attempts'] + 1 >= max_attempts:
+            failed.append((str(error), row['id']))
+        else:
+            retried.append((now + backoff * 2 ** row['attempts'], str(error), row['id']))
+    db.executemany(
+        "UPDATE outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, attempts = attempts + 1, "
+        "locked_until = 0 WHERE id = ?", sent)
+    db.executemany(
+        "UPDATE outbox SET status = 'failed', last_error = ?, attempts = attempts + 1, "
+        "locked_until = 0 WHERE id = ?", failed)
+    db.executemany(
+        "UPDATE outbox SET next_attempt = ?, last_error = ?, attempts = attempts + 1, "
+        "locked_until = 0 WHERE id = ?", retried)
+    return len(sent), len(retried), len(failed)
+
+
+def deliver_pending(max_batches=None):
+    """
+    Отправить готовые письма пачками по MAIL_BATCH (max_batches — не
+    больше стольких пачек). Возвращает (отправлено, отложено, не отправлено).
+    """
+    from app.models import get_db
+    from app.writer import run_write
+
+    config = current_app.config
+    batch = config.get('MAIL_BATCH', 50)
+    totals = [0, 0, 0]
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        now = time.time()
+        rows = run_write(lambda: _claim(get_db(), now, batch, config.get('MAIL_LEASE', 300)))
+        if not rows:
+            break
+        messages = []
+        for row in rows:
+            message = EmailMessage()
+            message['From'] = config.get('MAIL_SENDER', 'noreply@localhost')
+            message['To'] = row['recipient']
+            message['Subject'] = row['subject']
+            message.set_content(row['body'])
+            messages.append((row['id'], message))
+        results = _pool.send(config, messages)
+        counts = run_write(lambda: _record(
+            get_db(), rows, results, time.time(),
+            config.get('MAIL_MAX_ATTEMPTS', 8), config.get('MAIL_RETRY_BACKOFF', 60)))
+        for name, value in zip(('sent', 'retry', 'failed'), counts):
+            if value:
+                inc('mail_messages_total', value, result=name)
+        totals = [a + b for a, b in zip(totals, counts)]
+        batches += 1
+    return tuple(totals)
+
+
+def init_mailer(app):
+    """Фоновая отправка писем из outbox (при MAIL_ENABLED)."""
+    if app.config.get('MAIL_ENABLED', False):
+        register_periodic(app, 'mailer', app.config.get('MAIL_INTERVAL', 30), deliver_pending)
+
+
+@click.command('send-mail')
+@with_appcontext
+def send_mail_command():
+    """Отправить все готовые письма из outbox."""
+    sent, retried, failed = deliver_pending()
+    _pool.close()
+    click.echo('Отправлено: %d, отложено: %d, не отправлено: %d' % (sent, retried, failed))
@@ -0,0 +1,93 @@
+# app/memo.py
+
+"""
+Мемоизация чтений в пределах одного запроса.
+
+Функции чтения моделей, помеченные @request_memo, при повторном вызове
+с теми же аргументами в том же запросе возвращают уже прочитанный
+результат, не обращаясь к БД. Память — словарь в g, поэтому она живёт
+ровно один запрос и не видна другим потокам и процессам.
+
+Любая запись в этом запросе (write_operation или run_write) очищает
+память: после неё функции читают заново. Внутри операции писателя и вне
+запроса (фоновые задачи, CLI) мемоизация не применяется. Вызывающий
+получает копию контейнеров результата (списков, словарей, кортежей из
+них), а сами строки — sqlite3.Row и записи app/records.py — неизменяемы,
+так что изменения результата одним вызывающим не видны другому.
+
+Попадания и промахи запроса учитываются в конце запроса: метрика
+db_memo_hits_total по эндпоинтам и cache_requests_total{cache="request_memo"};
+в сводке профилировщика — поле memo.
+"""
+
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+
+from app.telemetry import inc
+from app.writer import writer_connection
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return value[:]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if type(value) is tuple:
+        return tuple(_copy(item) for item in value)
+    return value
+
+
+def request_memo(fn):
+    """Декоратор функции чтения: результат запоминается до конца запроса или до записи."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if (not has_request_context() or writer_connection() is not None
+                or not current_app.config.get('REQUEST_MEMO', True)):
+            return fn(*args, **kwargs)
+        key = (fn, args, tuple(sorted(kwargs.items())))
+        try:
+            memo = g._memo
+        except AttributeError:
+            memo = g._memo = {}
+            g._memo_stats = [0, 0]
+        try:
+            result = memo[key]
+        except KeyError:
+            g._memo_stats[1] += 1
+            result = memo[key] = fn(*args, **kwargs)
+        except TypeError:
+            # Нехэшируемые аргументы (списки и т.п.) — без мемоизации
+            return fn(*args, **kwargs)
+        else:
+            g._memo_stats[0] += 1
+        return _copy(result)
+    return wrapper
+
+
+def invalidate():
+    """Забыть прочитанное в текущем запросе (вызывается при записи)."""
+    if has_request_context():
+        memo = g.get('_memo')
+        if memo:
+            memo.clear()
+
+
+def memo_stats():
+    """(попадания, промахи) текущего запроса."""
+    return tuple(g.get('_memo_stats', (0, 0)))
+
+
+def _teardown_request(exc=None):
+    g.pop('_memo', None)
+    hits, misses = g.pop('_memo_stats', (0, 0))
+    if hits:
+        inc('db_memo_hits_total', hits, endpoint=request.endpoint or 'unknown')
+        inc('cache_requests_total', hits, cache='request_memo', result='hit')
+    if misses:
+        inc('cache_requests_total', misses, cache='request_memo', result='miss')
+
+
+def init_memo(app):
+    """Учёт попаданий мемоизации в конце каждого запроса."""
+    app.teardown_request(_teardown_request)
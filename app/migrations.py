@@ -0,0 +1,113 @@
+# app/migrations.py
+
+"""
+Миграции схемы БД. Номер применённой миграции хранится в PRAGMA user_version.
+
+Миграции применяются при старте приложения (init_db) и при создании БД
+(db_init.py). Каждая выполняется в своей транзакции BEGIN IMMEDIATE:
+читатели в режиме WAL продолжают работать со старым снимком, а второй
+одновременно стартующий процесс дождётся блокировки и увидит, что
+миграция уже применена.
+"""
+
+import sqlite3
+
+from app.analytics import install_analytics_cube, reinstall_cube_triggers
+from app.coauthors import install_links_version
+from app.deadlines import install_revision_deadlines
+from app.denorm import install_author_columns
+from app.leaderboards import install_leaderboard_changes
+from app.logarchive import install_log_storage
+from app.mailer import install_outbox
+from app.trends import install_metrics_version
+
+
+def _link_table_without_rowid(db):
+    # Пересборка по схеме из документации SQLite: новая таблица, перенос
+    # данных без дублей и «висячих» связей, замена старой таблицы
+    db.execute("""
+        CREATE TABLE lecturer_publications_new (
+            lecturer_id INTEGER NOT NULL REFERENCES lecturers(id) ON DELETE CASCADE,
+            publication_id INTEGER NOT NULL REFERENCES publications(id) ON DELETE CASCADE,
+            PRIMARY KEY (lecturer_id, publication_id)
+        ) WITHOUT ROWID
+    """)
+    db.execute("""
+        INSERT OR IGNORE INTO lecturer_publications_new (lecturer_id, publication_id)
+        SELECT lecturer_id, publication_id FROM lecturer_publications
+        WHERE lecturer_id IN (SELECT id FROM lecturers)
+          AND publication_id IN (SELECT id FROM publications)
+    """)
+    db.execute("DROP TABLE lecturer_publications")
+    db.execute("ALTER TABLE lecturer_publications_new RENAME TO lecturer_publications")
+    # Обратный индекс: авторы публикации без обращения к основной таблице
+    db.execute(
+        "CREATE INDEX idx_lecturer_publications_publication "
+        "ON lecturer_publications (publication_id, lecturer_id)"
+    )
+
+
+# Номер миграции = её позиция в списке (user_version после применения);
+# таблицы, внешние ключи которых проверяются после миграции
+MIGRATIONS = [
+    ('lecturer_publications: WITHOUT ROWID, уникальные связи, ON DELETE CASCADE',
+     _link_table_without_rowid, ('lecturer_publications',)),
+    ('publications: authors_display/author_ids, поддерживаемые триггерами',
+     install_author_columns, ()),
+    ('analytics_cube и data_versions: куб кафедра × год × источник × статус',
+     install_analytics_cube, ()),
+    ("data_versions: версия 'metrics' для кэша динамики показателей",
+     install_metrics_version, ()),
+    ('leaderboard_changes: журнал изменений показателей для рейтингов',
+     install_leaderboard_changes, ()),
+    ("data_versions: версия 'links' для кэша графа соавторства",
+     install_links_version, ()),
+    ('publications.revision_deadline в ISO, индекс сроков и таблицы планировщика',
+     install_revision_deadlines, ('deadline_changes', 'deadline_alerts')),
+    ('outbox: очередь писем, записываемых в транзакции решения',
+     install_outbox, ()),
+    ('logs: индексы фильтров журнала и таблица архивных месяцев',
+     install_log_storage, ()),
+    ('analytics_cube: год публикации приводится к целому в триггерах и пересчёте',
+     reinstall_cube_triggers, ()),
+    ('analytics_cube: триггеры удаляют обнулившиеся ячейки',
+     reinstall_cube_triggers, ()),
+]
+
+
+def schema_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db):
+    """Применить недостающие миграции. Возвращает список применённых описаний."""
+    applied = []
+    isolation_level = db.isolation_level
+    db.isolation_level = None  # транзакциями управляем сами
+    try:
+        for version, (description, apply, checked_tables) in enumerate(MIGRATIONS, start=1):
+            if schema_version(db) >= version:
+                continue
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Другой процесс мог применить миграцию, пока мы ждали блокировку
+                if schema_version(db) >= version:
+                    db.execute("ROLLBACK")
+                    continue
+                apply(db)
+                violations = [
+                    row for table in checked_tables
+                    for row in db.execute("PRAGMA foreign_key_check(%s)" % table).fetchall()
+                ]
+                if violations:
+                    raise sqlite3.IntegrityError(
+                        'Миграция %d нарушает внешние ключи: %r' % (version, violations[:5]))
+                db.execute("PRAGMA user_version = %d" % version)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            applied.append(description)
+    finally:
+        db.isolation_level = isolation_level
+    return applied
@@ -1,31 +1,205 @@
 # app/models.py
 
 import sqlite3
-from flask import g
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+from types import MappingProxyType
+from urllib.request import pathname2url
+from flask import current_app, g, has_request_context, request
 import os
 
+from app.background import wake
+from app.deadlines import parse_deadline
+from app.logarchive import logs_query, query_logs
+from app.mailer import enqueue_review_notification
+from app.memo import request_memo
+from app.migrations import migrate
+from app.passwords import hash_password, verify_password, needs_rehash
+from app.records import columns, iter_records, records
+from app.telemetry import record_cache
+from app.writer import after_commit, write_operation, writer_connection
+
 DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'research_metrics.db')
 
+# Функции вида hook(sql, duration), вызываемые после каждого SQL-запроса
+_query_hooks = []
+
+
+def add_query_hook(hook):
+    """Подписаться на выполненные SQL-запросы (телеметрия, профилирование)."""
+    _query_hooks.append(hook)
+
+
+def _notify_query(sql, duration):
+    for hook in _query_hooks:
+        hook(sql, duration)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий время выполнения и выборки SQL-запросов."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _notify_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _notify_query(sql, time.perf_counter() - start)
+
+    # Основная работа SQLite для SELECT происходит при выборке строк,
+    # поэтому её время добавляем к тому же запросу
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _notify_query(None, time.perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            _notify_query(None, time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _notify_query(None, time.perf_counter() - start)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого идут через TracedCursor."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class WriterConnection(TracedConnection):
+    """
+    Соединение потока-писателя (app/writer.py). Транзакцией управляет
+    писатель, поэтому commit() внутри функций моделей ничего не делает.
+    """
+
+    def commit(self):
+        pass
+
+
+# Методы, которые не должны ничего менять в БД
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def writes_db(view):
+    """Пометить обработчик GET, которому нужна запись в БД (например, logout)."""
+    view.writes_db = True
+    return view
+
+
+def _is_read_only_request():
+    if not has_request_context() or request.method not in SAFE_METHODS:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return not getattr(view, 'writes_db', False)
+
+
+def check_writable():
+    """Запись из безопасного запроса — ошибка, как и в соединении только для чтения."""
+    if _is_read_only_request():
+        raise sqlite3.OperationalError('attempt to write a readonly database')
+
+
+def connect(read_only=False, factory=TracedConnection):
+    """
+    Новое соединение с БД. Соединение только для чтения открывается с
+    mode=ro и PRAGMA query_only: попытка записи сразу завершается ошибкой,
+    а в режиме WAL такие соединения не блокируют и не ждут писателей.
+    """
+    if read_only:
+        uri = 'file:%s?mode=ro' % pathname2url(os.path.abspath(DATABASE))
+        db = sqlite3.connect(uri, uri=True, factory=factory)
+        db.execute("PRAGMA query_only = 1")
+    else:
+        db = sqlite3.connect(DATABASE, factory=factory)
+        # В режиме WAL NORMAL сохраняет целостность и избавляет от fsync на каждый коммит
+        db.execute("PRAGMA synchronous = NORMAL")
+    # Внешние ключи (и ON DELETE CASCADE) SQLite проверяет только по запросу
+    db.execute("PRAGMA foreign_keys = ON")
+    db.row_factory = sqlite3.Row
+    return db
 
-def get_db():
-    db = getattr(g, '_database', None)
+
+def get_db(write=None):
+    """
+    Соединение текущего запроса. По умолчанию безопасные запросы (GET и т.п.)
+    получают соединение только для чтения, остальные — на запись.
+    write=True/False позволяет выбрать явно.
+    В потоке-писателе всегда возвращается соединение писателя.
+    """
+    db = writer_connection()
+    if db is not None:
+        return db
+    if write is None:
+        write = not _is_read_only_request()
+    attr = '_database' if write else '_read_database'
+    db = getattr(g, attr, None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = connect(read_only=not write)
+        setattr(g, attr, db)
     return db
 
 
+def detach_db():
+    """
+    Забрать у запроса его соединение только для чтения: в конце запроса оно
+    не закрывается, закрывает его вызывающий. Нужно потоковым ответам,
+    которые дочитывают курсоры уже после завершения обработчика.
+    """
+    return g.pop('_read_database', None)
+
+
 def close_db(e=None):
-    db = getattr(g, '_database', None)
-    if db is not None:
+    for attr in ('_database', '_read_database'):
+        db = g.pop(attr, None)
+        if db is not None:
+            db.close()
+
+
+def init_db(wal=True):
+    """
+    Подготовка файла БД при старте: журнал WAL (сохраняется в самом файле)
+    и недостающие миграции схемы (app/migrations.py).
+    """
+    db = sqlite3.connect(DATABASE)
+    try:
+        if wal:
+            db.execute("PRAGMA journal_mode = WAL")
+        migrate(db)
+    finally:
         db.close()
 
 
 # ==== USERS ====
 def create_user(fio, email, password, role):
+    # Хэш считается до постановки в очередь, чтобы не задерживать писателя
+    _insert_user(fio, email, hash_password(password), role)
+
+
+@write_operation
+def _insert_user(fio, email, pw_hash, role):
     db = get_db()
-    pw_hash = generate_password_hash(password)
     db.execute(
         "INSERT INTO users (fio, email, password, role) VALUES (?, ?, ?, ?)",
         (fio, email, pw_hash, role)
@@ -33,6 +207,7 @@ def create_user(fio, email, password, role):
     db.commit()
 
 
+@request_memo
 def get_user_by_email(email):
     db = get_db()
     user = db.execute(
@@ -41,6 +216,7 @@ def get_user_by_email(email):
     return user
 
 
+@request_memo
 def get_user_by_id(user_id):
     db = get_db()
     user = db.execute(
@@ -49,10 +225,77 @@ def get_user_by_id(user_id):
     return user
 
 
+# Кэш данных текущего пользователя: user_id -> (момент истечения, данные).
+# Кэш локален для процесса, поэтому в других процессах изменения
+# становятся видны не позже чем через TTL. Истёкшие записи вычищаются
+# при вставке, не чаще раза за TTL.
+_user_context_cache = {}
+_user_context_prune = [0.0]  # момент следующей чистки
+
+
+def get_user_context(user_id, ttl=30):
+    """
+    Облегчённые данные пользователя для g.user (без хэша пароля),
+    только для чтения. При попадании в кэш к БД не обращается.
+    """
+    now = time.monotonic()
+    entry = _user_context_cache.get(user_id)
+    if entry is not None and entry[0] > now:
+        record_cache('user_context', True)
+        return entry[1]
+    record_cache('user_context', False)
+    db = get_db()
+    row = db.execute(
+        "SELECT id, fio, email, role, lecturer_id FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    user = MappingProxyType(dict(row)) if row else None
+    if now >= _user_context_prune[0]:
+        _user_context_prune[0] = now + ttl
+        # Копия списка: другие потоки могут одновременно добавлять записи
+        for key, (expires, _) in list(_user_context_cache.items()):
+            if expires <= now:
+                _user_context_cache.pop(key, None)
+    _user_context_cache[user_id] = (now + ttl, user)
+    return user
+
+
+def invalidate_user_context(user_id):
+    _user_context_cache.pop(user_id, None)
+
+
+def _invalidate_lecturer_users(db, lecturer_id):
+    """После коммита сбросить кэш g.user учётных записей, привязанных к преподавателю."""
+    user_ids = [row[0] for row in db.execute("SELECT id FROM users WHERE lecturer_id = ?", (lecturer_id,))]
+    def invalidate():
+        for user_id in user_ids:
+            invalidate_user_context(user_id)
+    if user_ids:
+        after_commit(invalidate)
+
+
 def check_user_password(user, password):
-    return check_password_hash(user["password"], password)
+    """
+    Проверка пароля в пуле хэширования. При успешном входе хэш,
+    созданный с устаревшими параметрами, пересчитывается с текущими.
+    """
+    if not verify_password(user["password"], password):
+        return False
+    if needs_rehash(user["password"]):
+        _store_password_hash(user["id"], hash_password(password))
+    return True
+
+
+@write_operation
+def _store_password_hash(user_id, pw_hash):
+    db = get_db()
+    db.execute(
+        "UPDATE users SET password = ? WHERE id = ?",
+        (pw_hash, user_id)
+    )
+    db.commit()
 
 
+@request_memo
 def get_all_users():
     db = get_db()
     return db.execute(
@@ -60,6 +303,7 @@ def get_all_users():
     ).fetchall()
 
 
+@write_operation
 def update_user(user_id, fio, email, role):
     db = get_db()
     db.execute(
@@ -67,31 +311,41 @@ def update_user(user_id, fio, email, role):
         (fio, email, role, user_id)
     )
     db.commit()
+    after_commit(lambda: invalidate_user_context(user_id))
 
 
+@write_operation
 def delete_user(user_id):
     db = get_db()
+    # Записи журнала сохраняются без автора
+    db.execute("UPDATE logs SET user_id = NULL WHERE user_id = ?", (user_id,))
     db.execute("DELETE FROM users WHERE id = ?", (user_id,))
     db.commit()
+    after_commit(lambda: invalidate_user_context(user_id))
 
 
+@write_operation
 def block_user(user_id):
     db = get_db()
     db.execute(
         "UPDATE users SET role = 'blocked' WHERE id = ?", (user_id,)
     )
     db.commit()
+    after_commit(lambda: invalidate_user_context(user_id))
 
 
+@write_operation
 def set_user_role(user_id, new_role):
     db = get_db()
     db.execute(
         "UPDATE users SET role = ? WHERE id = ?", (new_role, user_id)
     )
     db.commit()
+    after_commit(lambda: invalidate_user_context(user_id))
 
 
 # ==== LECTURERS ====
+@write_operation
 def create_lecturer(fio, position, department, academic_degree, orcid, email):
     db = get_db()
     db.execute(
@@ -102,6 +356,7 @@ def create_lecturer(fio, position, department, academic_degree, orcid, email):
     db.commit()
 
 
+@request_memo
 def get_lecturer_by_id(lecturer_id):
     db = get_db()
     return db.execute(
@@ -109,13 +364,19 @@ def get_lecturer_by_id(lecturer_id):
     ).fetchone()
 
 
-def get_all_lecturers():
+@request_memo
+def get_all_lecturers(fields=None):
+    """Все преподаватели; fields — только эти столбцы (см. app/records.py)."""
     db = get_db()
-    return db.execute(
-        "SELECT * FROM lecturers"
-    ).fetchall()
+    return records(db, 'Lecturer', "SELECT %s FROM lecturers" % columns(fields))
+
+
+def iter_lecturers(fields=None):
+    db = get_db()
+    return iter_records(db, 'Lecturer', "SELECT %s FROM lecturers" % columns(fields))
 
 
+@write_operation
 def update_lecturer(lecturer_id, fio, position, department, academic_degree, orcid, email):
     db = get_db()
     db.execute(
@@ -126,13 +387,19 @@ def update_lecturer(lecturer_id, fio, position, department, academic_degree, orc
     db.commit()
 
 
+@write_operation
 def delete_lecturer(lecturer_id):
     db = get_db()
+    # Связи с публикациями удаляются каскадно; метрики и привязку учётной записи — явно
+    db.execute("DELETE FROM metrics WHERE lecturer_id = ?", (lecturer_id,))
+    _invalidate_lecturer_users(db, lecturer_id)
+    db.execute("UPDATE users SET lecturer_id = NULL WHERE lecturer_id = ?", (lecturer_id,))
     db.execute("DELETE FROM lecturers WHERE id = ?", (lecturer_id,))
     db.commit()
 
 
 # ==== PUBLICATIONS ====
+@write_operation
 def create_publication(title, year, journal, source, link, citations, doi, lecturer_ids, file_path=None):
     """
     Создаёт публикацию с привязкой к одному или нескольким преподавателям.
@@ -150,14 +417,11 @@ def create_publication(title, year, journal, source, link, citations, doi, lectu
     )
     pub_id = cursor.lastrowid
     # Привязка к преподавателям
-    for lid in lecturer_ids:
-        cursor.execute(
-            "INSERT INTO lecturer_publications (lecturer_id, publication_id) VALUES (?, ?)",
-            (lid, pub_id)
-        )
+    _sync_publication_authors(db, pub_id, lecturer_ids, current=())
     db.commit()
 
 
+@request_memo
 def get_publication_by_id(pub_id):
     db = get_db()
     pub = db.execute(
@@ -172,25 +436,72 @@ def get_publication_by_id(pub_id):
     return pub, lecturers
 
 
-def get_all_publications():
+@request_memo
+def get_all_publications(fields=None):
+    """Все публикации, новые первыми; fields — только эти столбцы (см. app/records.py)."""
     db = get_db()
-    pubs = db.execute(
-        "SELECT * FROM publications ORDER BY year DESC"
-    ).fetchall()
-    return pubs
+    return records(db, 'Publication', "SELECT %s FROM publications ORDER BY year DESC" % columns(fields))
+
+
+def iter_publications(fields=None):
+    """Как get_all_publications, но порциями — для экспорта и больших выборок."""
+    db = get_db()
+    return iter_records(db, 'Publication', "SELECT %s FROM publications ORDER BY year DESC" % columns(fields))
 
 
-def get_publications_by_lecturer(lecturer_id):
+@request_memo
+def get_publications_by_lecturer(lecturer_id, fields=None):
     db = get_db()
-    pubs = db.execute(
-        "SELECT p.* FROM publications p "
+    return records(
+        db, 'Publication',
+        "SELECT %s FROM publications p "
         "JOIN lecturer_publications lp ON p.id = lp.publication_id "
-        "WHERE lp.lecturer_id = ? ORDER BY p.year DESC",
+        "WHERE lp.lecturer_id = ? ORDER BY p.year DESC" % columns(fields, 'p.'),
         (lecturer_id,)
-    ).fetchall()
-    return pubs
+    )
 
 
+@request_memo
+def get_authors_for_publications(pub_ids=None):
+    """
+    Авторы публикаций одним запросом: {pub_id: [строки lecturers (id, fio)]}.
+    pub_ids=None — для всех публикаций.
+    """
+    db = get_db()
+    sql = (
+        "SELECT lp.publication_id, l.id, l.fio FROM lecturer_publications lp "
+        "JOIN lecturers l ON l.id = lp.lecturer_id"
+    )
+    params = ()
+    if pub_ids is not None:
+        pub_ids = list(pub_ids)
+        if not pub_ids:
+            return {}
+        sql += " WHERE lp.publication_id IN (%s)" % ','.join('?' * len(pub_ids))
+        params = pub_ids
+    sql += " ORDER BY lp.publication_id, l.id"
+    authors = {}
+    for row in db.execute(sql, params).fetchall():
+        authors.setdefault(row['publication_id'], []).append(row)
+    return authors
+
+
+@request_memo
+def get_publication_stats_by_lecturer():
+    """Количество публикаций и сумма цитирований по каждому преподавателю."""
+    db = get_db()
+    return {
+        row['lecturer_id']: row
+        for row in db.execute(
+            "SELECT lp.lecturer_id, COUNT(*) AS publications, "
+            "COALESCE(SUM(CAST(p.citations AS INTEGER)), 0) AS citations "
+            "FROM lecturer_publications lp JOIN publications p ON p.id = lp.publication_id "
+            "GROUP BY lp.lecturer_id"
+        ).fetchall()
+    }
+
+
+@write_operation
 def update_publication(pub_id, title, year, journal, source, link, citations, doi, lecturer_ids):
     db = get_db()
     db.execute(
@@ -198,38 +509,115 @@ def update_publication(pub_id, title, year, journal, source, link, citations, do
         "WHERE id = ?",
         (title, year, journal, source, link, citations, doi, pub_id)
     )
-    # Сначала удалить старые связи
-    db.execute("DELETE FROM lecturer_publications WHERE publication_id = ?", (pub_id,))
-    # Добавить новые связи
-    for lid in lecturer_ids:
-        db.execute(
-            "INSERT INTO lecturer_publications (lecturer_id, publication_id) VALUES (?, ?)",
-            (lid, pub_id)
+    _sync_publication_authors(db, pub_id, lecturer_ids)
+    db.commit()
+
+
+def _sync_publication_authors(db, pub_id, lecturer_ids, current=None):
+    """
+    Привести авторов публикации к lecturer_ids, меняя только различающиеся
+    связи. current — уже известные авторы (None — прочитать из БД).
+    """
+    if current is None:
+        current = {
+            row[0] for row in db.execute(
+                "SELECT lecturer_id FROM lecturer_publications WHERE publication_id = ?", (pub_id,)
+            ).fetchall()
+        }
+    wanted = dict.fromkeys(lecturer_ids)  # без повторов, в исходном порядке
+    removed = [(pub_id, lid) for lid in current if lid not in wanted]
+    added = [(lid, pub_id) for lid in wanted if lid not in current]
+    if removed:
+        db.executemany(
+            "DELETE FROM lecturer_publications WHERE publication_id = ? AND lecturer_id = ?", removed
+        )
+    if added:
+        db.executemany(
+            "INSERT INTO lecturer_publications (lecturer_id, publication_id) VALUES (?, ?)", added
         )
+
+
+@write_operation
+def reassign_publications(from_lecturer_id, to_lecturer_id, pub_ids=None):
+    """
+    Передать публикации одного преподавателя другому (например, при слиянии
+    дубликатов). pub_ids=None — все публикации. Публикации, где новый
+    преподаватель уже указан автором, просто теряют старую связь.
+    """
+    if from_lecturer_id == to_lecturer_id:
+        return
+    db = get_db()
+    where, params = "", ()
+    if pub_ids is not None:
+        pub_ids = list(pub_ids)
+        if not pub_ids:
+            return
+        where = " AND publication_id IN (%s)" % ','.join('?' * len(pub_ids))
+        params = tuple(pub_ids)
+    db.execute(
+        "DELETE FROM lecturer_publications WHERE lecturer_id = ?" + where +
+        " AND publication_id IN (SELECT publication_id FROM lecturer_publications WHERE lecturer_id = ?)",
+        (from_lecturer_id,) + params + (to_lecturer_id,)
+    )
+    db.execute(
+        "UPDATE lecturer_publications SET lecturer_id = ? WHERE lecturer_id = ?" + where,
+        (to_lecturer_id, from_lecturer_id) + params
+    )
     db.commit()
 
 
+@write_operation
+def merge_lecturers(duplicate_id, lecturer_id):
+    """
+    Слить дубликат преподавателя в основную запись: публикации и учётные
+    записи переходят к ней, метрики — за годы, которых у неё нет;
+    дубликат удаляется. ValueError — одна и та же запись.
+    """
+    if duplicate_id == lecturer_id:
+        raise ValueError('Нельзя объединить преподавателя с самим собой')
+    db = get_db()
+    reassign_publications(duplicate_id, lecturer_id)
+    _invalidate_lecturer_users(db, duplicate_id)
+    db.execute("UPDATE users SET lecturer_id = ? WHERE lecturer_id = ?", (lecturer_id, duplicate_id))
+    db.execute(
+        "UPDATE metrics SET lecturer_id = ? WHERE lecturer_id = ? "
+        "AND year NOT IN (SELECT year FROM metrics WHERE lecturer_id = ?)",
+        (lecturer_id, duplicate_id, lecturer_id)
+    )
+    delete_lecturer(duplicate_id)
+
+
+@write_operation
 def delete_publication(pub_id):
     db = get_db()
-    db.execute("DELETE FROM lecturer_publications WHERE publication_id = ?", (pub_id,))
+    # Связи с преподавателями удаляются каскадно
     db.execute("DELETE FROM publications WHERE id = ?", (pub_id,))
     db.commit()
 
 
+@write_operation
 def update_publication_status(pub_id, status, review_comment=None, revision_deadline=None, reviewer_id=None):
     """
     Обновить статус публикации:
     status: 'new', 'approved', 'rejected', 'revision_required'
+    revision_deadline — дата или строка с датой, хранится как 'YYYY-MM-DD'.
     """
     db = get_db()
+    deadline = parse_deadline(revision_deadline)
+    old = db.execute("SELECT title, status, revision_deadline FROM publications WHERE id = ?", (pub_id,)).fetchone()
     db.execute(
         "UPDATE publications SET status = ?, review_comment = ?, revision_deadline = ?, reviewer_id = ? "
         "WHERE id = ?",
-        (status, review_comment, revision_deadline, reviewer_id, pub_id)
+        (status, review_comment, deadline, reviewer_id, pub_id)
     )
+    # Уведомление авторам — в той же транзакции, отправка в фоне (app/mailer.py)
+    if old is not None and (old['status'] != status or old['revision_deadline'] != deadline):
+        if enqueue_review_notification(db, pub_id, old['title'], status, review_comment, deadline):
+            after_commit(lambda: wake('mailer'))
     db.commit()
 
 
+@request_memo
 def get_publications_for_review():
     """
     Публикации для проверки сотрудником научного отдела:
@@ -243,6 +631,7 @@ def get_publications_for_review():
     ).fetchall()
 
 
+@request_memo
 def get_publications_with_revision_required():
     """
     Публикации, отправленные на доработку (контроль сроков).
@@ -253,6 +642,15 @@ def get_publications_with_revision_required():
     ).fetchall()
 
 
+@write_operation
+def mark_deadline_alerts_seen(reviewer_id):
+    """Отметить сводку сроков доработки проверяющего как просмотренную."""
+    db = get_db()
+    db.execute("UPDATE deadline_alerts SET seen = 1 WHERE reviewer_id = ? AND seen = 0", (reviewer_id,))
+    db.commit()
+
+
+@request_memo
 def get_lecturer_for_user(user_id):
     """
     Находим преподавателя, связанного с пользователем через поле users.lecturer_id.
@@ -270,6 +668,7 @@ def get_lecturer_for_user(user_id):
 
 
 # ==== METRICS ====
+@write_operation
 def set_metrics(lecturer_id, year, total_publications, total_citations, h_index, rinz, scopus, wos, gs):
     db = get_db()
     exists = db.execute(
@@ -291,6 +690,7 @@ def set_metrics(lecturer_id, year, total_publications, total_citations, h_index,
     db.commit()
 
 
+@request_memo
 def get_metrics_by_lecturer(lecturer_id):
     db = get_db()
     return db.execute(
@@ -299,7 +699,23 @@ def get_metrics_by_lecturer(lecturer_id):
     ).fetchall()
 
 
+@request_memo
+def get_latest_metrics_by_lecturer():
+    """Последняя (по году) строка метрик каждого преподавателя: {lecturer_id: строка}."""
+    db = get_db()
+    return {
+        row['lecturer_id']: row
+        for row in db.execute(
+            "SELECT * FROM ("
+            "  SELECT m.*, ROW_NUMBER() OVER (PARTITION BY lecturer_id ORDER BY year DESC) AS rn "
+            "  FROM metrics m"
+            ") WHERE rn = 1"
+        ).fetchall()
+    }
+
+
 # ==== LOGGING ====
+@write_operation
 def log_action(user_id, action, description):
     db = get_db()
     db.execute(
@@ -309,16 +725,25 @@ def log_action(user_id, action, description):
     db.commit()
 
 
-def get_all_logs():
+@request_memo
+def get_logs(filters, limit, offset=0):
+    """Страница журнала по фильтрам (см. app/logarchive.normalize_filters)."""
+    return query_logs(get_db(), filters, limit, offset)
+
+
+def iter_logs(filters=None):
+    """Все записи журнала по фильтрам, порциями."""
+    return iter_records(get_db(), 'LogEntry', *logs_query(filters or {}))
+
+
+@request_memo
+def get_log_actions():
     db = get_db()
-    return db.execute(
-        "SELECT logs.*, u.fio AS user_fio FROM logs "
-        "LEFT JOIN users u ON logs.user_id = u.id "
-        "ORDER BY logs.timestamp DESC"
-    ).fetchall()
+    return [row[0] for row in db.execute("SELECT DISTINCT action FROM logs ORDER BY action")]
 
 
 # ==== FEEDBACK ====
+@write_operation
 def create_feedback(name, email, message):
     db = get_db()
     db.execute(
@@ -328,13 +753,18 @@ def create_feedback(name, email, message):
     db.commit()
 
 
-def get_all_feedback():
+@request_memo
+def get_all_feedback(fields=None):
     db = get_db()
-    return db.execute(
-        "SELECT * FROM feedback ORDER BY created_at DESC"
-    ).fetchall()
+    return records(db, 'Feedback', "SELECT %s FROM feedback ORDER BY created_at DESC" % columns(fields))
+
+
+def iter_feedback(fields=None):
+    db = get_db()
+    return iter_records(db, 'Feedback', "SELECT %s FROM feedback ORDER BY created_at DESC" % columns(fields))
 
 
+@write_operation
 def delete_feedback(feedback_id):
     db = get_db()
     db.execute("DELETE FROM feedback WHERE id = ?", (feedback_id,))
@@ -342,6 +772,7 @@ def delete_feedback(feedback_id):
 
 
 # ==== NEWS ====
+@write_operation
 def create_news(title, content):
     db = get_db()
     db.execute(
@@ -351,6 +782,7 @@ def create_news(title, content):
     db.commit()
 
 
+@request_memo
 def get_all_news():
     db = get_db()
     return db.execute(
@@ -358,6 +790,7 @@ def get_all_news():
     ).fetchall()
 
 
+@request_memo
 def get_news_by_id(news_id):
     db = get_db()
     return db.execute(
@@ -365,6 +798,7 @@ def get_news_by_id(news_id):
     ).fetchone()
 
 
+@write_operation
 def update_news(news_id, title, content):
     db = get_db()
     db.execute(
@@ -374,6 +808,7 @@ def update_news(news_id, title, content):
     db.commit()
 
 
+@write_operation
 def delete_news(news_id):
     db = get_db()
     db.execute("DELETE FROM news WHERE id = ?", (news_id,))
@@ -381,6 +816,7 @@ def delete_news(news_id):
 
 
 # ==== FAQ ====
+@write_operation
 def create_faq(question, answer):
     db = get_db()
     db.execute(
@@ -390,6 +826,7 @@ def create_faq(question, answer):
     db.commit()
 
 
+@request_memo
 def get_all_faq():
     db = get_db()
     return db.execute(
@@ -397,6 +834,7 @@ def get_all_faq():
     ).fetchall()
 
 
+@request_memo
 def get_faq_by_id(faq_id):
     db = get_db()
     return db.execute(
@@ -404,6 +842,7 @@ def get_faq_by_id(faq_id):
     ).fetchone()
 
 
+@write_operation
 def update_faq(faq_id, question, answer):
     db = get_db()
     db.execute(
@@ -413,6 +852,7 @@ def update_faq(faq_id, question, answer):
     db.commit()
 
 
+@write_operation
 def delete_faq(faq_id):
     db = get_db()
     db.execute("DELETE FROM faq WHERE id = ?", (faq_id,))
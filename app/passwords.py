@@ -0,0 +1,128 @@
+# app/passwords.py
+
+"""
+Хэширование и проверка паролей в отдельном ограниченном пуле потоков.
+
+scrypt/pbkdf2 из hashlib отпускают GIL, поэтому пул из нескольких потоков
+реально занимает несколько ядер — но не больше PASSWORD_POOL_WORKERS.
+Если в пуле и очереди нет мест, запрос сразу получает PasswordPoolBusy
+(приложение отвечает 503), а не ждёт, занимая воркер. Массовое создание
+пользователей хэширует пароли в том же пуле (hash_passwords).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.telemetry import inc
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_SALT_LENGTH': 16,
+    'PASSWORD_POOL_WORKERS': None,
+    'PASSWORD_POOL_QUEUE': 32,
+    'PASSWORD_POOL_TIMEOUT': 10,
+}
+
+
+class PasswordPoolBusy(Exception):
+    """Пул хэширования паролей перегружен — запрос нужно повторить позже."""
+
+
+_lock = threading.Lock()
+_pool = {'pid': None, 'executor': None, 'slots': None, 'workers': 0}
+_method_prefixes = {}
+
+
+def _config(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def _executor():
+    # Пул создаётся лениво и пересоздаётся после fork: потоки не наследуются
+    if _pool['pid'] != os.getpid():
+        with _lock:
+            if _pool['pid'] != os.getpid():
+                workers = _config('PASSWORD_POOL_WORKERS') or max(1, (os.cpu_count() or 2) // 2)
+                _pool['executor'] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+                _pool['slots'] = threading.BoundedSemaphore(workers + _config('PASSWORD_POOL_QUEUE'))
+                _pool['workers'] = workers
+                _pool['pid'] = os.getpid()
+    return _pool['executor'], _pool['slots']
+
+
+def _run(fn, *args):
+    executor, slots = _executor()
+    if not slots.acquire(blocking=False):
+        inc('password_pool_rejected_total')
+        raise PasswordPoolBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_config('PASSWORD_POOL_TIMEOUT'))
+    except FutureTimeout:
+        inc('password_pool_rejected_total')
+        raise PasswordPoolBusy()
+
+
+def hash_password(password):
+    """Хэш пароля с параметрами из конфигурации (выполняется в пуле)."""
+    method, salt_length = _config('PASSWORD_HASH_METHOD'), _config('PASSWORD_SALT_LENGTH')
+    return _run(generate_password_hash, password, method, salt_length)
+
+
+def hash_passwords(passwords):
+    """
+    Хэши списка паролей (массовое создание пользователей). Пакет ждёт
+    свободных мест, а не получает PasswordPoolBusy, но держит в пуле не
+    больше PASSWORD_POOL_WORKERS паролей сразу — очередь остаётся входам.
+    """
+    method, salt_length = _config('PASSWORD_HASH_METHOD'), _config('PASSWORD_SALT_LENGTH')
+    executor, slots = _executor()
+    batch = threading.BoundedSemaphore(_pool['workers'])
+
+    def release(_):
+        slots.release()
+        batch.release()
+
+    futures = []
+    for password in passwords:
+        batch.acquire()
+        slots.acquire()
+        try:
+            future = executor.submit(generate_password_hash, password, method, salt_length)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        futures.append(future)
+    return [future.result() for future in futures]
+
+
+def verify_password(pw_hash, password):
+    """Проверка пароля по хэшу (выполняется в пуле)."""
+    return _run(check_password_hash, pw_hash, password)
+
+
+def _configured_prefix():
+    # werkzeug дописывает параметры по умолчанию (например, число итераций
+    # pbkdf2), поэтому префикс узнаём по реальному хэшу
+    method = _config('PASSWORD_HASH_METHOD')
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = _method_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return prefix
+
+
+def needs_rehash(pw_hash):
+    """True, если хэш создан с параметрами, отличными от текущих."""
+    return pw_hash.split('$', 1)[0] != _configured_prefix()
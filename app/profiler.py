@@ -0,0 +1,295 @@
+# app/profiler.py
+
+"""
+Профилирование отдельных запросов по требованию.
+
+Администратор включает профилирование заголовком ``X-Profile: 1`` или
+параметром ``?_profile=1``; кроме того, доля PROFILER_SAMPLE_RATE всех
+запросов профилируется случайным образом. Для каждого запроса сохраняются:
+  * <id>.pstats — результат cProfile (открывается pstats / snakeviz);
+  * <id>.folded — «свёрнутые» стеки сэмплирующего профилировщика
+    (формат flamegraph.pl / speedscope);
+  * <id>.json — сводка: время шаблонов и SQL по функциям приложения
+    (ближайшей по стеку функции модуля из app/).
+
+Одновременно профилируется только один запрос процесса (с Python 3.12
+cProfile допускает лишь один включённый профилировщик); запросы,
+пришедшие, пока он занят, выполняются без профилирования.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from io import StringIO
+
+from flask import current_app, g, request, before_render_template, template_rendered
+
+from app import models
+from app.memo import memo_stats
+
+_APP_DIR = os.path.normcase(os.path.dirname(os.path.abspath(models.__file__))) + os.sep
+# Модули-посредники между запросом и вызвавшей его функцией приложения
+_DB_LAYER_FILES = {
+    _APP_DIR + name for name in ('profiler.py', 'records.py', 'memo.py', 'writer.py')
+}
+# Внутренние функции слоя БД, которые не считаются «вызывающей» функцией
+_DB_INTERNALS = {
+    'execute', 'executemany', 'fetchone', 'fetchmany', 'fetchall',
+    'cursor', 'get_db', '_notify_query',
+}
+_PROFILE_ID_RE = re.compile(r'^[\w.-]+$')
+
+_local = threading.local()
+# Занят, пока какой-либо поток процесса профилирует запрос
+_busy = threading.Lock()
+
+
+class _StackSampler(threading.Thread):
+    """Поток, периодически снимающий стек профилируемого потока."""
+
+    def __init__(self, target_ident, interval):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (
+                    code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class _ProfileSession:
+    """Состояние профилирования одного запроса."""
+
+    def __init__(self, interval):
+        self.started = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.sampler = _StackSampler(threading.get_ident(), interval)
+        self.sql = {}            # функция приложения -> [запросов, секунд]
+        self.templates = {}      # шаблон -> [рендеров, секунд, секунд SQL]
+        self.template_stack = []  # [(имя, начало)] — шаблоны, рендерящиеся сейчас
+
+    def start(self):
+        """Включить профилирование; False — профилировщик процесса уже занят."""
+        if not _busy.acquire(blocking=False):
+            return False
+        try:
+            self.profile.enable()
+        except ValueError:  # включён кем-то вне этого модуля
+            _busy.release()
+            return False
+        self.sampler.start()
+        return True
+
+    def stop(self):
+        try:
+            self.profile.disable()
+            self.sampler.stop()
+        finally:
+            _busy.release()
+        return time.perf_counter() - self.started
+
+
+def _caller_function():
+    """
+    Найти ближайшую по стеку функцию модуля из app/, выполнившую запрос:
+    имя вида models.get_all_lecturers или analytics.get_snapshot.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.normcase(code.co_filename)
+        # Шаблоны тоже лежат в app/, но их кадры — не функции приложения
+        if (filename.startswith(_APP_DIR) and filename.endswith('.py')
+                and filename not in _DB_LAYER_FILES and code.co_name not in _DB_INTERNALS):
+            module = filename[len(_APP_DIR):-3].replace(os.sep, '.')
+            return '%s.%s' % (module, code.co_name)
+        frame = frame.f_back
+    return '<вне app/>'
+
+
+def _on_query(sql, duration):
+    session = getattr(_local, 'session', None)
+    if session is None:
+        return
+    stat = session.sql.setdefault(_caller_function(), [0, 0.0])
+    if sql is not None:
+        stat[0] += 1
+    stat[1] += duration
+    if session.template_stack:
+        name = session.template_stack[-1][0]
+        session.templates.setdefault(name, [0, 0.0, 0.0])[2] += duration
+
+
+def _on_before_render(sender, template, context, **extra):
+    session = getattr(_local, 'session', None)
+    if session is not None:
+        session.template_stack.append((template.name, time.perf_counter()))
+
+
+def _on_rendered(sender, template, context, **extra):
+    session = getattr(_local, 'session', None)
+    if session is not None and session.template_stack:
+        name, started = session.template_stack.pop()
+        stat = session.templates.setdefault(name, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += time.perf_counter() - started
+
+
+def _profile_dir():
+    return current_app.config['PROFILER_DIR']
+
+
+def _wants_profile():
+    if not current_app.config.get('PROFILER_ENABLED', True):
+        return False
+    user = getattr(g, 'user', None)
+    flag = request.headers.get('X-Profile') or request.args.get('_profile')
+    if flag and flag != '0' and user is not None and user['role'] == 'admin':
+        return True
+    rate = current_app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _before_request():
+    if getattr(_local, 'session', None) is None and _wants_profile():
+        session = _ProfileSession(current_app.config.get('PROFILER_INTERVAL', 0.005))
+        if session.start():
+            _local.session = session
+
+
+def _after_request(response):
+    session = getattr(_local, 'session', None)
+    if session is not None:
+        _local.session = None
+        profile_id = _save(session, session.stop(), response.status_code)
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _teardown_request(exc=None):
+    # Запрос завершился исключением до after_request — сохраняем то, что есть
+    session = getattr(_local, 'session', None)
+    if session is not None:
+        _local.session = None
+        _save(session, session.stop(), 500)
+
+
+def _save(session, total, status):
+    directory = _profile_dir()
+    endpoint = (request.endpoint or 'unknown').replace('.', '-')
+    profile_id = '%s-%s-%06d' % (time.strftime('%Y%m%d-%H%M%S'), endpoint, random.randrange(10 ** 6))
+    base = os.path.join(directory, profile_id)
+
+    session.profile.dump_stats(base + '.pstats')
+    with open(base + '.folded', 'w', encoding='utf-8') as f:
+        for stack, count in sorted(session.sampler.stacks.items()):
+            f.write('%s %d\n' % (stack, count))
+
+    summary = {
+        'id': profile_id,
+        'method': request.method,
+        'url': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'total_seconds': total,
+        'sql_seconds': sum(stat[1] for stat in session.sql.values()),
+        'sql_queries': sum(stat[0] for stat in session.sql.values()),
+        'sql_by_function': sorted(
+            ([name, stat[0], stat[1]] for name, stat in session.sql.items()),
+            key=lambda item: -item[2]),
+        'templates': sorted(
+            ([name, stat[0], stat[1], stat[2]] for name, stat in session.templates.items()),
+            key=lambda item: -item[2]),
+        'samples': sum(session.sampler.stacks.values()),
+        'memo': dict(zip(('hits', 'misses'), memo_stats())),
+    }
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+
+    _prune(directory, current_app.config.get('PROFILER_KEEP', 200))
+    return profile_id
+
+
+def _prune(directory, keep):
+    summaries = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in summaries[:-keep] if keep else []:
+        for ext in ('.json', '.pstats', '.folded'):
+            try:
+                os.remove(os.path.join(directory, name[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+# ==== Просмотр результатов ====
+
+def list_profiles():
+    """Сводки сохранённых профилей, новые первыми."""
+    directory = _profile_dir()
+    result = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                result.append(json.load(f))
+    return result
+
+
+def get_profile(profile_id, limit=40):
+    """Сводка профиля и текстовый отчёт pstats (топ функций по cumulative)."""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None, None
+    base = os.path.join(_profile_dir(), profile_id)
+    if not os.path.exists(base + '.json'):
+        return None, None
+    with open(base + '.json', encoding='utf-8') as f:
+        summary = json.load(f)
+    out = StringIO()
+    stats = pstats.Stats(base + '.pstats', stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return summary, out.getvalue()
+
+
+def profile_file(profile_id, ext):
+    """Имя файла профиля для выдачи через send_from_directory (или None)."""
+    if not _PROFILE_ID_RE.match(profile_id) or ext not in ('pstats', 'folded'):
+        return None
+    filename = '%s.%s' % (profile_id, ext)
+    if not os.path.exists(os.path.join(_profile_dir(), filename)):
+        return None
+    return filename
+
+
+def init_profiler(app, base_dir):
+    """Подключить профилировщик. Вызывать после регистрации blueprint'а,
+    чтобы g.user уже был загружен к моменту проверки прав."""
+    if not app.config.get('PROFILER_DIR'):
+        app.config['PROFILER_DIR'] = os.path.join(base_dir, 'profiles')
+    os.makedirs(app.config['PROFILER_DIR'], exist_ok=True)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    models.add_query_hook(_on_query)
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
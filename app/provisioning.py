@@ -0,0 +1,161 @@
+# app/provisioning.py
+
+"""
+Массовое создание учётных записей (например, при приёме новой кафедры).
+
+Источник — CSV со столбцами fio, email и необязательными orcid, role,
+password (разделитель «;» или «,»). Пароли без явного значения
+генерируются utils.generate_password; хэши считаются в ограниченном пуле
+хэширования паролей (app/passwords.py), а все пользователи вставляются
+одним executemany в одной транзакции. Учётные записи преподавателей автоматически связываются
+с таблицей lecturers по email или ORCID.
+"""
+
+import csv
+from io import StringIO
+
+import click
+from flask.cli import with_appcontext
+
+from app.models import get_db
+from app.passwords import hash_passwords
+from app.writer import run_write
+from app.utils import generate_password, is_valid_email
+
+ROLES = ('admin', 'staff', 'lecturer', 'blocked')
+
+
+def parse_csv(text):
+    """Разобрать CSV в список словарей с номером строки файла."""
+    text = text.lstrip('\ufeff')
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=';,')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(StringIO(text), dialect=dialect)
+    rows = []
+    for line_no, raw in enumerate(reader, start=2):
+        row = {(k or '').strip().lower(): (v or '').strip() for k, v in raw.items()}
+        row['line'] = line_no
+        rows.append(row)
+    return rows
+
+
+def provision_users(rows, default_role='lecturer'):
+    """
+    Создать пользователей из разобранных строк.
+    Возвращает отчёт: {'created': [...], 'skipped': [...], 'conflicts': [...]}.
+    В created попадают сгенерированные пароли — их нужно передать пользователям.
+    """
+    db = get_db()
+    report = {'created': [], 'skipped': [], 'conflicts': []}
+
+    lecturers_by_email, lecturers_by_orcid = {}, {}
+    for l in db.execute("SELECT id, email, orcid FROM lecturers"):
+        if l['email']:
+            lecturers_by_email.setdefault(l['email'].strip().lower(), l['id'])
+        if l['orcid']:
+            lecturers_by_orcid.setdefault(l['orcid'].strip(), l['id'])
+    existing_emails = {
+        r['email'].strip().lower() for r in db.execute("SELECT email FROM users") if r['email']
+    }
+    linked_lecturers = {
+        r['lecturer_id'] for r in db.execute("SELECT lecturer_id FROM users WHERE lecturer_id IS NOT NULL")
+    }
+
+    def conflict(row, reason):
+        report['conflicts'].append({'line': row['line'], 'email': row.get('email', ''), 'reason': reason})
+
+    pending = []
+    seen_emails = set()
+    for row in rows:
+        email = row.get('email', '').lower()
+        fio = row.get('fio', '')
+        role = row.get('role') or default_role
+        orcid = row.get('orcid', '')
+        if not fio or not email or not is_valid_email(email):
+            conflict(row, 'Не заполнены ФИО или корректный email')
+            continue
+        if role not in ROLES:
+            conflict(row, 'Неизвестная роль: %s' % role)
+            continue
+        if email in seen_emails:
+            conflict(row, 'Email повторяется в файле')
+            continue
+        seen_emails.add(email)
+        if email in existing_emails:
+            report['skipped'].append({'line': row['line'], 'email': email, 'reason': 'Пользователь уже существует'})
+            continue
+
+        lecturer_id = None
+        if role == 'lecturer':
+            by_email = lecturers_by_email.get(email)
+            by_orcid = lecturers_by_orcid.get(orcid) if orcid else None
+            if by_email and by_orcid and by_email != by_orcid:
+                conflict(row, 'Email и ORCID указывают на разных преподавателей')
+                continue
+            lecturer_id = by_email or by_orcid
+            if lecturer_id in linked_lecturers:
+                conflict(row, 'Преподаватель уже связан с другой учётной записью')
+                continue
+            if lecturer_id:
+                linked_lecturers.add(lecturer_id)
+
+        pending.append({
+            'line': row['line'], 'fio': fio, 'email': email, 'role': role,
+            'lecturer_id': lecturer_id, 'password': row.get('password') or generate_password(10),
+        })
+
+    if not pending:
+        return report
+
+    # Хэши считаем до начала транзакции, чтобы не держать блокировку записи
+    hashes = hash_passwords([p['password'] for p in pending])
+
+    def insert():
+        # Выполняется одной операцией писателя — в одной транзакции.
+        # Возвращает (созданные, пропущенные); отчёт собирает вызывающий поток
+        db = get_db()
+        # Пока считались хэши, кто-то мог создать пользователя с тем же email
+        taken = {
+            r['email'].strip().lower() for r in db.execute("SELECT email FROM users") if r['email']
+        }
+        created = [(p, pw_hash) for p, pw_hash in zip(pending, hashes) if p['email'] not in taken]
+        db.executemany(
+            "INSERT INTO users (fio, email, password, role, lecturer_id) VALUES (?, ?, ?, ?, ?)",
+            [(p['fio'], p['email'], pw_hash, p['role'], p['lecturer_id']) for p, pw_hash in created]
+        )
+        return [p for p, _ in created], [p for p in pending if p['email'] in taken]
+
+    created, skipped = run_write(insert)
+    report['created'].extend(created)
+    report['skipped'].extend(
+        {'line': p['line'], 'email': p['email'], 'reason': 'Пользователь уже существует'} for p in skipped)
+    return report
+
+
+def report_to_csv(report):
+    """Учётные данные созданных пользователей в виде CSV (для рассылки)."""
+    out = StringIO()
+    writer = csv.writer(out, delimiter=';')
+    writer.writerow(['fio', 'email', 'role', 'lecturer_id', 'password'])
+    for p in report['created']:
+        writer.writerow([p['fio'], p['email'], p['role'], p['lecturer_id'] or '', p['password']])
+    return out.getvalue()
+
+
+@click.command('provision-users')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--role', default='lecturer', help='Роль по умолчанию для строк без столбца role.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-',
+              help='Куда записать CSV с паролями созданных пользователей.')
+@with_appcontext
+def provision_users_command(csv_file, role, output):
+    """Массово создать пользователей из CSV-файла."""
+    report = provision_users(parse_csv(csv_file.read()), default_role=role)
+    output.write(report_to_csv(report))
+    for kind in ('skipped', 'conflicts'):
+        for item in report[kind]:
+            click.echo('%s: строка %s (%s): %s' % (kind, item['line'], item['email'], item['reason']), err=True)
+    click.echo('Создано: %d, пропущено: %d, конфликтов: %d' % (
+        len(report['created']), len(report['skipped']), len(report['conflicts'])), err=True)
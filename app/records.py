@@ -0,0 +1,112 @@
+# app/records.py
+
+"""
+Компактные записи результатов запросов.
+
+sqlite3.Row — отдельный объект поверх кортежа значений со ссылкой на
+описание курсора; обращение row['fio'] каждый раз ищет имя перебором
+столбцов. Здесь строка — это сам кортеж значений (подкласс tuple с
+__slots__ = ()), а номера столбцов по именам хранит его класс: один на
+набор столбцов (Publication(id, title, ...)), создаётся при первом
+запросе и переиспользуется. Доступ как у Row — rec['fio'], keys(),
+dict(rec) — и, как у namedtuple, rec.fio; последний самый быстрый,
+поэтому длинные списки в шаблонах читают поля атрибутами.
+
+records() выбирает весь результат сразу, iter_records() — порциями
+через fetchmany, не держа в памяти больше одной порции (для экспорта
+и других больших выборок). columns() проверяет проекцию — список
+нужных столбцов вместо SELECT *.
+"""
+
+from collections import namedtuple
+
+from flask import current_app
+
+_types = {}
+
+
+class Record(tuple):
+    """
+    Строка результата: кортеж значений с доступом по имени столбца.
+    Классы конкретных наборов столбцов создаёт record_type.
+    """
+
+    __slots__ = ()
+    _index = {}
+
+    def keys(self):
+        return list(self._index)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+
+def _getitem(index):
+    # Замыкание вместо поиска self._index и isinstance на каждое обращение
+    position = index.__getitem__
+    item = tuple.__getitem__
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            return item(self, position(key))
+        return item(self, key)
+    return __getitem__
+
+
+def record_type(name, fields):
+    """Класс записи name с полями fields (один на сочетание имени и полей)."""
+    fields = tuple(fields)
+    cls = _types.get((name, fields))
+    if cls is None:
+        index = {field: i for i, field in enumerate(fields)}
+        # Атрибуты rec.fio даёт namedtuple (чтение поля кортежа на C);
+        # неподходящие для атрибутов имена столбцов доступны только как rec['...']
+        base = namedtuple(name, fields, rename=True)
+        namespace = {'__slots__': (), '_index': index, '__getitem__': _getitem(index)}
+        cls = _types.setdefault((name, fields), type(name, (Record, base), namespace))
+    return cls
+
+
+def _typed(cursor, name):
+    cls = record_type(name, [column[0] for column in cursor.description])
+    new = tuple.__new__
+    # row_factory курсора применяется при выборке каждой строки
+    cursor.row_factory = lambda cur, row: new(cls, row)
+    return cursor
+
+
+def columns(names, prefix=''):
+    """
+    Список столбцов для SELECT: '*' при names=None, иначе имена через
+    запятую (с префиксом таблицы). ValueError — не имя столбца.
+    """
+    if names is None:
+        return prefix + '*'
+    names = list(names)
+    if not names or not all(n.isidentifier() for n in names):
+        raise ValueError('Неверный список столбцов: %r' % (names,))
+    return ', '.join(prefix + n for n in names)
+
+
+def records(db, name, sql, params=()):
+    """Все строки запроса записями name."""
+    return _typed(db.execute(sql, params), name).fetchall()
+
+
+def iter_records(db, name, sql, params=(), batch=None):
+    """Строки запроса записями name, выбираемые порциями по batch (FETCH_BATCH)."""
+    # Запрос выполняется сразу, чтобы ошибка в нём не откладывалась до выборки
+    cursor = _typed(db.execute(sql, params), name)
+    return _batches(cursor, batch or current_app.config.get('FETCH_BATCH', 500))
+
+
+def _batches(cursor, batch):
+    try:
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
@@ -15,10 +15,24 @@ from flask import (
     g,
     current_app,
     send_from_directory,
+    abort,
+    jsonify,
+    stream_with_context,
 )
 from werkzeug.utils import secure_filename
 
 from app.models import *
+from app import profiler
+from app.provisioning import parse_csv, provision_users
+from app.viewmodels import dashboard_view, publications_view, reports_view
+from app.analytics import DIMENSIONS, cube_slice
+from app.utils import safe_int
+from app.trends import MAX_YEAR, MIN_YEAR, get_trends
+from app.leaderboards import get_leaderboards
+from app.coauthors import get_coauthor_graph
+from app.deadlines import parse_deadline, reviewer_digest
+from app.logarchive import archived_periods, normalize_filters, read_archive
+from app.passwords import PasswordPoolBusy
 from functools import wraps
 
 bp = Blueprint('main', __name__)
@@ -32,7 +46,12 @@ def login_required(role=None):
         def decorated_function(*args, **kwargs):
             if 'user_id' not in session:
                 return redirect(url_for('main.login'))
-            if role and session.get('role') != role:
+            if g.user is None:
+                # Пользователь удалён, а сессия осталась
+                session.clear()
+                return redirect(url_for('main.login'))
+            # Роль берём из актуальных данных пользователя, а не из сессии
+            if role and g.user['role'] != role:
                 flash('Нет доступа')
                 return redirect(url_for('main.dashboard'))
             return f(*args, **kwargs)
@@ -44,8 +63,24 @@ def login_required(role=None):
 
 @bp.before_app_request
 def load_logged_in_user():
+    if request.endpoint == 'static':
+        # Статике пользователь не нужен; без обращения к сессии ответ
+        # не получает Vary: Cookie и нормально кэшируется прокси
+        g.user = None
+        return
     user_id = session.get('user_id')
-    g.user = get_user_by_id(user_id) if user_id else None
+    ttl = current_app.config.get('USER_CACHE_TTL', 30)
+    g.user = get_user_context(user_id, ttl) if user_id else None
+
+
+@bp.app_errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    # Быстрый отказ при «шторме» входов вместо ожидания свободного CPU
+    message = 'Сервер перегружен, повторите попытку через несколько секунд.'
+    if request.endpoint == 'main.login':
+        flash(message)
+        return render_template('login.html'), 503, {'Retry-After': '5'}
+    return message, 503, {'Retry-After': '5'}
 
 
 # --- Аутентификация ---
@@ -65,6 +100,7 @@ def login():
 
 @bp.route('/logout')
 @login_required()
+@writes_db
 def logout():
     log_action(session['user_id'], "logout", "Выход из системы")
     session.clear()
@@ -76,66 +112,81 @@ def logout():
 @bp.route('/')
 @login_required()
 def dashboard():
-    lecturers = get_all_lecturers()
-    pubs = get_all_publications()
-    metrics = {}
-    for l in lecturers:
-        m = get_metrics_by_lecturer(l['id'])
-        metrics[l['id']] = m[0] if m else None
     feedback_list = []
     if g.user and g.user['role'] == 'admin':
         feedback_list = get_all_feedback()
     return render_template(
         'dashboard.html',
-        lecturers=lecturers,
-        pubs=pubs,
-        metrics=metrics,
         feedback_list=feedback_list,
-        breadcrumbs=[('Главная', None)]
+        breadcrumbs=[('Главная', None)],
+        **dashboard_view()
+    )
+
+
+def _csv_response(rows, filename):
+    """
+    CSV-ответ, формируемый по мере выборки: rows — итерируемое строк
+    (списков значений), обычно поверх iter_*; в памяти одна порция.
+    Соединение запроса закрывается, когда ответ отдан целиком.
+    """
+    db = detach_db()
+
+    def generate():
+        output = StringIO()
+        writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+        for row in rows:
+            writer.writerow(row)
+            if output.tell() >= 64 * 1024:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment;filename=%s" % filename}
     )
 
+    @response.call_on_close
+    def release():
+        # Сначала курсоры (недочитанные при обрыве ответа), потом соединение
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            close()
+        if db is not None:
+            db.close()
+
+    return response
+
 
 @bp.route('/admin/export_dashboard')
 @login_required(role='admin')
 def export_dashboard():
-    lecturers = get_all_lecturers()
-    pubs = get_all_publications()
-    feedbacks = get_all_feedback()
-
-    # Генерируем CSV "на лету"
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-    # --- Преподаватели ---
-    writer.writerow(['Преподаватели'])
-    writer.writerow(['ID', 'ФИО', 'Кафедра', 'Должность', 'Учёная степень', 'ORCID', 'Email'])
-    for l in lecturers:
-        writer.writerow(
-            [l['id'], l['fio'], l['department'], l['position'], l['academic_degree'], l['orcid'], l['email']])
-    writer.writerow([])
-
-    # --- Публикации ---
-    writer.writerow(['Публикации'])
-    writer.writerow(['ID', 'Название', 'Год', 'Журнал', 'Источник', 'Ссылка', 'Цитирования', 'DOI'])
-    for p in pubs:
-        writer.writerow(
-            [p['id'], p['title'], p['year'], p['journal'], p['source'], p['link'], p['citations'], p['doi']])
-    writer.writerow([])
-
-    # --- Обращения пользователей ---
-    writer.writerow(['Обращения (обратная связь)'])
-    writer.writerow(['ID', 'Имя', 'Email', 'Сообщение', 'Дата'])
-    for f in feedbacks:
-        writer.writerow([f['id'], f['name'], f['email'], f['message'], f['created_at']])
-    writer.writerow([])
-
-    output.seek(0)
-    # Формируем правильный заголовок для скачивания
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment;filename=dashboard_export.csv"}
-    )
+    lecturers = iter_lecturers(('id', 'fio', 'department', 'position', 'academic_degree', 'orcid', 'email'))
+    pubs = iter_publications(('id', 'title', 'year', 'journal', 'source', 'link', 'citations', 'doi'))
+    feedbacks = iter_feedback(('id', 'name', 'email', 'message', 'created_at'))
+
+    def rows():
+        # --- Преподаватели ---
+        yield ['Преподаватели']
+        yield ['ID', 'ФИО', 'Кафедра', 'Должность', 'Учёная степень', 'ORCID', 'Email']
+        yield from lecturers
+        yield []
+
+        # --- Публикации ---
+        yield ['Публикации']
+        yield ['ID', 'Название', 'Год', 'Журнал', 'Источник', 'Ссылка', 'Цитирования', 'DOI']
+        yield from pubs
+        yield []
+
+        # --- Обращения пользователей ---
+        yield ['Обращения (обратная связь)']
+        yield ['ID', 'Имя', 'Email', 'Сообщение', 'Дата']
+        yield from feedbacks
+        yield []
+
+    return _csv_response(rows(), 'dashboard_export.csv')
 
 
 # --- Форма обратной связи ---
@@ -193,6 +244,10 @@ def lecturer_profile(lecturer_id):
         lecturer=lecturer,
         pubs=pubs,
         metrics=metrics,
+        trends=get_trends(get_db()).for_lecturer(lecturer_id),
+        trends_window=current_app.config.get('TRENDS_WINDOW', 3),
+        rankings=get_leaderboards(get_db()).for_lecturer(lecturer_id),
+        coauthorship=get_coauthor_graph(get_db()).for_lecturer(lecturer_id),
         breadcrumbs=[
             ('Преподаватели', url_for('main.lecturers')),
             (lecturer['fio'], None)
@@ -234,6 +289,7 @@ def edit_lecturer(lecturer_id):
     return render_template(
         'edit_lecturer.html',
         lecturer=lecturer,
+        lecturers=[l for l in get_all_lecturers(('id', 'fio')) if l.id != lecturer_id],
         breadcrumbs=[
             ('Преподаватели', url_for('main.lecturers')),
             ('Редактирование преподавателя', None)
@@ -250,26 +306,50 @@ def delete_lecturer_route(lecturer_id):
     return redirect(url_for('main.lecturers'))
 
 
+@bp.route('/merge_lecturer/<int:lecturer_id>', methods=['POST'])
+@login_required(role='admin')
+def merge_lecturer_route(lecturer_id):
+    """Слить преподавателя-дубликат lecturer_id с выбранной основной записью."""
+    duplicate = get_lecturer_by_id(lecturer_id)
+    target = get_lecturer_by_id(safe_int(request.form.get('into')))
+    if duplicate is None or target is None or target['id'] == lecturer_id:
+        flash('Выберите другого преподавателя для объединения.')
+        return redirect(url_for('main.edit_lecturer', lecturer_id=lecturer_id))
+    merge_lecturers(lecturer_id, target['id'])
+    log_action(session['user_id'], "merge_lecturer",
+               f"Преподаватель {duplicate['fio']} объединён с {target['fio']}")
+    flash('Преподаватели объединены.')
+    return redirect(url_for('main.lecturer_profile', lecturer_id=target['id']))
+
+
 # --- Публикации (Открытая страница) ---
 
 @bp.route('/publications')
 def publications():
-    pubs = get_all_publications()
     return render_template(
         'publications.html',
-        pubs=pubs,
-        breadcrumbs=[('Публикации', None)]
+        breadcrumbs=[('Публикации', None)],
+        **publications_view()
     )
 
 
+def _form_year():
+    """Год публикации из формы целым числом; None — не число."""
+    return safe_int(request.form.get('year', '').strip(), None)
+
+
 @bp.route('/add_publication', methods=['GET', 'POST'])
 @login_required(role='admin')
 def add_publication():
     lecturers = get_all_lecturers()
     if request.method == 'POST':
+        year = _form_year()
+        if year is None:
+            flash('Год публикации должен быть числом.')
+            return redirect(url_for('main.add_publication'))
         lecturer_ids = request.form.getlist('lecturer_ids')
         create_publication(
-            request.form['title'], request.form['year'], request.form['journal'],
+            request.form['title'], year, request.form['journal'],
             request.form['source'], request.form['link'], request.form['citations'],
             request.form['doi'], [int(lid) for lid in lecturer_ids]
         )
@@ -292,10 +372,14 @@ def edit_publication(pub_id):
     lecturers = get_all_lecturers()
     current_ids = [l['id'] for l in current_lecturers]
     if request.method == 'POST':
+        year = _form_year()
+        if year is None:
+            flash('Год публикации должен быть числом.')
+            return redirect(url_for('main.edit_publication', pub_id=pub_id))
         lecturer_ids = request.form.getlist('lecturer_ids')
         update_publication(
             pub_id,
-            request.form['title'], request.form['year'], request.form['journal'],
+            request.form['title'], year, request.form['journal'],
             request.form['source'], request.form['link'], request.form['citations'],
             request.form['doi'], [int(lid) for lid in lecturer_ids]
         )
@@ -330,9 +414,13 @@ def metrics(lecturer_id):
     lecturer = get_lecturer_by_id(lecturer_id)
     metrics_data = get_metrics_by_lecturer(lecturer_id)
     if request.method == 'POST':
+        year = _form_year()
+        if year is None or not MIN_YEAR <= year <= MAX_YEAR:
+            flash('Год должен быть числом от %d до %d.' % (MIN_YEAR, MAX_YEAR))
+            return redirect(url_for('main.metrics', lecturer_id=lecturer_id))
         set_metrics(
             lecturer_id,
-            int(request.form['year']),
+            year,
             int(request.form['total_publications']),
             int(request.form['total_citations']),
             int(request.form['h_index']),
@@ -359,39 +447,129 @@ def metrics(lecturer_id):
 
 @bp.route('/reports')
 def reports():
-    lecturers = get_all_lecturers()
-    pubs = get_all_publications()
-    # Простая аналитика: количество публикаций, цитирований по кафедрам/годам
-    departments = {}
-    for l in lecturers:
-        dep = l['department']
-        if dep not in departments:
-            departments[dep] = {'lecturers': [], 'publications': 0, 'citations': 0}
-        departments[dep]['lecturers'].append(l)
-        pubs_by_l = get_publications_by_lecturer(l['id'])
-        departments[dep]['publications'] += len(pubs_by_l)
-        departments[dep]['citations'] += sum([int(p['citations']) for p in pubs_by_l if p['citations']])
+    # Простая аналитика: количество публикаций, цитирований по кафедрам,
+    # детализация кафедра -> год -> источник по аналитическому кубу
     return render_template(
         'reports.html',
-        departments=departments,
-        pubs=pubs,
-        breadcrumbs=[('Отчёты', None)]
+        breadcrumbs=[('Отчёты', None)],
+        **reports_view(_cube_filters())
     )
 
 
+def _cube_filters():
+    """Фильтры среза куба из параметров запроса (?department=...&year=...)."""
+    filters = {}
+    for dim in DIMENSIONS:
+        value = request.args.get(dim)
+        if value is not None:
+            filters[dim] = safe_int(value) if dim == 'year' else value
+    return filters
+
+
+@bp.route('/reports/cube')
+def reports_cube():
+    """Срез аналитического куба в JSON (для графиков): ?by=year,source&department=..."""
+    by = [dim for dim in request.args.get('by', '').split(',') if dim]
+    try:
+        rows = cube_slice(get_db(), by, **_cube_filters())
+    except ValueError as e:
+        abort(400, str(e))
+    return jsonify({'by': by, 'filters': _cube_filters(), 'rows': rows})
+
+
 # --- Логи ---
 
 @bp.route('/log')
 @login_required(role='admin')
 def log():
-    logs = get_all_logs()
+    args = {name: request.args.get(name, '').strip()
+            for name in ('user_id', 'action', 'date_from', 'date_to', 'archive')}
+    try:
+        filters = normalize_filters(args['user_id'], args['action'], args['date_from'], args['date_to'])
+    except ValueError:
+        flash('Неверный фильтр: даты — в формате ГГГГ-ММ-ДД.')
+        filters = {}
+    page = max(safe_int(request.args.get('page'), 1), 1)
+    size = current_app.config.get('LOG_PAGE_SIZE', 100)
+    # Строкой больше страницы — чтобы знать, есть ли следующая
+    if args['archive']:
+        logs = read_archive(get_db(), args['archive'], filters, size + 1, (page - 1) * size)
+    else:
+        logs = get_logs(filters, size + 1, (page - 1) * size)
+    query = {name: value for name, value in args.items() if value}
     return render_template(
         'log.html',
-        logs=logs,
+        logs=logs[:size],
+        args=args,
+        page=page,
+        prev_url=url_for('main.log', page=page - 1, **query) if page > 1 else None,
+        next_url=url_for('main.log', page=page + 1, **query) if len(logs) > size else None,
+        export_url=None if args['archive'] else url_for('main.log_export', **query),
+        users=get_all_users(),
+        actions=get_log_actions(),
+        archives=archived_periods(get_db()),
         breadcrumbs=[('Журнал действий', None)]
     )
 
 
+@bp.route('/log/export')
+@login_required(role='admin')
+def log_export():
+    try:
+        filters = normalize_filters(*(request.args.get(name, '').strip()
+                                      for name in ('user_id', 'action', 'date_from', 'date_to')))
+    except ValueError:
+        abort(400, 'Неверный фильтр журнала')
+    logs = iter_logs(filters)
+
+    def rows():
+        yield ['Дата и время', 'Пользователь', 'Действие', 'Описание']
+        for entry in logs:
+            yield [entry['timestamp'], entry['user_fio'], entry['action'], entry['description']]
+
+    return _csv_response(rows(), 'log_export.csv')
+
+
+# --- Профили запросов ---
+
+@bp.route('/admin/profiles')
+@login_required(role='admin')
+def admin_profiles():
+    return render_template(
+        'admin_profiles.html',
+        profiles=profiler.list_profiles(),
+        breadcrumbs=[('Профили запросов', None)]
+    )
+
+
+@bp.route('/admin/profiles/<profile_id>')
+@login_required(role='admin')
+def admin_profile_detail(profile_id):
+    summary, stats_text = profiler.get_profile(profile_id)
+    if not summary:
+        flash('Профиль не найден.')
+        return redirect(url_for('main.admin_profiles'))
+    return render_template(
+        'admin_profile_detail.html',
+        profile=summary,
+        stats_text=stats_text,
+        breadcrumbs=[
+            ('Профили запросов', url_for('main.admin_profiles')),
+            (summary['url'], None)
+        ]
+    )
+
+
+@bp.route('/admin/profiles/<profile_id>.<ext>')
+@login_required(role='admin')
+def admin_profile_file(profile_id, ext):
+    filename = profiler.profile_file(profile_id, ext)
+    if not filename:
+        flash('Файл профиля не найден.')
+        return redirect(url_for('main.admin_profiles'))
+    return send_from_directory(current_app.config['PROFILER_DIR'], filename, as_attachment=True)
+
+
 # --- Новости ---
 
 @bp.route('/news')
@@ -545,12 +723,14 @@ def add_user():
         email = request.form['email']
         password = request.form['password']
         role = request.form['role']
-        if fio and email and password and role:
+        if not (fio and email and password and role):
+            flash('Заполните все поля')
+        elif get_user_by_email(email) is not None:
+            flash('Пользователь с таким email уже существует')
+        else:
             create_user(fio, email, password, role)
             flash('Пользователь добавлен')
             return redirect(url_for('main.profile'))
-        else:
-            flash('Заполните все поля')
     return render_template(
         'add_user.html',
         breadcrumbs=[
@@ -560,6 +740,36 @@ def add_user():
     )
 
 
+@bp.route('/admin/provision_users', methods=['GET', 'POST'])
+@login_required(role='admin')
+def admin_provision_users():
+    report = None
+    if request.method == 'POST':
+        uploaded_file = request.files.get('file')
+        if not uploaded_file or not uploaded_file.filename:
+            flash('Выберите CSV-файл.')
+            return redirect(url_for('main.admin_provision_users'))
+        try:
+            text = uploaded_file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            flash('Файл должен быть в кодировке UTF-8.')
+            return redirect(url_for('main.admin_provision_users'))
+        report = provision_users(parse_csv(text), default_role=request.form.get('role') or 'lecturer')
+        log_action(
+            session['user_id'], "provision_users",
+            f"Массовое создание пользователей: создано {len(report['created'])}, "
+            f"пропущено {len(report['skipped'])}, конфликтов {len(report['conflicts'])}"
+        )
+    return render_template(
+        'admin_provision_users.html',
+        report=report,
+        breadcrumbs=[
+            ('Личный кабинет', url_for('main.profile')),
+            ('Массовое создание пользователей', None)
+        ]
+    )
+
+
 @bp.route('/admin/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @login_required(role='admin')
 def edit_user(user_id):
@@ -659,7 +869,11 @@ def staff_reject_publication(pub_id):
 @login_required(role='staff')
 def staff_send_to_revision(pub_id):
     comment = request.form.get('comment') or None
-    deadline = request.form.get('revision_deadline') or None  # 'YYYY-MM-DD'
+    try:
+        deadline = parse_deadline(request.form.get('revision_deadline'))  # 'YYYY-MM-DD'
+    except ValueError:
+        flash('Некорректный срок доработки')
+        return redirect(url_for('main.staff_review'))
     update_publication_status(
         pub_id,
         status='revision_required',
@@ -671,42 +885,46 @@ def staff_send_to_revision(pub_id):
     return redirect(url_for('main.staff_review'))
 
 
+@bp.route('/staff/deadlines')
+@login_required(role='staff')
+def staff_deadlines():
+    """
+    Сводка сроков доработки по публикациям, отправленным текущим сотрудником.
+    Только чтение: предупреждения обновляют фоновая задача и check-deadlines.
+    """
+    return render_template(
+        'staff_deadlines.html',
+        digest=reviewer_digest(get_db(), g.user['id']),
+        breadcrumbs=[
+            ('Личный кабинет', url_for('main.profile')),
+            ('Сроки доработки', None)
+        ]
+    )
+
+
+@bp.route('/staff/deadlines/seen', methods=['POST'])
+@login_required(role='staff')
+def staff_deadlines_seen():
+    mark_deadline_alerts_seen(g.user['id'])
+    return redirect(url_for('main.staff_deadlines'))
+
+
 @bp.route('/staff/export_reports')
 @login_required(role='staff')
 def staff_export_reports():
-    pubs = get_all_publications()
-
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-    writer.writerow([
-        'ID', 'Название', 'Год', 'Журнал', 'Статус',
-        'Цитирования', 'DOI', 'Крайний срок доработки', 'Комментарий проверяющего'
-    ])
-
-    for p in pubs:
-        status = p['status'] if 'status' in p.keys() else ''
-        deadline = p['revision_deadline'] if 'revision_deadline' in p.keys() else ''
-        comment = p['review_comment'] if 'review_comment' in p.keys() else ''
-
-        writer.writerow([
-            p['id'],
-            p['title'],
-            p['year'],
-            p['journal'],
-            status,
-            p['citations'],
-            p['doi'],
-            deadline,
-            comment
-        ])
-
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment;filename=publications_report.csv"}
-    )
+    pubs = iter_publications((
+        'id', 'title', 'year', 'journal', 'status',
+        'citations', 'doi', 'revision_deadline', 'review_comment'
+    ))
+
+    def rows():
+        yield [
+            'ID', 'Название', 'Год', 'Журнал', 'Статус',
+            'Цитирования', 'DOI', 'Крайний срок доработки', 'Комментарий проверяющего'
+        ]
+        yield from pubs
+
+    return _csv_response(rows(), 'publications_report.csv')
 
 
 # --- Загрузка и просмотр файла публикации ---
@@ -844,20 +1062,3 @@ def lecturer_resubmit_publication(pub_id):
     flash('Публикация повторно отправлена на проверку.')
     return redirect(url_for('main.profile'))
 
-
-# --- Локальные функции работы с обратной связью (как было) ---
-
-def create_feedback(name, email, message):
-    db = get_db()
-    db.execute(
-        "INSERT INTO feedback (name, email, message) VALUES (?, ?, ?)",
-        (name, email, message)
-    )
-    db.commit()
-
-
-def get_all_feedback():
-    db = get_db()
-    return db.execute(
-        "SELECT * FROM feedback ORDER BY created_at DESC"
-    ).fetchall()
@@ -0,0 +1,79 @@
+# app/startup.py
+
+"""
+Ускорение старта воркеров: кэш байткода Jinja на диске и
+предварительная компиляция всех шаблонов.
+
+Скомпилированные при старте шаблоны лежат в памяти процесса и после
+fork достаются воркерам без повторной компиляции; кэш байткода на диске
+общий для всех процессов и переживает перезапуски. Время старта,
+предкомпиляции и первого запроса к каждому эндпоинту попадает в /metrics.
+"""
+
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+from app import telemetry
+
+
+def init_template_cache(app, base_dir):
+    """Подключить кэш байткода шаблонов (TEMPLATE_BYTECODE_CACHE)."""
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        return
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(base_dir, 'cache', 'jinja')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+def precompile_templates(app):
+    """Скомпилировать все шаблоны заранее. Возвращает (число шаблонов, секунды)."""
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    elapsed = time.perf_counter() - started
+    app.config['TEMPLATE_PRECOMPILE_SECONDS'] = elapsed
+    telemetry.set_gauge('template_precompile_seconds', elapsed, pid=os.getpid())
+    return len(names), elapsed
+
+
+def finish_startup(app, started):
+    """Зафиксировать время создания приложения и выполнить предкомпиляцию."""
+    if app.config.get('TEMPLATE_PRECOMPILE'):
+        count, elapsed = precompile_templates(app)
+        app.logger.info('Предкомпилировано шаблонов: %d за %.3f с', count, elapsed)
+    total = time.perf_counter() - started
+    app.config['STARTUP_SECONDS'] = total
+    report_startup(app)
+    app.logger.info('Приложение создано за %.3f с', total)
+
+
+def report_startup(app):
+    """
+    Измерители времени старта и предкомпиляции для текущего процесса.
+    Воркер вызывает её после fork: телеметрия мастера в нём сброшена,
+    а время старта и прогрева общее для всех воркеров.
+    """
+    pid = os.getpid()
+    telemetry.set_gauge('app_startup_seconds', app.config.get('STARTUP_SECONDS', 0), pid=pid)
+    if 'TEMPLATE_PRECOMPILE_SECONDS' in app.config:
+        telemetry.set_gauge('template_precompile_seconds', app.config['TEMPLATE_PRECOMPILE_SECONDS'], pid=pid)
+
+
+def warm_up(app):
+    """
+    Прогрев перед fork: шаблоны, префикс хэша паролей и страницы БД
+    в кэше ОС. Всё, что прогрето здесь, воркеры получают готовым.
+    """
+    from app.models import get_all_lecturers, get_all_publications
+    from app.passwords import needs_rehash
+
+    if not app.config.get('TEMPLATE_PRECOMPILE'):
+        precompile_templates(app)
+    # Соединение с БД закрывается при выходе из контекста и в воркеры не попадает
+    with app.app_context():
+        needs_rehash('')
+        get_all_lecturers()
+        get_all_publications()
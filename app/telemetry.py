@@ -0,0 +1,431 @@
+# app/telemetry.py
+
+"""
+Операционная телеметрия приложения в текстовом формате Prometheus.
+
+Счётчики пишутся в шард текущего потока без блокировок и сливаются
+только при чтении (scrape). В режиме нескольких процессов каждый процесс
+периодически сбрасывает свой снимок в METRICS_MULTIPROC_DIR, а /metrics
+суммирует снимки всех процессов. Снимки завершившихся процессов мастер
+сливает в один файл (compact).
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, abort, current_app, g, request
+
+# Границы корзин гистограммы латентности (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Описания метрик: имя -> (тип, справка)
+METRICS_HELP = {
+    'http_requests_total': ('counter', 'Количество обработанных HTTP-запросов'),
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса по эндпоинтам'),
+    'http_requests_in_flight': ('gauge', 'Запросы, обрабатываемые в данный момент'),
+    'http_upload_bytes_total': ('counter', 'Принято байт в телах запросов'),
+    'http_download_bytes_total': ('counter', 'Отдано байт в телах ответов'),
+    'db_queries_total': ('counter', 'Количество выполненных SQL-запросов'),
+    'db_query_seconds_total': ('counter', 'Суммарное время выполнения SQL-запросов'),
+    'cache_requests_total': ('counter', 'Обращения к кэшам (попадания и промахи)'),
+    'cache_hit_ratio': ('gauge', 'Доля попаданий в кэш'),
+    'db_memo_hits_total': ('counter', 'Чтения моделей, взятые из памяти запроса (по эндпоинтам)'),
+    'app_startup_seconds': ('gauge', 'Время создания приложения в процессе'),
+    'template_precompile_seconds': ('gauge', 'Время предкомпиляции шаблонов в процессе'),
+    'http_first_request_seconds': ('gauge', 'Латентность первого запроса к эндпоинту в процессе'),
+    'password_pool_rejected_total': ('counter', 'Отказы пула хэширования паролей из-за перегрузки'),
+    'db_write_batches_total': ('counter', 'Групповые коммиты потока-писателя'),
+    'db_write_ops_total': ('counter', 'Операции записи, выполненные потоком-писателем'),
+    'db_write_retries_total': ('counter', 'Повторы из-за блокировки БД другим процессом'),
+    'db_commits_total': ('counter', 'Коммиты, выполненные по запросам (по эндпоинтам)'),
+    'db_write_requests_total': ('counter', 'Запросы, изменявшие БД (коммитов на запрос = db_commits_total / это)'),
+    'background_runs_total': ('counter', 'Успешные запуски фоновых задач'),
+    'background_errors_total': ('counter', 'Запуски фоновых задач, завершившиеся ошибкой'),
+    'mail_messages_total': ('counter', 'Письма из outbox по результату отправки'),
+    'mail_connections_total': ('counter', 'Открытые SMTP-соединения'),
+}
+
+# Снимок, в который мастер сливает счётчики завершившихся процессов
+RETIRED_FILE = 'metrics-retired.json'
+
+# Метрики-«измерители»: их значения мёртвых процессов не учитываются
+GAUGES = {
+    'http_requests_in_flight', 'app_startup_seconds',
+    'template_precompile_seconds', 'http_first_request_seconds',
+}
+
+
+class _Shard:
+    """Счётчики одного потока. Пишет в шард только поток-владелец."""
+
+    __slots__ = ('thread', 'counters', 'histograms', 'endpoint')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}    # (имя, метки) -> значение
+        self.histograms = {}  # (имя, метки) -> [корзины..., +Inf, сумма]
+        self.endpoint = None  # эндпоинт запроса, который обслуживает поток
+
+
+_local = threading.local()
+_shards = []
+_retired = _Shard(None)  # сюда сливаются шарды завершившихся потоков
+_registry_lock = threading.Lock()  # берётся только при регистрации потока и при scrape
+_last_flush = [0.0]
+_seen_endpoints = set()  # эндпоинты, уже получившие запрос в этом процессе
+_gauges = {}  # (имя, метки) -> значение измерителей, задаваемых set_gauge
+
+
+def _reset_after_fork():
+    # Воркер начинает с чистых счётчиков: иначе значения мастера
+    # попали бы в снимок каждого воркера и суммировались бы многократно
+    global _local
+    _local = threading.local()
+    _shards[:] = []
+    _retired.counters.clear()
+    _retired.histograms.clear()
+    _seen_endpoints.clear()
+    _gauges.clear()
+    _last_flush[0] = 0.0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _registry_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Увеличить счётчик (или измеритель, если value отрицательное)."""
+    counters = _shard().counters
+    key = (name, _labels(**labels))
+    counters[key] = counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Установить значение измерителя (повторный вызов заменяет, а не прибавляет)."""
+    _gauges[(name, _labels(**labels))] = value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Добавить наблюдение в гистограмму."""
+    histograms = _shard().histograms
+    key = (name, _labels(**labels))
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = [0] * (len(buckets) + 2)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            hist[i] += 1
+            break
+    else:
+        hist[len(buckets)] += 1
+    hist[-1] += value
+
+
+def record_cache(cache, hit):
+    """Учесть обращение к кэшу: hit=True — попадание, False — промах."""
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_query(sql, duration):
+    """Хук для слоя БД: учитывает каждый SQL-запрос (sql=None — время выборки строк)."""
+    endpoint = _shard().endpoint or 'none'
+    if sql is not None:
+        inc('db_queries_total', endpoint=endpoint)
+    inc('db_query_seconds_total', duration, endpoint=endpoint)
+
+
+# ==== Слияние шардов ====
+
+def _merge_into(counters, histograms, shard):
+    # list(dict.items()) копирует словарь под GIL, поэтому чтение
+    # безопасно, даже если поток-владелец в этот момент пишет в шард
+    for key, value in list(shard.counters.items()):
+        counters[key] = counters.get(key, 0) + value
+    for key, hist in list(shard.histograms.items()):
+        hist = list(hist)
+        acc = histograms.get(key)
+        if acc is None:
+            histograms[key] = hist
+        else:
+            for i, value in enumerate(hist):
+                acc[i] += value
+
+
+def snapshot():
+    """Слить шарды всех потоков текущего процесса."""
+    counters, histograms = {}, {}
+    with _registry_lock:
+        # Шарды завершившихся потоков переносим в общий «архивный» шард,
+        # чтобы список не рос при модели «поток на запрос»
+        alive = []
+        for shard in _shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                _merge_into(_retired.counters, _retired.histograms, shard)
+        _shards[:] = alive
+        _merge_into(counters, histograms, _retired)
+        for shard in alive:
+            _merge_into(counters, histograms, shard)
+    counters.update(_gauges)
+    return counters, histograms
+
+
+def _encode(counters, histograms):
+    return {
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(map(list, labels)), hist] for (name, labels), hist in histograms.items()],
+    }
+
+
+def _decode(data, counters, histograms, skip_gauges=False):
+    for name, labels, value in data.get('counters', []):
+        if skip_gauges and name in GAUGES:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in data.get('histograms', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        acc = histograms.get(key)
+        if acc is None:
+            histograms[key] = list(hist)
+        else:
+            for i, value in enumerate(hist):
+                acc[i] += value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _write_json(directory, name, data):
+    # Через временный файл и os.replace: читатель видит либо старый, либо новый снимок
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def _process_files(directory):
+    """Пары (pid, путь) снимков отдельных процессов в каталоге."""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            yield int(os.path.basename(path)[len('metrics-'):-len('.json')]), path
+        except ValueError:
+            continue
+
+
+def flush(directory, data=None):
+    """Записать снимок текущего процесса в каталог мультипроцессных метрик."""
+    counters, histograms = data or snapshot()
+    _write_json(directory, 'metrics-%d.json' % os.getpid(), _encode(counters, histograms))
+    _last_flush[0] = time.monotonic()
+
+
+def compact(directory):
+    """
+    Слить снимки завершившихся процессов в RETIRED_FILE и удалить их,
+    чтобы каталог не рос с каждым перезапуском воркера. Вызывает мастер.
+    Возвращает число слитых снимков.
+    """
+    counters, histograms = {}, {}
+    _decode(_read_json(os.path.join(directory, RETIRED_FILE)) or {}, counters, histograms)
+    merged = []
+    for pid, path in _process_files(directory):
+        if _pid_alive(pid):
+            continue
+        data = _read_json(path)
+        if data is not None:
+            _decode(data, counters, histograms, skip_gauges=True)
+            merged.append(pid)
+    if not merged:
+        return 0
+    # Сначала новый общий файл со списком слитых pid (collect пропустит их
+    # снимки, если успеет их увидеть), затем удаление самих снимков
+    _write_json(directory, RETIRED_FILE, dict(_encode(counters, histograms), pids=merged))
+    for pid in merged:
+        try:
+            os.remove(os.path.join(directory, 'metrics-%d.json' % pid))
+        except FileNotFoundError:
+            pass
+    return len(merged)
+
+
+def collect(directory=None):
+    """Собрать метрики текущего процесса и (если задан каталог) остальных процессов."""
+    counters, histograms = snapshot()
+    if directory:
+        flush(directory, (counters, histograms))
+        counters = dict(counters)
+        histograms = {key: list(hist) for key, hist in histograms.items()}
+        # Общий файл читается первым: снимки из его списка pids уже в нём
+        retired = _read_json(os.path.join(directory, RETIRED_FILE)) or {}
+        _decode(retired, counters, histograms)
+        merged = set(retired.get('pids', ()))
+        for pid, path in _process_files(directory):
+            if pid == os.getpid() or pid in merged:
+                continue
+            data = _read_json(path)
+            if data is None:
+                continue
+            # Счётчики умерших воркеров сохраняем (иначе они «откатятся»),
+            # а их измерители (in-flight) уже неактуальны
+            _decode(data, counters, histograms, skip_gauges=not _pid_alive(pid))
+    return counters, histograms
+
+
+# ==== Текстовый формат Prometheus ====
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, _escape(v)) for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, buckets=LATENCY_BUCKETS):
+    """Сформировать текст в формате exposition для Prometheus."""
+    # Доля попаданий считается из счётчиков обращений к кэшам
+    caches = {}
+    for (name, labels), value in counters.items():
+        if name == 'cache_requests_total':
+            label_map = dict(labels)
+            stat = caches.setdefault(label_map['cache'], [0, 0])
+            stat[0 if label_map['result'] == 'hit' else 1] += value
+    derived = {}
+    for cache, (hits, misses) in caches.items():
+        total = hits + misses
+        derived[('cache_hit_ratio', (('cache', cache),))] = hits / total if total else 0.0
+
+    series = {}
+    for (name, labels), value in list(counters.items()) + list(derived.items()):
+        series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(set(series) | {name for name, _ in histograms}):
+        kind, help_text = METRICS_HELP.get(name, ('untyped', name))
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        if kind == 'histogram':
+            for (hname, labels), hist in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], hist[:-1]):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(labels, [('le', bound)]), cumulative))
+                lines.append('%s_sum%s %s' % (name, _format_labels(labels), _format_value(hist[-1])))
+                lines.append('%s_count%s %d' % (name, _format_labels(labels), cumulative))
+        else:
+            for labels, value in sorted(series[name]):
+                lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+# ==== Интеграция с Flask ====
+
+def _before_request():
+    shard = _shard()
+    shard.endpoint = request.endpoint or 'unknown'
+    g._telemetry_start = time.perf_counter()
+    inc('http_requests_in_flight')
+    if request.content_length:
+        inc('http_upload_bytes_total', request.content_length, endpoint=shard.endpoint)
+
+
+def _after_request(response):
+    endpoint = request.endpoint or 'unknown'
+    inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    # У потоковых ответов длина заранее неизвестна — их не учитываем
+    if response.content_length:
+        inc('http_download_bytes_total', response.content_length, endpoint=endpoint)
+    return response
+
+
+def _teardown_request(exc=None):
+    start = g.pop('_telemetry_start', None)
+    if start is None:
+        return
+    shard = _shard()
+    endpoint = shard.endpoint or 'unknown'
+    elapsed = time.perf_counter() - start
+    observe('http_request_duration_seconds', elapsed, endpoint=endpoint)
+    if endpoint not in _seen_endpoints:
+        # Первый запрос к странице в процессе: компиляция шаблонов, прогрев кэшей.
+        # Проверка и отметка под блокировкой — первый запрос учитывает один поток
+        with _registry_lock:
+            first = endpoint not in _seen_endpoints
+            _seen_endpoints.add(endpoint)
+        if first:
+            set_gauge('http_first_request_seconds', elapsed, endpoint=endpoint, pid=os.getpid())
+    inc('http_requests_in_flight', -1)
+    shard.endpoint = None
+
+    directory = current_app.config.get('METRICS_MULTIPROC_DIR')
+    interval = current_app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    if directory and time.monotonic() - _last_flush[0] >= interval:
+        flush(directory)
+
+
+def metrics_view():
+    """Эндпоинт /metrics для Prometheus."""
+    allowed = current_app.config.get('METRICS_ALLOWED_IPS')
+    if allowed is not None and request.remote_addr not in allowed:
+        abort(403)
+    counters, histograms = collect(current_app.config.get('METRICS_MULTIPROC_DIR'))
+    return Response(render(counters, histograms), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_telemetry(app):
+    """Подключить сбор метрик к приложению."""
+    from app.models import add_query_hook
+
+    directory = app.config.get('METRICS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    add_query_hook(observe_query)
+    app.add_url_rule('/metrics', 'prometheus_metrics', metrics_view)
@@ -0,0 +1,284 @@
+# app/trends.py
+
+"""
+Динамика наукометрических показателей преподавателей и кафедр.
+
+Вся история метрик загружается одним запросом в массив
+«преподаватель × год × показатель», и за один векторный проход
+считаются прирост к прошлому году (абсолютный и в процентах), скользящее
+среднее и среднегодовой темп роста (CAGR) для всех показателей сразу.
+Кафедры — те же вычисления над суммами по преподавателям (h-индекс —
+среднее). Результат кэшируется до смены версии данных 'metrics'.
+
+NumPy необязателен: без него те же величины считаются циклами.
+"""
+
+import math
+import threading
+
+from flask import current_app, has_app_context
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен — тогда считаем на чистом Python
+    np = None
+
+from app.analytics import data_version
+from app.telemetry import record_cache
+
+INDICATORS = ('total_publications', 'total_citations', 'h_index', 'rinz', 'scopus', 'wos', 'gs')
+INDICATOR_NAMES = {
+    'total_publications': 'Публикаций',
+    'total_citations': 'Цитирований',
+    'h_index': 'h-индекс',
+    'rinz': 'РИНЦ',
+    'scopus': 'Scopus',
+    'wos': 'WoS',
+    'gs': 'Google Scholar',
+}
+# Как показатели преподавателей сводятся в показатель кафедры
+DEPARTMENT_MEAN = ('h_index',)
+# Допустимые годы метрик (как в форме metrics.html). Ось лет в TrendTable
+# сплошная, поэтому год с опечаткой растянул бы её на тысячи лет
+MIN_YEAR, MAX_YEAR = 2000, 2100
+
+# Изменения метрик и кафедр преподавателей увеличивают версию 'metrics'
+TRIGGERS = {
+    'trg_version_metrics_insert':
+        "CREATE TRIGGER trg_version_metrics_insert AFTER INSERT ON metrics BEGIN "
+        "UPDATE data_versions SET version = version + 1 WHERE name = 'metrics'; END",
+    'trg_version_metrics_update':
+        "CREATE TRIGGER trg_version_metrics_update AFTER UPDATE ON metrics BEGIN "
+        "UPDATE data_versions SET version = version + 1 WHERE name = 'metrics'; END",
+    'trg_version_metrics_delete':
+        "CREATE TRIGGER trg_version_metrics_delete AFTER DELETE ON metrics BEGIN "
+        "UPDATE data_versions SET version = version + 1 WHERE name = 'metrics'; END",
+    'trg_version_metrics_department':
+        "CREATE TRIGGER trg_version_metrics_department AFTER UPDATE OF department ON lecturers "
+        "WHEN NEW.department IS NOT OLD.department BEGIN "
+        "UPDATE data_versions SET version = version + 1 WHERE name = 'metrics'; END",
+}
+
+
+def install_metrics_version(db):
+    """Миграция: версия данных 'metrics' и триггеры, её увеличивающие."""
+    db.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('metrics', 0)")
+    for sql in TRIGGERS.values():
+        db.execute(sql)
+
+
+# ==== Вычисления ====
+
+def _compute_numpy(values, window):
+    """values: массив E × Y × K (NaN — нет данных). Возвращает словарь массивов."""
+    years = values.shape[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prev, cur = values[:, :-1], values[:, 1:]
+        yoy = np.full_like(values, np.nan)
+        yoy[:, 1:] = cur - prev
+        yoy_pct = np.full_like(values, np.nan)
+        yoy_pct[:, 1:] = np.where(prev > 0, (cur - prev) / prev * 100, np.nan)
+
+        # Скользящее среднее по последним window годам через накопленные суммы
+        present = ~np.isnan(values)
+        sums = np.cumsum(np.where(present, values, 0.0), axis=1)
+        counts = np.cumsum(present, axis=1)
+        if years > window:
+            sums[:, window:] -= sums[:, :-window].copy()
+            counts[:, window:] -= counts[:, :-window].copy()
+        rolling = np.where(present & (counts > 0), sums / counts, np.nan)
+
+        # CAGR между первым и последним годом с данными
+        has_any = present.any(axis=1)
+        first = present.argmax(axis=1)
+        last = years - 1 - present[:, ::-1].argmax(axis=1)
+        first_value = np.take_along_axis(values, first[:, None, :], axis=1)[:, 0, :]
+        last_value = np.take_along_axis(values, last[:, None, :], axis=1)[:, 0, :]
+        span = (last - first).astype(float)
+        valid = has_any & (span > 0) & (first_value > 0) & (last_value >= 0)
+        cagr = np.where(valid, ((last_value / first_value) ** (1 / np.where(span > 0, span, 1)) - 1) * 100,
+                        np.nan)
+    return {'values': values, 'yoy': yoy, 'yoy_pct': yoy_pct, 'rolling': rolling, 'cagr': cagr}
+
+
+def _compute_python(values, window):
+    """То же на списках: values[e][y][k], None — нет данных."""
+    yoy, yoy_pct, rolling, cagr = [], [], [], []
+    for rows in values:
+        years, indicators = len(rows), len(rows[0]) if rows else 0
+        e_yoy = [[None] * indicators for _ in range(years)]
+        e_pct = [[None] * indicators for _ in range(years)]
+        e_roll = [[None] * indicators for _ in range(years)]
+        e_cagr = [None] * indicators
+        for k in range(indicators):
+            series = [rows[y][k] for y in range(years)]
+            for y in range(years):
+                value = series[y]
+                if value is None:
+                    continue
+                if y and series[y - 1] is not None:
+                    e_yoy[y][k] = value - series[y - 1]
+                    if series[y - 1] > 0:
+                        e_pct[y][k] = (value - series[y - 1]) / series[y - 1] * 100
+                window_values = [v for v in series[max(0, y - window + 1):y + 1] if v is not None]
+                e_roll[y][k] = sum(window_values) / len(window_values)
+            known = [y for y in range(years) if series[y] is not None]
+            if known:
+                first, last = known[0], known[-1]
+                if last > first and series[first] > 0 and series[last] >= 0:
+                    e_cagr[k] = ((series[last] / series[first]) ** (1 / (last - first)) - 1) * 100
+        yoy.append(e_yoy)
+        yoy_pct.append(e_pct)
+        rolling.append(e_roll)
+        cagr.append(e_cagr)
+    return {'values': values, 'yoy': yoy, 'yoy_pct': yoy_pct, 'rolling': rolling, 'cagr': cagr}
+
+
+def _to_list(array):
+    """
+    Массив NumPy или вложенный список -> вложенный список с None вместо NaN
+    и целыми числами вместо целых float (результат не зависит от наличия NumPy).
+    """
+    if np is not None and isinstance(array, np.ndarray):
+        array = array.tolist()
+    if isinstance(array, list):
+        return [_to_list(item) for item in array]
+    if isinstance(array, float):
+        if math.isnan(array):
+            return None
+        if array.is_integer():
+            return int(array)
+    return array
+
+
+class TrendTable:
+    """Рассчитанная динамика: ряды по годам для каждого преподавателя и кафедры."""
+
+    def __init__(self, rows, window, version):
+        self.version = version
+        self.window = window
+        # Метрики за недопустимые годы (записанные до проверки в форме) в динамику не входят
+        rows = [row for row in rows if isinstance(row['year'], int) and MIN_YEAR <= row['year'] <= MAX_YEAR]
+        years = sorted({row['year'] for row in rows})
+        self.years = list(range(years[0], years[-1] + 1)) if years else []
+        year_index = {year: i for i, year in enumerate(self.years)}
+        self.lecturers = sorted({row['lecturer_id'] for row in rows})
+        lecturer_index = {lid: i for i, lid in enumerate(self.lecturers)}
+        department_of = {row['lecturer_id']: row['department'] or '' for row in rows}
+        self.departments = sorted(set(department_of.values()))
+        department_index = {dep: i for i, dep in enumerate(self.departments)}
+
+        shape = (len(self.lecturers), len(self.years), len(INDICATORS))
+        cells = [
+            (lecturer_index[row['lecturer_id']], year_index[row['year']], k, row[name])
+            for row in rows for k, name in enumerate(INDICATORS) if row[name] is not None
+        ]
+        lecturer_department = [department_index[department_of[lid]] for lid in self.lecturers]
+        dep_shape = (len(self.departments), len(self.years), len(INDICATORS))
+
+        if np is not None:
+            values = np.full(shape, np.nan)
+            if cells:
+                e, y, k, v = zip(*cells)
+                values[list(e), list(y), list(k)] = v
+            # Кафедры: суммы (для h-индекса — среднее) по преподавателям
+            present = ~np.isnan(values)
+            dep_sums = np.zeros(dep_shape)
+            dep_counts = np.zeros(dep_shape)
+            np.add.at(dep_sums, lecturer_department, np.where(present, values, 0.0))
+            np.add.at(dep_counts, lecturer_department, present)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dep_values = np.where(dep_counts > 0, dep_sums, np.nan)
+                for name in DEPARTMENT_MEAN:
+                    k = INDICATORS.index(name)
+                    dep_values[:, :, k] = np.where(dep_counts[:, :, k] > 0,
+                                                   dep_sums[:, :, k] / dep_counts[:, :, k], np.nan)
+            lecturer_result = _compute_numpy(values, window) if values.size else None
+            department_result = _compute_numpy(dep_values, window) if dep_values.size else None
+        else:
+            values = [[[None] * shape[2] for _ in range(shape[1])] for _ in range(shape[0])]
+            for e, y, k, v in cells:
+                values[e][y][k] = v
+            dep_values = [[[None] * dep_shape[2] for _ in range(dep_shape[1])] for _ in range(dep_shape[0])]
+            dep_counts = [[[0] * dep_shape[2] for _ in range(dep_shape[1])] for _ in range(dep_shape[0])]
+            for e, d in enumerate(lecturer_department):
+                for y in range(shape[1]):
+                    for k in range(shape[2]):
+                        v = values[e][y][k]
+                        if v is not None:
+                            dep_values[d][y][k] = (dep_values[d][y][k] or 0) + v
+                            dep_counts[d][y][k] += 1
+            for name in DEPARTMENT_MEAN:
+                k = INDICATORS.index(name)
+                for d in range(dep_shape[0]):
+                    for y in range(dep_shape[1]):
+                        if dep_counts[d][y][k]:
+                            dep_values[d][y][k] /= dep_counts[d][y][k]
+            lecturer_result = _compute_python(values, window)
+            department_result = _compute_python(dep_values, window)
+
+        self._lecturer = {key: _to_list(value) for key, value in (lecturer_result or {}).items()}
+        self._department = {key: _to_list(value) for key, value in (department_result or {}).items()}
+        self._lecturer_index = lecturer_index
+        self._department_index = department_index
+
+    def _series(self, result, i):
+        if not result:
+            return None
+        indicators = {}
+        for k, name in enumerate(INDICATORS):
+            points = []
+            for y, year in enumerate(self.years):
+                value = result['values'][i][y][k]
+                if value is None:
+                    continue
+                points.append({
+                    'year': year,
+                    'value': value,
+                    'yoy': result['yoy'][i][y][k],
+                    'yoy_pct': result['yoy_pct'][i][y][k],
+                    'rolling': result['rolling'][i][y][k],
+                })
+            indicators[name] = {
+                'name': INDICATOR_NAMES[name],
+                'points': points,
+                'last': points[-1] if points else None,
+                'cagr': result['cagr'][i][k],
+            }
+        return indicators
+
+    def for_lecturer(self, lecturer_id):
+        """{показатель: {'name', 'points': [...], 'last', 'cagr'}} или None, если метрик нет."""
+        i = self._lecturer_index.get(lecturer_id)
+        return None if i is None else self._series(self._lecturer, i)
+
+    def for_department(self, department):
+        i = self._department_index.get(department or '')
+        return None if i is None else self._series(self._department, i)
+
+    def all_departments(self):
+        return {dep: self.for_department(dep) for dep in self.departments}
+
+
+_cache = {'table': None}
+_cache_lock = threading.Lock()
+
+
+def get_trends(db):
+    """Динамика всех преподавателей и кафедр для текущей версии метрик."""
+    window = current_app.config.get('TRENDS_WINDOW', 3) if has_app_context() else 3
+    version = data_version(db, 'metrics')
+    table = _cache['table']
+    hit = table is not None and table.version == version and table.window == window
+    record_cache('trends', hit)
+    if hit:
+        return table
+    with _cache_lock:
+        table = _cache['table']
+        if table is None or table.version != version or table.window != window:
+            rows = db.execute(
+                "SELECT m.lecturer_id, m.year, %s, l.department FROM metrics m "
+                "JOIN lecturers l ON l.id = m.lecturer_id" % ', '.join('m.' + name for name in INDICATORS)
+            ).fetchall()
+            table = _cache['table'] = TrendTable(rows, window, version)
+    return table
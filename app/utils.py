@@ -1,7 +1,7 @@
 # app/utils.py
 
 import re
-import random
+import secrets
 import string
 from datetime import datetime
 import csv
@@ -30,22 +30,26 @@ def format_date(dt_str, fmt_in='%Y-%m-%d %H:%M:%S', fmt_out='%d.%m.%Y %H:%M'):
         return dt_str
 
 def generate_password(length=8):
-    """Генерация простого пароля"""
+    """Генерация пароля (криптостойкий генератор secrets)"""
     chars = string.ascii_letters + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+    return ''.join(secrets.choice(chars) for _ in range(length))
 
-def export_publications_csv(publications, lecturers_dict):
+def export_publications_csv(publications, lecturers_dict=None):
     """
     Генерация CSV-отчета по публикациям.
     publications: список публикаций (Row-объекты)
-    lecturers_dict: dict {pub_id: [FIO, ...]}
+    lecturers_dict: dict {pub_id: [FIO, ...]}; если не передан,
+    авторы берутся из поля publications.authors_display
     Возвращает Flask Response с csv.
     """
     si = StringIO()
     writer = csv.writer(si)
     writer.writerow(['ID', 'Название', 'Год', 'Журнал', 'Источник', 'Ссылка', 'Цитирования', 'DOI/ID', 'Авторы'])
     for pub in publications:
-        authors = ', '.join(lecturers_dict.get(pub['id'], []))
+        if lecturers_dict is None:
+            authors = pub['authors_display']
+        else:
+            authors = ', '.join(lecturers_dict.get(pub['id'], []))
         writer.writerow([
             pub['id'], pub['title'], pub['year'], pub['journal'],
             pub['source'], pub['link'], pub['citations'], pub['doi'], authors
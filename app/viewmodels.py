@@ -0,0 +1,178 @@
+# app/viewmodels.py
+
+"""
+Подготовка данных для шаблонов («view-model»).
+
+Обработчик маршрута заранее собирает всё, что нужно шаблону, небольшим
+фиксированным числом пакетных запросов, а шаблон рендерится только из
+памяти. В строгом режиме (TEMPLATE_STRICT_DB) любой SQL-запрос во время
+рендеринга шаблона вызывает TemplateDatabaseAccess.
+"""
+
+from flask import current_app, g, has_app_context
+from jinja2 import Template
+
+from app.analytics import ALL_DEPARTMENTS, DIMENSIONS, cube_slice
+from app.coauthors import get_coauthor_graph
+from app.deadlines import deadline_counts
+from app.denorm import publication_authors
+from app.leaderboards import METRIC_NAMES, get_leaderboards
+from app.trends import get_trends
+from app.models import (
+    add_query_hook,
+    get_db,
+    get_all_lecturers,
+    get_all_publications,
+    get_latest_metrics_by_lecturer,
+    get_publication_stats_by_lecturer,
+)
+
+
+class TemplateDatabaseAccess(RuntimeError):
+    """Шаблон обратился к БД во время рендеринга (строгий режим)."""
+
+
+# Столбцы публикаций, которые выводят списки (вместе с денормализованными авторами)
+PUBLICATION_LIST_FIELDS = (
+    'id', 'title', 'year', 'journal', 'source', 'link', 'citations', 'author_ids', 'authors_display')
+
+
+# ==== Данные страниц ====
+
+def _authors(pubs):
+    # Авторы берутся из денормализованных полей публикаций — без запросов
+    return {p['id']: publication_authors(p) for p in pubs}
+
+
+def publications_view():
+    """Все публикации и их авторы для publications.html."""
+    pubs = get_all_publications(PUBLICATION_LIST_FIELDS)
+    return {'pubs': pubs, 'authors': _authors(pubs)}
+
+
+# Порядок детализации аналитики на /reports
+DRILL_LEVELS = ('department', 'year', 'source')
+
+
+def drilldown_view(filters):
+    """
+    Аналитика по кубу: строки следующего уровня детализации для выбранных
+    фильтров {измерение: значение}, итог и разбивка по статусам.
+    """
+    filters = {dim: value for dim, value in filters.items() if dim in DIMENSIONS}
+    level = next((dim for dim in DRILL_LEVELS if dim not in filters), None)
+    db = get_db()
+    rows = cube_slice(db, (level,) if level else (), **filters) if level else []
+    return {
+        'filters': filters,
+        'level': level,
+        'rows': rows,
+        'max_publications': max([row['publications'] for row in rows] or [0]),
+        'total': cube_slice(db, (), **filters)[0],
+        'by_status': cube_slice(db, ('status',), **filters),
+    }
+
+
+def leaders_view(department=ALL_DEPARTMENTS):
+    """Top-K преподавателей по показателям LEADERBOARD_METRICS (в кафедре или по всем)."""
+    boards = get_leaderboards(get_db())
+    k = current_app.config.get('LEADERBOARD_TOP_K', 10)
+    return {
+        'department': department,
+        'boards': [
+            {'metric': metric, 'name': METRIC_NAMES[metric], 'top': boards.top(metric, department, k)}
+            for metric in current_app.config.get('LEADERBOARD_METRICS', ('citations', 'h_index', 'scopus'))
+        ],
+    }
+
+
+def reports_view(filters=None):
+    """
+    Сводка по кафедрам, аналитика с детализацией (filters — выбранный
+    срез), рейтинги выбранной кафедры, сводка по соавторству и список
+    публикаций с авторами для reports.html.
+    """
+    lecturers = get_all_lecturers()
+    stats = get_publication_stats_by_lecturer()
+    departments = {}
+    for l in lecturers:
+        dep = departments.setdefault(
+            l['department'], {'lecturers': [], 'publications': 0, 'citations': 0})
+        dep['lecturers'].append(l)
+        stat = stats.get(l['id'])
+        if stat:
+            dep['publications'] += stat['publications']
+            dep['citations'] += stat['citations']
+    pubs = get_all_publications(PUBLICATION_LIST_FIELDS)
+    return {
+        'departments': departments,
+        'drill': drilldown_view(filters or {}),
+        'department_trends': get_trends(get_db()).all_departments(),
+        'leaders': leaders_view((filters or {}).get('department', ALL_DEPARTMENTS)),
+        'coauthorship': get_coauthor_graph(get_db()).summary(),
+        'pubs': pubs,
+        'authors': _authors(pubs),
+    }
+
+
+def dashboard_view(recent=5):
+    """
+    Преподаватели, публикации, последние метрики, авторы последних
+    публикаций и счётчики сроков доработки.
+    """
+    pubs = get_all_publications(PUBLICATION_LIST_FIELDS)
+    return {
+        'lecturers': get_all_lecturers(),
+        'pubs': pubs,
+        'metrics': get_latest_metrics_by_lecturer(),
+        'authors': _authors(pubs[:recent]),
+        'deadlines': deadline_counts(get_db()),
+    }
+
+
+# ==== Строгий режим ====
+
+def _enter_template():
+    if has_app_context():
+        g._template_depth = g.get('_template_depth', 0) + 1
+
+
+def _leave_template():
+    if has_app_context():
+        g._template_depth = g.get('_template_depth', 1) - 1
+
+
+class _TrackedTemplate(Template):
+    """
+    Шаблон, отмечающий в g время своего рендеринга. Счётчик уменьшается
+    в finally: если рендеринг упал, остальная часть запроса (обработчик
+    ошибки) не считается рендерингом шаблона.
+    """
+
+    def render(self, *args, **kwargs):
+        _enter_template()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            _leave_template()
+
+    def generate(self, *args, **kwargs):
+        # Потоковый рендеринг (stream_template): шаблон работает между выдачами частей
+        _enter_template()
+        try:
+            yield from super().generate(*args, **kwargs)
+        finally:
+            _leave_template()
+
+
+def _check_query(sql, duration):
+    if sql is None or not has_app_context() or not g.get('_template_depth'):
+        return
+    if current_app.config.get('TEMPLATE_STRICT_DB'):
+        raise TemplateDatabaseAccess('Запрос к БД во время рендеринга шаблона: %s' % sql.strip()[:200])
+
+
+def init_viewmodels(app):
+    """Подключить отслеживание запросов к БД из шаблонов."""
+    app.jinja_env.template_class = _TrackedTemplate
+    add_query_hook(_check_query)
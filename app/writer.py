@@ -0,0 +1,407 @@
+# app/writer.py
+
+"""
+Единственный писатель в БД на процесс.
+
+Все изменяющие функции app/models.py помечены @write_operation и
+выполняются не в потоке запроса, а в выделенном потоке-писателе с
+собственным соединением. Писатель забирает из очереди сразу несколько
+операций и фиксирует их одним COMMIT (group commit); каждая операция
+выполняется в своей точке сохранения, поэтому ошибка одной не откатывает
+остальные. Результат или исключение возвращается вызывающему потоку.
+
+Между процессами блокировка записи SQLite берётся через BEGIN IMMEDIATE
+с ограниченным числом повторов и экспоненциальной задержкой.
+
+Единица работы (transaction() или весь запрос при WRITE_UNIT_OF_WORK)
+откладывает записи и отправляет их писателю одной операцией: один коммит
+на запрос, атомарно, с откатом при исключении.
+"""
+
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+
+from app.telemetry import inc
+
+DEFAULTS = {
+    'WRITE_QUEUE_ENABLED': True,
+    'WRITE_UNIT_OF_WORK': True,
+    'WRITE_QUEUE_BATCH': 64,
+    'WRITE_QUEUE_LINGER': 0.002,
+    'WRITE_QUEUE_TIMEOUT': 30,
+    'WRITE_RETRIES': 6,
+    'WRITE_RETRY_BACKOFF': 0.05,
+}
+
+_local = threading.local()
+logger = logging.getLogger(__name__)
+
+
+def _config(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def writer_connection():
+    """Соединение писателя, если текущий поток — поток-писатель (иначе None)."""
+    return getattr(_local, 'conn', None)
+
+
+def after_commit(callback):
+    """
+    Выполнить callback после фиксации текущей операции записи
+    (например, сбросить кэш). Вне писателя выполняется сразу.
+    """
+    callbacks = getattr(_local, 'callbacks', None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+def _is_locked(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+class _Operation:
+    __slots__ = ('fn', 'future')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.future = Future()
+
+
+def _with_retry(conn, sql, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            conn.execute(sql)
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == retries:
+                raise
+            inc('db_write_retries_total')
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+def _fail(ops, error):
+    for op in ops:
+        if not op.future.done():
+            op.future.set_exception(error)
+
+
+def _execute_batch(conn, ops, retries, backoff):
+    """
+    Выполнить операции в одной транзакции соединения писателя и раздать
+    результаты. Ошибка, после которой транзакции уже нет (ROLLBACK из
+    конфликта, SQLITE_FULL, IOERR), или неудачный COMMIT завершают всю
+    пачку: работа остальных операций тоже потеряна, и они получают ту же
+    ошибку.
+    """
+    try:
+        _with_retry(conn, "BEGIN IMMEDIATE", retries, backoff)
+    except Exception as e:
+        _fail(ops, e)
+        return
+
+    results = []
+    callbacks = []
+    try:
+        for op in ops:
+            _local.callbacks = []
+            conn.execute("SAVEPOINT write_op")
+            try:
+                result = op.fn()
+            except BaseException as e:
+                if not conn.in_transaction:
+                    op.future.set_exception(e)
+                    raise
+                conn.execute("ROLLBACK TO write_op")
+                conn.execute("RELEASE write_op")
+                results.append((op, None, e))
+            else:
+                conn.execute("RELEASE write_op")
+                results.append((op, result, None))
+                callbacks.extend(_local.callbacks)
+        _with_retry(conn, "COMMIT", retries, backoff)
+    except BaseException as e:
+        if conn.in_transaction:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+        _fail(ops, e)
+        return
+    finally:
+        _local.callbacks = None
+
+    inc('db_write_batches_total')
+    inc('db_write_ops_total', len(ops))
+    for callback in callbacks:
+        # Изменения уже зафиксированы: ошибка обработчика не отменяет результат
+        try:
+            callback()
+        except Exception:
+            logger.exception('Ошибка в обработчике after_commit')
+    for op, result, error in results:
+        if error is None:
+            op.future.set_result(result)
+        else:
+            op.future.set_exception(error)
+
+
+def _writer_connect():
+    from app.models import WriterConnection, connect
+
+    conn = connect(factory=WriterConnection)
+    conn.isolation_level = None  # транзакциями управляет писатель
+    return conn
+
+
+class WriteCoordinator:
+    """Поток-писатель с очередью операций и групповой фиксацией."""
+
+    def __init__(self, batch, linger, retries, backoff):
+        self.queue = queue.Queue()
+        self.batch = batch
+        self.linger = linger
+        self.retries = retries
+        self.backoff = backoff
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, timeout=None):
+        """Выполнить fn() в потоке-писателе и вернуть её результат."""
+        op = _Operation(fn)
+        self.queue.put(op)
+        return op.future.result(timeout=timeout)
+
+    def _run(self):
+        conn = None
+        while True:
+            ops = [self.queue.get()]
+            # Небольшая задержка, чтобы собрать одновременно пришедшие записи
+            deadline = time.monotonic() + self.linger
+            while len(ops) < self.batch:
+                try:
+                    ops.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            # Поток-писатель не должен завершаться: иначе все записи процесса
+            # будут ждать WRITE_QUEUE_TIMEOUT и падать до перезапуска
+            try:
+                if conn is None:
+                    conn = _local.conn = _writer_connect()
+                _execute_batch(conn, ops, self.retries, self.backoff)
+                healthy = not conn.in_transaction
+            except BaseException as e:
+                logger.exception('Ошибка потока-писателя')
+                _fail(ops, e)
+                healthy = False
+            if not healthy:
+                conn = _local.conn = _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    """Закрыть соединение писателя после сбоя (следующая пачка откроет новое)."""
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    return None
+
+
+def _run_in_place(fn):
+    """Без очереди: та же транзакционная обёртка, но в текущем потоке."""
+    op = _Operation(fn)
+    conn = _local.conn = _writer_connect()
+    try:
+        _execute_batch(conn, [op], _config('WRITE_RETRIES'), _config('WRITE_RETRY_BACKOFF'))
+    finally:
+        _local.conn = None
+        conn.close()
+    return op.future.result()
+
+
+_coordinator = {'pid': None, 'instance': None}
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator():
+    # Поток не переживает fork, поэтому писатель создаётся заново в каждом процессе
+    if _coordinator['pid'] != os.getpid():
+        with _coordinator_lock:
+            if _coordinator['pid'] != os.getpid():
+                _coordinator['instance'] = WriteCoordinator(
+                    _config('WRITE_QUEUE_BATCH'), _config('WRITE_QUEUE_LINGER'),
+                    _config('WRITE_RETRIES'), _config('WRITE_RETRY_BACKOFF'))
+                _coordinator['pid'] = os.getpid()
+    return _coordinator['instance']
+
+
+def run_write(fn):
+    """
+    Выполнить fn() как одну операцию записи с отдельным коммитом и
+    вернуть результат (через писателя, если он включён).
+    """
+    if writer_connection() is not None:
+        return fn()
+    if has_request_context():
+        g._db_commits = g.get('_db_commits', 0) + 1
+        # Прочитанное в запросе до записи может устареть
+        from app.memo import invalidate
+        invalidate()
+    if not _config('WRITE_QUEUE_ENABLED'):
+        return _run_in_place(fn)
+    return get_coordinator().submit(fn, timeout=_config('WRITE_QUEUE_TIMEOUT'))
+
+
+# ==== Единица работы ====
+
+class UnitOfWork:
+    """Отложенные операции записи, фиксируемые одним коммитом."""
+
+    def __init__(self):
+        self.ops = []
+
+    def add(self, fn):
+        self.ops.append(fn)
+
+    def commit(self):
+        ops, self.ops = self.ops, []
+        if ops:
+            # Одна операция писателя — одна точка сохранения: всё или ничего
+            run_write(lambda: [op() for op in ops])
+
+    def discard(self):
+        self.ops = []
+
+
+def _units():
+    units = getattr(_local, 'units', None)
+    if units is None:
+        units = _local.units = []
+    return units
+
+
+def current_unit():
+    units = _units()
+    return units[-1] if units else None
+
+
+@contextmanager
+def transaction():
+    """
+    Блок, все записи в котором фиксируются одним коммитом при выходе
+    и отбрасываются при исключении. Внутри блока функции записи
+    возвращают None, а их изменения становятся видны только после коммита.
+    Вложенный блок входит в объемлющий.
+    """
+    if current_unit() is not None:
+        yield current_unit()
+        return
+    unit = UnitOfWork()
+    _units().append(unit)
+    try:
+        yield unit
+    except BaseException:
+        unit.discard()
+        raise
+    else:
+        unit.commit()
+    finally:
+        _units().remove(unit)
+
+
+def write_operation(fn):
+    """
+    Декоратор изменяющей функции модели: выполнение через писателя,
+    а внутри единицы работы — отложенно, до её коммита.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        from app.models import check_writable
+        check_writable()
+        unit = current_unit()
+        if unit is not None and writer_connection() is None:
+            from app.memo import invalidate
+            invalidate()
+            unit.add(lambda: fn(*args, **kwargs))
+            return None
+        return run_write(lambda: fn(*args, **kwargs))
+    return wrapper
+
+
+# ==== Интеграция с Flask ====
+
+def _before_request():
+    from app.models import _is_read_only_request
+
+    if current_app.config.get('WRITE_UNIT_OF_WORK', True) and not _is_read_only_request():
+        g._unit_of_work = UnitOfWork()
+        _units().append(g._unit_of_work)
+
+
+def _dispatch_with_unit(app, dispatch):
+    """
+    Обёртка app.dispatch_request: единица работы запроса фиксируется сразу
+    после обработчика, до того как ответ уйдёт в after_request. Ошибка
+    коммита обрабатывается так же, как исключение самого обработчика
+    (обработчики ошибок Flask, ответ 500), а сообщения flash, добавленные
+    обработчиком («…успешно…»), отменяются.
+    """
+    @wraps(dispatch)
+    def dispatch_request():
+        unit = g.get('_unit_of_work')
+        if unit is None:
+            return dispatch()
+        flashes = list(session.get('_flashes', ()))
+        response = app.make_response(dispatch())
+        g.pop('_unit_of_work', None)
+        _units().remove(unit)
+        # Ответ об ошибке сервера — изменения запроса не сохраняются
+        if response.status_code >= 500:
+            unit.discard()
+            return response
+        try:
+            unit.commit()
+        except Exception:
+            if flashes:
+                session['_flashes'] = flashes
+            else:
+                session.pop('_flashes', None)
+            raise
+        return response
+    return dispatch_request
+
+
+def _teardown_request(exc=None):
+    unit = g.pop('_unit_of_work', None)
+    if unit is not None:
+        # Обработчик завершился исключением (или ответ дал before_request) — отбрасываем
+        unit.discard()
+        _units().remove(unit)
+    commits = g.pop('_db_commits', 0)
+    if commits:
+        endpoint = request.endpoint or 'unknown'
+        inc('db_commits_total', commits, endpoint=endpoint)
+        inc('db_write_requests_total', endpoint=endpoint)
+
+
+def init_writer(app):
+    """Единица работы на запрос (WRITE_UNIT_OF_WORK) и учёт коммитов запросов."""
+    app.before_request(_before_request)
+    app.dispatch_request = _dispatch_with_unit(app, app.dispatch_request)
+    app.teardown_request(_teardown_request)
@@ -2,3 +2,154 @@
 
 # Секретный ключ для сессий Flask (замени на свой для продакшена!)
 SECRET_KEY = 'change_this_super_secret_key_!@#1234567890'
+
+# === Телеметрия (/metrics в формате Prometheus) ===
+# Адреса, которым разрешено читать /metrics (None — без ограничений)
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+# Каталог для снимков метрик при работе в несколько процессов (None — один процесс)
+METRICS_MULTIPROC_DIR = None
+# Как часто (в секундах) процесс сбрасывает свой снимок в каталог
+METRICS_FLUSH_INTERVAL = 5
+
+# === Профилирование запросов ===
+PROFILER_ENABLED = True
+# Доля случайно профилируемых запросов (0.0 — только по флагу администратора)
+PROFILER_SAMPLE_RATE = 0.0
+# Интервал сэмплирования стека, секунды
+PROFILER_INTERVAL = 0.005
+# Каталог профилей (None — папка profiles в корне проекта) и сколько хранить
+PROFILER_DIR = None
+PROFILER_KEEP = 200
+
+# === База данных ===
+# Журнал WAL: GET-запросы читают через отдельные соединения только для чтения
+# и не конфликтуют с записью
+DB_WAL = True
+# Все изменения в процессе выполняет один поток-писатель с групповыми коммитами
+WRITE_QUEUE_ENABLED = True
+# Сколько операций из очереди объединять в один коммит и сколько секунд
+# ждать попутных операций перед коммитом
+WRITE_QUEUE_BATCH = 64
+WRITE_QUEUE_LINGER = 0.002
+# Максимальное ожидание результата записи, секунды
+WRITE_QUEUE_TIMEOUT = 30
+# Откладывать записи запроса (POST и т.п.) до его конца и фиксировать одним
+# коммитом; при ошибке сервера все изменения запроса отбрасываются
+WRITE_UNIT_OF_WORK = True
+# Повторы при блокировке БД другим процессом и начальная задержка (растёт вдвое)
+WRITE_RETRIES = 6
+WRITE_RETRY_BACKOFF = 0.05
+
+# Строк за одну выборку (fetchmany) при потоковом чтении больших таблиц (iter_*)
+FETCH_BATCH = 500
+# Повторные чтения моделей с теми же аргументами в одном запросе брать из памяти
+# запроса (сбрасывается при любой записи в этом запросе)
+REQUEST_MEMO = True
+
+# Сколько секунд кэшируются данные текущего пользователя (g.user)
+USER_CACHE_TTL = 30
+
+# === Пароли ===
+# Метод хэширования werkzeug; при входе старые хэши пересчитываются с этими параметрами
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+PASSWORD_SALT_LENGTH = 16
+# Потоков для хэширования (None — половина ядер) и мест в очереди сверх них;
+# при переполнении вход сразу получает 503
+PASSWORD_POOL_WORKERS = None
+PASSWORD_POOL_QUEUE = 32
+# Максимальное ожидание результата хэширования, секунды
+PASSWORD_POOL_TIMEOUT = 10
+
+# Срезы аналитического куба (/reports) считать по его копии в памяти
+# (на NumPy, если установлен); False — каждый раз запросом к БД
+ANALYTICS_IN_MEMORY = True
+# Сколько последних срезов куба держать в памяти до следующего изменения данных
+ANALYTICS_SLICE_CACHE = 256
+# Окно скользящего среднего в динамике показателей, лет
+TRENDS_WINDOW = 3
+# Рейтинги: размер top-K на /reports, показатели, по которым он выводится,
+# и сколько изменившихся преподавателей применяется без полного пересчёта
+LEADERBOARD_TOP_K = 10
+LEADERBOARD_METRICS = ('citations', 'h_index', 'scopus')
+LEADERBOARD_INCREMENTAL_MAX = 200
+# Граф соавторства: максимум итераций при расчёте центральности по собственному вектору
+COAUTHOR_MAX_ITERATIONS = 100
+# За сколько дней до срока доработки публикация попадает в предупреждения
+DEADLINE_DUE_SOON_DAYS = 7
+# Как часто фоновый планировщик сроков обновляет предупреждения, секунды (0 — только вручную)
+DEADLINE_SCHEDULER_INTERVAL = 3600
+
+# Строгий режим шаблонов: запрос к БД во время рендеринга вызывает ошибку
+# (включайте при разработке, чтобы ловить запросы из шаблонов)
+TEMPLATE_STRICT_DB = False
+
+# === Почта (уведомления авторам о решениях по публикациям) ===
+# Письма всегда записываются в outbox; отправляет их фоновая задача, если включена
+MAIL_ENABLED = False
+MAIL_SERVER = 'localhost'
+MAIL_PORT = 25
+MAIL_USE_TLS = False
+MAIL_USE_SSL = False
+MAIL_USERNAME = None
+MAIL_PASSWORD = None
+MAIL_SENDER = 'noreply@university.ru'
+MAIL_TIMEOUT = 10
+# Соединение, простаивавшее дольше стольких секунд, перед отправкой проверяется NOOP
+MAIL_KEEPALIVE = 60
+# Писем за одну пачку и пауза между проверками outbox, секунды
+MAIL_BATCH = 50
+MAIL_INTERVAL = 30
+# Попыток на письмо; пауза перед повтором (секунды) удваивается с каждой попыткой
+MAIL_MAX_ATTEMPTS = 8
+MAIL_RETRY_BACKOFF = 60
+# На сколько секунд процесс резервирует взятую пачку
+MAIL_LEASE = 300
+
+# === Журнал действий ===
+# Сколько дней записи хранятся в таблице logs; более старые месяцы
+# переносятся в сжатые файлы в LOG_ARCHIVE_DIR (None — папка archive/logs в корне проекта)
+LOG_RETENTION_DAYS = 90
+LOG_ARCHIVE_DIR = None
+# Записей за одну порцию архивации, пауза между запусками (секунды, 0 — только
+# flask archive-logs) и максимум порций за один фоновый запуск
+LOG_ARCHIVE_BATCH = 5000
+LOG_ARCHIVE_INTERVAL = 3600
+LOG_ARCHIVE_MAX_BATCHES = 20
+# Сколько месяцев хранить архивные файлы (None — всегда)
+LOG_ARCHIVE_KEEP_MONTHS = None
+# Записей на странице /log
+LOG_PAGE_SIZE = 100
+
+# === Шаблоны ===
+# Кэш байткода Jinja на диске (общий для всех процессов) и его каталог
+# (None — папка cache/jinja в корне проекта)
+TEMPLATE_BYTECODE_CACHE = True
+TEMPLATE_CACHE_DIR = None
+# Компилировать все шаблоны при старте, до обработки первого запроса
+TEMPLATE_PRECOMPILE = True
+
+# === Сжатие ответов (gzip) ===
+COMPRESS_ENABLED = True
+COMPRESS_LEVEL = 6
+# Ответы меньше этого размера (байт) не сжимаются
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = (
+    'text/html', 'text/csv', 'text/plain', 'text/css',
+    'application/javascript', 'application/json',
+)
+# Объём памяти под повторно используемые сжатые ответы, байт
+COMPRESS_CACHE_BYTES = 32 * 1024 * 1024
+# Эндпоинты, ответы которых одинаковы для всех и запоминаются в сжатом виде
+# (кроме них — ответы с Cache-Control: public)
+COMPRESS_CACHE_ENDPOINTS = ('main.reports_cube',)
+
+# === Продакшен-запуск (python serve.py) ===
+SERVER_BIND = '127.0.0.1:8000'
+# Число процессов-воркеров (None — по числу ядер) и потоков в каждом
+SERVER_WORKERS = None
+SERVER_THREADS = 4
+# Перезапуск воркера после стольких запросов (0 — не перезапускать) и случайный разброс
+SERVER_MAX_REQUESTS = 0
+SERVER_MAX_REQUESTS_JITTER = 50
+# Сколько секунд ждать завершения текущих запросов при остановке/перезагрузке
+SERVER_GRACEFUL_TIMEOUT = 30
@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+from app.migrations import migrate
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'research_metrics.db')
 
 
@@ -306,6 +308,8 @@ def main():
         os.remove(DB_PATH)
     conn = sqlite3.connect(DB_PATH)
     create_tables(conn)
+    # Схема доводится до текущей версии теми же миграциями, что и при старте приложения
+    migrate(conn)
     insert_test_data(conn)
     conn.close()
     print(f"База данных успешно создана и заполнена тестовыми данными: {DB_PATH}")
@@ -0,0 +1,262 @@
+# serve.py
+
+"""
+Продакшен-запуск без внешнего сервера: мастер-процесс один раз создаёт
+приложение и прогревает кэши, затем форкает SERVER_WORKERS воркеров,
+которые делят прогретое состояние через copy-on-write. Каждый воркер
+обслуживает запросы пулом из SERVER_THREADS потоков.
+
+Сигналы мастеру:
+  SIGTERM / SIGINT — плавная остановка (воркеры дорабатывают текущие запросы);
+  SIGHUP — перезагрузка без простоя: мастер перезапускает себя с тем же
+           слушающим сокетом, поднимает новых воркеров с новым кодом и
+           только потом плавно останавливает старых.
+
+Воркер, обработавший SERVER_MAX_REQUESTS запросов (плюс случайный разброс),
+плавно завершается, и мастер запускает ему замену.
+
+Запуск: python serve.py [--bind 0.0.0.0:8000] [--workers N] [--threads N]
+"""
+
+import argparse
+import gc
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from app import create_app, telemetry
+from app.startup import report_startup, warm_up
+
+LISTEN_FD_ENV = 'RM_LISTEN_FD'
+OLD_WORKERS_ENV = 'RM_OLD_WORKERS'
+
+
+class RequestHandler(WSGIRequestHandler):
+    # Без keep-alive: соединение не занимает поток пула между запросами
+    protocol_version = 'HTTP/1.0'
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI-сервер воркера с ограниченным пулом потоков."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, fd, threads, max_requests):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        # Пока все потоки заняты, воркер не принимает новые соединения —
+        # они ждут в очереди ядра и достаются свободным воркерам
+        self.slots = threading.BoundedSemaphore(threads)
+        self.max_requests = max_requests
+        self.handled = 0
+        self._count_lock = threading.Lock()
+        self._stopping = False
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+            with self._count_lock:
+                self.handled += 1
+                recycle = self.max_requests and self.handled >= self.max_requests
+            if recycle:
+                self.stop()
+
+    def stop(self):
+        """Плавная остановка: перестать принимать соединения и дождаться текущих."""
+        if not self._stopping:
+            self._stopping = True
+            # shutdown() ждёт выхода из serve_forever, поэтому — из другого потока
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+
+def run_worker(app, listen_fd, host, port, threads, max_requests):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # Счётчики мастера сброшены при fork; время старта — общее для всех воркеров
+    report_startup(app)
+    if max_requests:
+        # Разброс, чтобы воркеры не перезапускались одновременно
+        max_requests += random.randint(0, app.config.get('SERVER_MAX_REQUESTS_JITTER', 0))
+    server = PooledWSGIServer(host, port, app, listen_fd, threads, max_requests)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.pool.shutdown(wait=True)
+        server.socket.close()
+        # Последний снимок метрик, чтобы счётчики воркера не потерялись
+        directory = app.config.get('METRICS_MULTIPROC_DIR')
+        if directory:
+            telemetry.flush(directory)
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, app, sock, workers, threads):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.children = set()
+        self.stopping = False
+        self.reloading = False
+        host, port = sock.getsockname()[:2]
+        self.host, self.port = host, port
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock.fileno(), self.host, self.port, self.threads,
+                           self.app.config.get('SERVER_MAX_REQUESTS', 0))
+            finally:
+                os._exit(1)
+        self.children.add(pid)
+        return pid
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.children.discard(pid)
+            # Воркер сбросил последний снимок перед выходом — сливаем его с остальными
+            directory = self.app.config.get('METRICS_MULTIPROC_DIR')
+            if directory:
+                telemetry.compact(directory)
+
+    def stop_workers(self, pids, timeout):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(self._alive(pid) for pid in pids):
+            self.reap()
+            time.sleep(0.1)
+        for pid in pids:
+            if self._alive(pid):
+                os.kill(pid, signal.SIGKILL)
+        self.reap()
+
+    def _alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        # Завершившийся, но не собранный потомок считается мёртвым
+        try:
+            if os.waitpid(pid, os.WNOHANG) == (0, 0):
+                return True
+        except ChildProcessError:
+            pass
+        self.children.discard(pid)
+        return False
+
+    def run(self, old_workers=()):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        # Замораживаем объекты прогретого приложения: сборщик мусора не будет
+        # их трогать, и страницы памяти останутся общими после fork
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn()
+        if old_workers:
+            # Перезагрузка: новые воркеры уже принимают соединения
+            self.stop_workers(list(old_workers), self.app.config.get('SERVER_GRACEFUL_TIMEOUT', 30))
+
+        timeout = self.app.config.get('SERVER_GRACEFUL_TIMEOUT', 30)
+        while True:
+            self.reap()
+            if self.stopping:
+                self.stop_workers(list(self.children), timeout)
+                return
+            if self.reloading:
+                self._reexec()
+            # Замена завершившихся воркеров (в т.ч. по SERVER_MAX_REQUESTS)
+            while len(self.children) < self.workers:
+                self.spawn()
+            time.sleep(0.5)
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reloading = True
+
+    def _reexec(self):
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in self.children)
+        self.sock.set_inheritable(True)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+def open_socket(bind):
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        host, _, port = bind.rpartition(':')
+        sock = socket.create_server((host or '0.0.0.0', int(port)), backlog=2048, reuse_port=False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Многопроцессный запуск приложения')
+    parser.add_argument('--bind', help='адрес:порт (по умолчанию SERVER_BIND)')
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию SERVER_WORKERS)')
+    parser.add_argument('--threads', type=int, help='потоков на процесс (по умолчанию SERVER_THREADS)')
+    args = parser.parse_args()
+
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+
+    app = create_app()
+    config = app.config
+    temp_metrics = not config.get('METRICS_MULTIPROC_DIR')
+    if temp_metrics:
+        # Метрики всех воркеров должны суммироваться в /metrics; при SIGHUP
+        # мастер перезапускается с тем же pid и продолжает тот же каталог
+        config['METRICS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), 'research_metrics-%d' % os.getpid())
+        os.makedirs(config['METRICS_MULTIPROC_DIR'], exist_ok=True)
+    # Снимки процессов, оставшиеся от прошлых запусков
+    telemetry.compact(config['METRICS_MULTIPROC_DIR'])
+    warm_up(app)
+
+    sock = open_socket(args.bind or config.get('SERVER_BIND', '127.0.0.1:8000'))
+    workers = args.workers or config.get('SERVER_WORKERS') or os.cpu_count() or 1
+    threads = args.threads or config.get('SERVER_THREADS', 4)
+    app.logger.warning('Слушаю %s:%s, воркеров: %d, потоков на воркер: %d',
+                       *sock.getsockname()[:2], workers, threads)
+    Master(app, sock, workers, threads).run(old_workers)
+    if temp_metrics:
+        shutil.rmtree(config['METRICS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# tests/conftest.py
+
+import os
+import shutil
+
+import pytest
+
+import app.models as models
+from app import create_app
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Приложение над копией research_metrics.db (писатель процесса — один на сессию)."""
+    work = tmp_path_factory.mktemp('db')
+    models.DATABASE = str(work / 'research_metrics.db')
+    shutil.copy(os.path.join(ROOT, 'research_metrics.db'), models.DATABASE)
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        LOG_ARCHIVE_DIR=str(work / 'archive'),
+        PROFILER_DIR=str(work / 'profiles'),
+    )
+    os.makedirs(app.config['PROFILER_DIR'], exist_ok=True)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, email='admin@university.ru', password='admin'):
+    return client.post('/login', data={'email': email, 'password': password})
+
+
+@pytest.fixture
+def admin(client):
+    login(client)
+    return client
+
+
+@pytest.fixture
+def read_db(app):
+    """Соединение только для чтения в контексте приложения."""
+    with app.app_context():
+        yield models.get_db(write=False)
+
+
+def make_lecturer(app, fio, department='Кафедра тестирования'):
+    """Новый преподаватель (в обход запроса) — его id."""
+    from app.writer import run_write
+
+    with app.app_context():
+        def create():
+            cur = models.get_db().execute(
+                "INSERT INTO lecturers (fio, position, department) VALUES (?, 'доцент', ?)", (fio, department))
+            return cur.lastrowid
+        return run_write(create)
+
+
+def make_publication(app, title, lecturer_ids, year=2023):
+    """Новая публикация с авторами lecturer_ids — её id."""
+    with app.app_context():
+        models.create_publication(title, year, 'Журнал', 'Scopus', '', '0', '', lecturer_ids)
+        return models.get_db(write=False).execute(
+            "SELECT MAX(id) FROM publications WHERE title = ?", (title,)).fetchone()[0]
@@ -0,0 +1,63 @@
+# tests/test_analytics.py
+
+import app.analytics as analytics
+import app.models as models
+from tests.conftest import make_lecturer, make_publication
+
+
+def _years(app):
+    with app.app_context():
+        return [row['year'] for row in analytics.cube_slice(models.get_db(write=False), ['year'])]
+
+
+def test_text_year_is_stored_in_cube_as_integer(app, admin):
+    lecturer_id = make_lecturer(app, 'Куб Годов')
+    # Старые данные: год сохранён строкой, не являющейся числом
+    make_publication(app, 'Публикация без года', [lecturer_id], year='не указан')
+    assert all(isinstance(year, int) for year in _years(app))
+    assert admin.get('/reports').status_code == 200
+    assert admin.get('/reports/cube?by=year').status_code == 200
+
+
+def test_publication_routes_reject_non_numeric_year(app, admin):
+    response = admin.post('/add_publication', data={
+        'title': 'Год словами', 'year': 'двадцать', 'journal': '', 'source': '',
+        'link': '', 'citations': '0', 'doi': ''}, follow_redirects=True)
+    assert 'Год публикации должен быть числом' in response.get_data(as_text=True)
+    with app.app_context():
+        assert models.get_db(write=False).execute(
+            "SELECT COUNT(*) FROM publications WHERE title = 'Год словами'").fetchone()[0] == 0
+
+
+def test_slice_cache_is_bounded(app):
+    app.config['ANALYTICS_SLICE_CACHE'] = 4
+    try:
+        with app.app_context():
+            db = models.get_db(write=False)
+            for year in range(10):
+                analytics.cube_slice(db, ['source'], year=year)
+        assert len(analytics._slices) == 4
+    finally:
+        app.config.pop('ANALYTICS_SLICE_CACHE')
+
+
+def test_slice_rows_are_copies(app):
+    with app.app_context():
+        db = models.get_db(write=False)
+        rows = analytics.cube_slice(db, ['year'])
+        rows[0]['publications'] = -1
+        rows.append({'total': True})
+        again = analytics.cube_slice(db, ['year'])
+    assert again[0]['publications'] != -1 and {'total': True} not in again
+
+
+def test_deleted_publication_leaves_no_zero_cells(app):
+    lecturer_id = make_lecturer(app, 'Нулевой Кубов', department='Кафедра нулей')
+    pub_id = make_publication(app, 'Временная публикация', [lecturer_id], year=1999)
+    with app.app_context():
+        models.delete_publication(pub_id)
+        db = models.get_db(write=False)
+        assert db.execute(
+            "SELECT COUNT(*) FROM analytics_cube WHERE publications = 0 AND citations = 0").fetchone()[0] == 0
+        assert db.execute(
+            "SELECT COUNT(*) FROM analytics_cube WHERE year = 1999").fetchone()[0] == 0
@@ -0,0 +1,26 @@
+# tests/test_assets.py
+
+from app.assets import minify_css, minify_js
+
+
+def test_js_code_next_to_comments_survives():
+    assert 'init();' in minify_js('/* a */ init(); /* b */\nx=1\n')
+    assert 'g();' in minify_js('/* начало\n*/ g();\n')
+
+
+def test_js_whole_line_comments_are_removed():
+    source = '/**\n * Описание\n */\nfunction f() {\n    // шаг\n    return 1;\n}\n'
+    assert minify_js(source) == 'function f() {\nreturn 1;\n}\n'
+
+
+def test_js_with_template_strings_is_left_as_is():
+    source = 'const s = `\n  // не комментарий\n`;\n'
+    assert minify_js(source) == source
+
+
+def test_css_keeps_descendant_pseudo_class_and_strings():
+    css = minify_css('.nav :hover { color : red ; }\n/* c */ a[title="a ; b"] , b > i { content: \'x , y\'; }')
+    assert '.nav :hover{' in css
+    assert 'a[title="a ; b"],b>i{' in css
+    assert "'x , y'" in css
+    assert '/*' not in css
@@ -0,0 +1,22 @@
+# tests/test_compression.py
+
+import app.compression as compression
+
+
+def _cached(client, url):
+    compression._cache._items.clear()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers.get('Content-Encoding') == 'gzip'
+    return len(compression._cache._items)
+
+
+def test_personal_pages_are_compressed_without_caching(admin):
+    assert _cached(admin, '/publications') == 0
+
+
+def test_shared_responses_are_cached(app, client):
+    app.config['COMPRESS_MIN_SIZE'] = 1
+    try:
+        assert _cached(client, '/reports/cube?by=year,source,status,department') == 1
+    finally:
+        app.config['COMPRESS_MIN_SIZE'] = 1024
@@ -0,0 +1,22 @@
+# tests/test_deadlines.py
+
+import app.models as models
+from tests.conftest import login, make_lecturer, make_publication
+
+
+def _pending(app):
+    with app.app_context():
+        return models.get_db(write=False).execute("SELECT COUNT(*) FROM deadline_changes").fetchone()[0]
+
+
+def test_staff_deadlines_page_is_read_only(app, client):
+    pub_id = make_publication(app, 'Срок доработки', [make_lecturer(app, 'Сроков Тест')])
+    with app.app_context():
+        models.update_publication_status(pub_id, 'revision_required', 'Поправить', '2000-01-01')
+    pending = _pending(app)
+    assert pending > 0
+
+    login(client, 'user@university.ru', 'user')
+    assert client.get('/staff/deadlines').status_code == 200
+    # Планировщик на просмотре не запускается
+    assert _pending(app) == pending
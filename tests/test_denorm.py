@@ -0,0 +1,35 @@
+# tests/test_denorm.py
+
+import json
+
+import app.models as models
+from app.denorm import find_author_drift
+from tests.conftest import make_lecturer, make_publication
+
+
+def _authors(app, pub_id):
+    with app.app_context():
+        row = models.get_db(write=False).execute(
+            "SELECT authors_display, author_ids FROM publications WHERE id = ?", (pub_id,)).fetchone()
+    return row['authors_display'], json.loads(row['author_ids'])
+
+
+def test_author_columns_follow_links_and_renames(app):
+    first = make_lecturer(app, 'Первый Денормов')
+    second = make_lecturer(app, 'Второй Денормов')
+    pub_id = make_publication(app, 'Совместная статья', [second, first])
+    assert _authors(app, pub_id) == ('Первый Денормов, Второй Денормов', [first, second])
+
+    with app.app_context():
+        models.update_lecturer(first, 'Первый Переименованный', 'доцент', 'Кафедра', '', '', '')
+    assert _authors(app, pub_id) == ('Первый Переименованный, Второй Денормов', [first, second])
+
+    with app.app_context():
+        models.update_publication(pub_id, 'Совместная статья', 2023, '', '', '', 0, '', [second])
+    assert _authors(app, pub_id) == ('Второй Денормов', [second])
+
+    with app.app_context():
+        models.delete_lecturer(second)
+    assert _authors(app, pub_id) == ('', [])
+    with app.app_context():
+        assert find_author_drift(models.get_db(write=False)) == []
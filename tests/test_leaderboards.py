@@ -0,0 +1,24 @@
+# tests/test_leaderboards.py
+
+from app.leaderboards import METRICS, Leaderboards
+
+
+def _row(lecturer_id, value, department='Кафедра'):
+    row = {metric: value for metric in METRICS}
+    row.update(lecturer_id=lecturer_id, fio='Преподаватель %d' % lecturer_id, department=department)
+    return row
+
+
+def test_apply_leaves_published_boards_untouched():
+    metric = METRICS[0]
+    old = Leaderboards([_row(1, 5), _row(2, 3)], 1)
+    new = old.apply([_row(3, 10), _row(2, 1)], [3, 2, 1], 2)
+
+    # Читатель старого объекта видит прежние рейтинги целиком
+    assert [item['lecturer_id'] for item in old.top(metric)] == [1, 2]
+    assert old.seq == 1 and old.position(3, metric) is None
+
+    assert [item['lecturer_id'] for item in new.top(metric)] == [3, 2]
+    assert new.seq == 2
+    assert new.position(3, metric)['rank'] == 1
+    assert new.for_lecturer(1) is None
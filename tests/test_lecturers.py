@@ -0,0 +1,49 @@
+# tests/test_lecturers.py
+
+import app.models as models
+from tests.conftest import make_lecturer, make_publication
+
+
+def _links(app, lecturer_id):
+    with app.app_context():
+        return sorted(row[0] for row in models.get_db(write=False).execute(
+            "SELECT publication_id FROM lecturer_publications WHERE lecturer_id = ?", (lecturer_id,)))
+
+
+def test_reassign_to_same_lecturer_keeps_links(app):
+    lid = make_lecturer(app, 'Тестов Т.Т.')
+    pubs = [make_publication(app, 'Статья %d' % i, [lid]) for i in range(3)]
+    with app.app_context():
+        models.reassign_publications(lid, lid)
+        models.reassign_publications(lid, lid, pubs[:2])
+    assert _links(app, lid) == sorted(pubs)
+
+
+def test_reassign_moves_and_deduplicates(app):
+    a = make_lecturer(app, 'Первый П.П.')
+    b = make_lecturer(app, 'Второй В.В.')
+    shared = make_publication(app, 'Общая', [a, b])
+    own = make_publication(app, 'Своя', [a])
+    with app.app_context():
+        models.reassign_publications(a, b)
+    assert _links(app, a) == []
+    assert _links(app, b) == sorted([shared, own])
+
+
+def test_merge_lecturer_route(app, admin):
+    duplicate = make_lecturer(app, 'Дубликат Д.Д.')
+    target = make_lecturer(app, 'Основной О.О.')
+    pub = make_publication(app, 'Статья дубликата', [duplicate])
+    response = admin.post('/merge_lecturer/%d' % duplicate, data={'into': target})
+    assert response.status_code == 302
+    assert _links(app, target) == [pub]
+    with app.app_context():
+        assert models.get_lecturer_by_id(duplicate) is None
+
+
+def test_merge_with_itself_is_rejected(app, admin):
+    lid = make_lecturer(app, 'Одинокий О.О.')
+    pub = make_publication(app, 'Единственная', [lid])
+    response = admin.post('/merge_lecturer/%d' % lid, data={'into': lid})
+    assert response.status_code == 302
+    assert _links(app, lid) == [pub]
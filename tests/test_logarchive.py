@@ -0,0 +1,20 @@
+# tests/test_logarchive.py
+
+import app.models as models
+from app.logarchive import archive_logs, read_archive
+from app.writer import run_write
+
+
+def test_archive_pages_newest_first(app):
+    app.config['LOG_ARCHIVE_BATCH'] = 7  # несколько членов gzip в одном файле
+    with app.app_context():
+        run_write(lambda: models.get_db().executemany(
+            "INSERT INTO logs (timestamp, user_id, action, description) VALUES (?, 1, ?, '')",
+            [('2001-03-%02d 12:00:00' % day, 'even' if day % 2 == 0 else 'odd') for day in range(1, 26)]))
+        assert archive_logs()['2001-03'] == 25
+        db = models.get_db(write=False)
+        days = [int(r['timestamp'][8:10]) for r in read_archive(db, '2001-03', {}, 10, 5)]
+        assert days == list(range(20, 10, -1))
+        evens = [int(r['timestamp'][8:10]) for r in read_archive(db, '2001-03', {'action': 'even'}, 3, 10)]
+        assert evens == [4, 2]
+    app.config['LOG_ARCHIVE_BATCH'] = 5000
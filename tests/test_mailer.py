@@ -0,0 +1,112 @@
+# tests/test_mailer.py
+
+import smtplib
+import time
+
+import pytest
+
+import app.mailer as mailer
+import app.models as models
+from app.writer import run_write
+
+
+class FakePool:
+    """SMTP-пул, возвращающий заданную ошибку (None — письмо отправлено)."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def send(self, config, messages):
+        self.sent.extend(message['To'] for _, message in messages)
+        return {msg_id: self.error for msg_id, _ in messages}
+
+
+@pytest.fixture
+def outbox(app):
+    with app.app_context():
+        run_write(lambda: models.get_db().execute("DELETE FROM outbox"))
+        yield models.get_db(write=False)
+
+
+def _enqueue(key='k1', recipient='author@university.ru'):
+    run_write(lambda: mailer.enqueue(models.get_db(), 'review', recipient, 'Тема', 'Текст', key))
+
+
+def _rows(db):
+    return db.execute("SELECT * FROM outbox ORDER BY id").fetchall()
+
+
+def test_duplicate_pending_enqueue_is_ignored(outbox):
+    _enqueue()
+    _enqueue()
+    assert len(_rows(outbox)) == 1
+    # После отправки тот же ключ снова можно поставить в очередь
+    run_write(lambda: models.get_db().execute("UPDATE outbox SET status = 'sent'"))
+    _enqueue()
+    assert [row['status'] for row in _rows(outbox)] == ['sent', 'pending']
+
+
+def test_expired_lease_is_claimed_again(outbox):
+    _enqueue()
+    now = time.time()
+    claim = lambda at: run_write(lambda: mailer._claim(models.get_db(), at, 10, 300))
+    assert len(claim(now)) == 1
+    assert claim(now + 1) == []
+    assert len(claim(now + 301)) == 1
+
+
+def test_temporary_failure_is_retried_with_backoff(app, outbox, monkeypatch):
+    monkeypatch.setattr(mailer, '_pool', FakePool(smtplib.SMTPServerDisconnected('обрыв')))
+    _enqueue()
+    before = time.time()
+    assert mailer.deliver_pending(max_batches=1) == (0, 1, 0)
+    row = _rows(outbox)[0]
+    backoff = app.config['MAIL_RETRY_BACKOFF']
+    assert row['status'] == 'pending' and row['attempts'] == 1 and row['locked_until'] == 0
+    assert before + backoff <= row['next_attempt'] <= time.time() + backoff
+    # Вторая неудача — пауза удваивается
+    run_write(lambda: models.get_db().execute("UPDATE outbox SET next_attempt = 0"))
+    before = time.time()
+    mailer.deliver_pending(max_batches=1)
+    assert _rows(outbox)[0]['next_attempt'] >= before + 2 * backoff
+
+
+def test_last_attempt_marks_message_failed(app, outbox, monkeypatch):
+    monkeypatch.setattr(mailer, '_pool', FakePool(smtplib.SMTPServerDisconnected('обрыв')))
+    _enqueue()
+    run_write(lambda: models.get_db().execute(
+        "UPDATE outbox SET attempts = ?", (app.config['MAIL_MAX_ATTEMPTS'] - 1,)))
+    assert mailer.deliver_pending(max_batches=1) == (0, 0, 1)
+    row = _rows(outbox)[0]
+    assert row['status'] == 'failed' and 'обрыв' in row['last_error']
+
+
+def test_sent_message_is_marked_sent(outbox, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(mailer, '_pool', pool)
+    _enqueue()
+    assert mailer.deliver_pending() == (1, 0, 0)
+    assert pool.sent == ['author@university.ru']
+    assert _rows(outbox)[0]['status'] == 'sent'
+
+
+def test_smtp_pool_disconnect_defers_rest_of_batch(app):
+    class Connection:
+        def __init__(self):
+            self.calls = 0
+
+        def send_message(self, message):
+            self.calls += 1
+            if self.calls == 2:
+                raise smtplib.SMTPServerDisconnected('обрыв')
+
+        def quit(self):
+            pass
+
+    pool = mailer.SMTPPool()
+    pool._conn, pool._last_used = Connection(), time.monotonic()
+    results = pool.send(app.config, [(1, None), (2, None), (3, None)])
+    assert results[1] is None
+    assert isinstance(results[2], smtplib.SMTPServerDisconnected) and results[3] is results[2]
+    assert pool._conn is None
@@ -0,0 +1,56 @@
+# tests/test_memo.py
+
+import app.models as models
+from app.memo import memo_stats
+from app.writer import transaction
+from tests.conftest import make_lecturer
+
+
+def _rename(lecturer_id, fio):
+    models.update_lecturer(lecturer_id, fio, 'доцент', 'Кафедра тестирования', '', '', '')
+
+
+def test_repeated_read_is_served_from_memo(app):
+    lecturer = make_lecturer(app, 'Мемов Повтор')
+    with app.test_request_context('/lecturers', method='POST'):
+        first = models.get_lecturer_by_id(lecturer)
+        assert models.get_lecturer_by_id(lecturer) is first
+        assert memo_stats() == (1, 1)
+
+
+def test_write_in_request_invalidates_memo(app):
+    lecturer = make_lecturer(app, 'Мемов До записи')
+    with app.test_request_context('/lecturers', method='POST'):
+        assert models.get_lecturer_by_id(lecturer)['fio'] == 'Мемов До записи'
+        _rename(lecturer, 'Мемов После записи')
+        assert models.get_lecturer_by_id(lecturer)['fio'] == 'Мемов После записи'
+        assert memo_stats() == (0, 2)
+
+
+def test_deferred_write_invalidates_memo(app):
+    lecturer = make_lecturer(app, 'Мемов Единица')
+    with app.test_request_context('/lecturers', method='POST'):
+        fios = lambda: {row['id']: row['fio'] for row in models.get_all_lecturers(('id', 'fio'))}
+        assert fios()[lecturer] == 'Мемов Единица'
+        with transaction():
+            _rename(lecturer, 'Мемов Единица зафиксирована')
+            # Запись отложена до коммита, но прочитанное до неё уже забыто
+            assert fios()[lecturer] == 'Мемов Единица'
+        assert fios()[lecturer] == 'Мемов Единица зафиксирована'
+        assert memo_stats() == (0, 3)
+
+
+def test_callers_get_copies(app):
+    with app.test_request_context('/lecturers'):
+        lecturers = models.get_all_lecturers(('id', 'fio'))
+        count = len(lecturers)
+        lecturers.clear()
+        assert len(models.get_all_lecturers(('id', 'fio'))) == count
+
+
+def test_no_memo_outside_request(app):
+    lecturer = make_lecturer(app, 'Мемов Вне запроса')
+    with app.app_context():
+        assert models.get_lecturer_by_id(lecturer)['fio'] == 'Мемов Вне запроса'
+        _rename(lecturer, 'Мемов Вне запроса 2')
+        assert models.get_lecturer_by_id(lecturer)['fio'] == 'Мемов Вне запроса 2'
@@ -0,0 +1,39 @@
+# tests/test_migrations.py
+
+import sqlite3
+
+import pytest
+
+from app.migrations import _link_table_without_rowid
+
+
+def _old_schema():
+    db = sqlite3.connect(':memory:')
+    db.execute("PRAGMA foreign_keys = ON")
+    db.execute("CREATE TABLE lecturers (id INTEGER PRIMARY KEY, fio TEXT)")
+    db.execute("CREATE TABLE publications (id INTEGER PRIMARY KEY, title TEXT)")
+    # Связи до миграции: rowid-таблица без ключа и каскада
+    db.execute("CREATE TABLE lecturer_publications (lecturer_id INTEGER, publication_id INTEGER)")
+    db.executemany("INSERT INTO lecturers VALUES (?, ?)", [(1, 'А'), (2, 'Б')])
+    db.executemany("INSERT INTO publications VALUES (?, ?)", [(10, 'X'), (11, 'Y')])
+    db.executemany("INSERT INTO lecturer_publications VALUES (?, ?)",
+                   [(1, 10), (1, 10), (2, 10), (2, 11), (3, 10), (1, 99)])
+    return db
+
+
+def test_link_table_migration():
+    db = _old_schema()
+    _link_table_without_rowid(db)
+
+    sql = db.execute("SELECT sql FROM sqlite_master WHERE name = 'lecturer_publications'").fetchone()[0]
+    assert 'WITHOUT ROWID' in sql
+    # Дубли и связи с несуществующими записями не перенесены
+    assert db.execute("SELECT lecturer_id, publication_id FROM lecturer_publications "
+                      "ORDER BY 1, 2").fetchall() == [(1, 10), (2, 10), (2, 11)]
+    assert db.execute("PRAGMA index_list(lecturer_publications)").fetchall()
+    # Удаление публикации удаляет её связи каскадно
+    db.execute("DELETE FROM publications WHERE id = 10")
+    assert db.execute("SELECT lecturer_id, publication_id FROM lecturer_publications").fetchall() == [(2, 11)]
+    # Повторная связь отклоняется первичным ключом
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("INSERT INTO lecturer_publications VALUES (2, 11)")
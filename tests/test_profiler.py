@@ -0,0 +1,32 @@
+# tests/test_profiler.py
+
+import json
+import os
+
+import app.profiler as profiler
+
+
+def _summary(app, response):
+    profile_id = response.headers['X-Profile-Id']
+    with open(os.path.join(app.config['PROFILER_DIR'], profile_id + '.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_busy_profiler_skips_request(admin):
+    assert profiler._busy.acquire(blocking=False)
+    try:
+        response = admin.get('/reports?_profile=1')
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+    finally:
+        profiler._busy.release()
+    assert 'X-Profile-Id' in admin.get('/reports?_profile=1').headers
+    # Сессия освободила профилировщик
+    assert not profiler._busy.locked()
+
+
+def test_sql_attributed_to_nearest_app_function(app, admin):
+    summary = _summary(app, admin.get('/reports?_profile=1'))
+    names = [name for name, count, seconds in summary['sql_by_function']]
+    assert 'analytics.data_version' in names
+    assert all(name.startswith('<') or '.' in name for name in names)
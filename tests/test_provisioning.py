@@ -0,0 +1,50 @@
+# tests/test_provisioning.py
+
+import pytest
+from werkzeug.security import check_password_hash
+
+import app.models as models
+import app.passwords as passwords
+import app.provisioning as provisioning
+from app.writer import run_write
+
+
+@pytest.fixture
+def fast_hash(app):
+    method = app.config['PASSWORD_HASH_METHOD']
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1'
+    yield
+    app.config['PASSWORD_HASH_METHOD'] = method
+
+
+def _rows(*emails):
+    return [{'line': i + 2, 'fio': 'Пользователь %d' % i, 'email': email, 'role': 'staff'}
+            for i, email in enumerate(emails)]
+
+
+def test_hash_passwords_uses_the_password_pool(app, fast_hash):
+    with app.app_context():
+        hashes = passwords.hash_passwords(['p%d' % i for i in range(40)])
+        assert all(check_password_hash(h, 'p%d' % i) for i, h in enumerate(hashes))
+        # Все места пула освобождены
+        executor, slots = passwords._executor()
+        assert slots._value == passwords._pool['workers'] + app.config['PASSWORD_POOL_QUEUE']
+
+
+def test_provision_reports_users_taken_during_hashing(app, fast_hash, monkeypatch):
+    hash_passwords = passwords.hash_passwords
+
+    def hash_and_race(items):
+        # Пока считались хэши, другой запрос создал пользователя с тем же email
+        run_write(lambda: models.get_db().execute(
+            "INSERT INTO users (fio, email, password, role) VALUES ('Гонка', 'race@university.ru', '', 'staff')"))
+        return hash_passwords(items)
+
+    monkeypatch.setattr(provisioning, 'hash_passwords', hash_and_race)
+    with app.app_context():
+        report = provisioning.provision_users(
+            _rows('race@university.ru', 'fresh@university.ru', 'admin@university.ru'))
+    assert [p['email'] for p in report['created']] == ['fresh@university.ru']
+    assert sorted(item['email'] for item in report['skipped']) == ['admin@university.ru', 'race@university.ru']
+    with app.app_context():
+        assert models.get_user_by_email('fresh@university.ru') is not None
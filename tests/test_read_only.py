@@ -0,0 +1,33 @@
+# tests/test_read_only.py
+
+import sqlite3
+
+import pytest
+
+import app.models as models
+
+INSERT_FAQ = "INSERT INTO faq (question, answer) VALUES ('только чтение', '')"
+
+
+def test_get_request_gets_read_only_connection(app):
+    with app.test_request_context('/publications'):
+        app.preprocess_request()
+        db = models.get_db()
+        assert db.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute(INSERT_FAQ)
+
+
+def test_write_operation_is_rejected_on_get(app):
+    with app.test_request_context('/publications'):
+        app.preprocess_request()
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            models.delete_publication(-1)
+
+
+def test_post_and_writes_db_views_get_write_connection(app):
+    with app.test_request_context('/add_publication', method='POST'):
+        assert models.get_db().execute("PRAGMA query_only").fetchone()[0] == 0
+    # GET-обработчик, помеченный @writes_db
+    with app.test_request_context('/logout'):
+        assert models.get_db().execute("PRAGMA query_only").fetchone()[0] == 0
@@ -0,0 +1,98 @@
+# tests/test_records.py
+
+import csv
+import sqlite3
+from io import StringIO
+
+import pytest
+
+from app.records import columns, iter_records, records
+from tests.conftest import login, make_lecturer, make_publication
+
+
+class _Cursor(sqlite3.Cursor):
+    fetches = 0
+
+    def fetchmany(self, *args):
+        _Cursor.fetches += 1
+        return super().fetchmany(*args)
+
+
+class _Connection(sqlite3.Connection):
+    last = None
+
+    def execute(self, sql, params=()):
+        _Connection.last = self.cursor(_Cursor)
+        return _Connection.last.execute(sql, params)
+
+
+@pytest.fixture
+def numbers():
+    db = sqlite3.connect(':memory:', factory=_Connection)
+    db.execute("CREATE TABLE numbers (n INTEGER, square INTEGER)")
+    db.executemany("INSERT INTO numbers VALUES (?, ?)", [(n, n * n) for n in range(10)])
+    _Cursor.fetches = 0
+    yield db
+    db.close()
+
+
+def test_iter_records_streams_in_batches_and_closes_cursor(app, numbers):
+    sql = "SELECT n, square FROM numbers ORDER BY n"
+    expected = records(numbers, 'Number', sql)
+    with app.app_context():
+        rows = iter_records(numbers, 'Number', sql, batch=4)
+        cursor = _Connection.last
+        _Cursor.fetches = 0
+        first = next(rows)
+        assert _Cursor.fetches == 1
+        assert (first.n, first['square']) == (0, 0)
+        rest = list(rows)
+    # 4 + 4 + 2 строки и пустая выборка в конце
+    assert _Cursor.fetches == 4
+    assert [first] + rest == expected
+    assert rest[-1].keys() == ['n', 'square']
+    with pytest.raises(sqlite3.ProgrammingError):
+        cursor.fetchone()
+
+
+def test_iter_records_closes_cursor_when_abandoned(app, numbers):
+    with app.app_context():
+        rows = iter_records(numbers, 'Number', "SELECT n FROM numbers", batch=3)
+        cursor = _Connection.last
+        next(rows)
+        rows.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        cursor.fetchone()
+
+
+def test_iter_records_raises_query_errors_immediately(app, numbers):
+    with app.app_context():
+        with pytest.raises(sqlite3.OperationalError):
+            iter_records(numbers, 'Number', "SELECT missing FROM numbers")
+
+
+def test_columns_validates_projection():
+    assert columns(None, 'p.') == 'p.*'
+    assert columns(('id', 'fio'), 'l.') == 'l.id, l.fio'
+    with pytest.raises(ValueError):
+        columns(())
+    with pytest.raises(ValueError):
+        columns(('id', 'fio; DROP TABLE users'))
+
+
+def test_csv_export_is_streamed(app, client):
+    lecturer = make_lecturer(app, 'Выгрузкин Поток')
+    make_publication(app, 'Потоковая выгрузка; с разделителем', [lecturer], year=2021)
+    login(client, 'user@university.ru', 'user')
+
+    response = client.get('/staff/export_reports')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'filename=publications_report.csv' in response.headers['Content-Disposition']
+
+    rows = list(csv.reader(StringIO(response.get_data(as_text=True)), delimiter=';'))
+    response.close()
+    assert rows[0][:3] == ['ID', 'Название', 'Год']
+    assert ['Потоковая выгрузка; с разделителем', '2021'] in [row[1:3] for row in rows[1:]]
+    assert all(len(row) == len(rows[0]) for row in rows[1:])
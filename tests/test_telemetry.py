@@ -0,0 +1,91 @@
+# tests/test_telemetry.py
+
+import os
+import subprocess
+import sys
+
+from app import telemetry
+
+
+def _dead_pid():
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return child.pid
+
+
+def _snapshot_file(directory, pid, requests):
+    counters = {
+        ('http_requests_total', (('endpoint', 'main.index'),)): requests,
+        ('app_startup_seconds', (('pid', str(pid)),)): 1.5,
+    }
+    telemetry._write_json(directory, 'metrics-%d.json' % pid, telemetry._encode(counters, {}))
+
+
+def _requests(counters):
+    return counters.get(('http_requests_total', (('endpoint', 'main.index'),)), 0)
+
+
+def test_compact_merges_dead_processes(tmp_path):
+    directory = str(tmp_path)
+    dead = [_dead_pid(), _dead_pid()]
+    for pid in dead:
+        _snapshot_file(directory, pid, 3)
+    before = _requests(telemetry.collect(directory)[0])
+
+    assert telemetry.compact(directory) == 2
+    files = sorted(os.listdir(directory))
+    assert files == sorted(['metrics-%d.json' % os.getpid(), telemetry.RETIRED_FILE])
+    counters = telemetry.collect(directory)[0]
+    assert _requests(counters) == before
+    # Измерители умерших процессов не переносятся
+    assert not any(('pid', str(pid)) in labels for name, labels in counters for pid in dead)
+
+    # Следующий умерший воркер добавляется к уже слитым
+    _snapshot_file(directory, _dead_pid(), 4)
+    assert telemetry.compact(directory) == 1
+    assert _requests(telemetry.collect(directory)[0]) == before + 4
+
+
+def test_collect_skips_snapshots_already_merged(tmp_path):
+    directory = str(tmp_path)
+    pid = _dead_pid()
+    _snapshot_file(directory, pid, 5)
+    before = _requests(telemetry.collect(directory)[0])
+    telemetry.compact(directory)
+    # Снимок ещё не удалён (гонка с мастером) — он не должен учитываться дважды
+    _snapshot_file(directory, pid, 5)
+    assert _requests(telemetry.collect(directory)[0]) == before
+
+
+def _gauge(name):
+    key = (name, (('pid', os.getpid()),))
+    return telemetry.snapshot()[0].get(key)
+
+
+def test_startup_gauges_are_set_not_summed(app):
+    from app.startup import precompile_templates
+
+    precompile_templates(app)
+    precompile_templates(app)
+    assert _gauge('template_precompile_seconds') == app.config['TEMPLATE_PRECOMPILE_SECONDS']
+
+
+def test_worker_reports_startup_gauges_after_fork(app):
+    from app.startup import report_startup
+
+    app.config.setdefault('TEMPLATE_PRECOMPILE_SECONDS', 0.25)
+    telemetry._gauges.clear()  # так измерители выглядят в воркере после fork
+    report_startup(app)
+    report_startup(app)
+    assert _gauge('app_startup_seconds') == app.config['STARTUP_SECONDS']
+    assert _gauge('template_precompile_seconds') == app.config['TEMPLATE_PRECOMPILE_SECONDS']
+
+
+def test_first_request_gauge_is_recorded_once(app, client):
+    telemetry._seen_endpoints.discard('main.publications')
+    key = ('http_first_request_seconds', (('endpoint', 'main.publications'), ('pid', os.getpid())))
+    client.get('/publications')
+    first = telemetry.snapshot()[0][key]
+    client.get('/publications')
+    assert telemetry.snapshot()[0][key] == first
+    assert key in telemetry._gauges
@@ -0,0 +1,30 @@
+# tests/test_trends.py
+
+import app.models as models
+from app.trends import INDICATORS, TrendTable
+from tests.conftest import make_lecturer
+
+
+def _row(lecturer_id, year, value):
+    row = {name: value for name in INDICATORS}
+    row.update(lecturer_id=lecturer_id, year=year, department='Кафедра')
+    return row
+
+
+def test_trend_axis_ignores_out_of_range_years():
+    table = TrendTable([_row(1, 2022, 1), _row(1, 2023, 3), _row(1, 20230, 5)], 3, 0)
+    assert table.years == [2022, 2023]
+    points = table.for_lecturer(1)['h_index']['points']
+    assert [point['value'] for point in points] == [1, 3]
+
+
+def test_metrics_route_rejects_out_of_range_year(app, admin):
+    lecturer_id = make_lecturer(app, 'Опечатка Годова')
+    form = {name: '1' for name in ('total_publications', 'total_citations', 'h_index',
+                                   'rinz', 'scopus', 'wos', 'gs')}
+    response = admin.post('/metrics/%d' % lecturer_id, data=dict(form, year='20230'),
+                          follow_redirects=True)
+    assert 'Год должен быть числом от 2000 до 2100' in response.get_data(as_text=True)
+    with app.app_context():
+        assert models.get_db(write=False).execute(
+            "SELECT COUNT(*) FROM metrics WHERE lecturer_id = ?", (lecturer_id,)).fetchone()[0] == 0
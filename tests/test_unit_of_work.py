@@ -0,0 +1,75 @@
+# tests/test_unit_of_work.py
+
+from flask import Flask, flash, get_flashed_messages, redirect
+
+import app.models as models
+from app.writer import init_writer, write_operation
+from tests.conftest import login
+
+
+@write_operation
+def _insert_faq(question):
+    models.get_db().execute("INSERT INTO faq (question, answer) VALUES (?, '')", (question,))
+
+
+@write_operation
+def _fail():
+    models.get_db().execute("INSERT INTO no_such_table VALUES (1)")
+
+
+def _unit_app(app):
+    """Отдельное приложение только с единицей работы запроса."""
+    test_app = Flask(__name__)
+    test_app.secret_key = 'test'
+    test_app.config['PROPAGATE_EXCEPTIONS'] = False
+    init_writer(test_app)
+    test_app.teardown_appcontext(models.close_db)
+
+    @test_app.route('/ok', methods=['POST'])
+    def ok():
+        _insert_faq('из единицы работы')
+        flash('Сохранено успешно')
+        return redirect('/')
+
+    @test_app.route('/broken', methods=['POST'])
+    def broken():
+        _insert_faq('не должна сохраниться')
+        _fail()
+        flash('Сохранено успешно')
+        return redirect('/')
+
+    @test_app.route('/flashes')
+    def flashes():
+        return {'messages': get_flashed_messages()}
+
+    return test_app
+
+
+def _count(app, question):
+    with app.app_context():
+        return models.get_db(write=False).execute(
+            "SELECT COUNT(*) FROM faq WHERE question = ?", (question,)).fetchone()[0]
+
+
+def test_unit_commits_before_response(app):
+    client = _unit_app(app).test_client()
+    response = client.post('/ok')
+    assert response.status_code == 302
+    assert _count(app, 'из единицы работы') == 1
+    assert client.get('/flashes').json['messages'] == ['Сохранено успешно']
+
+
+def test_failed_commit_is_an_error_without_success_flash(app):
+    client = _unit_app(app).test_client()
+    response = client.post('/broken')
+    assert response.status_code == 500
+    assert _count(app, 'не должна сохраниться') == 0
+    assert client.get('/flashes').json['messages'] == []
+
+
+def test_add_user_with_existing_email(app, client):
+    login(client)
+    response = client.post('/admin/add_user', data={
+        'fio': 'Копия', 'email': 'admin@university.ru', 'password': 'x', 'role': 'staff'})
+    assert response.status_code == 200
+    assert 'уже существует' in response.get_data(as_text=True)
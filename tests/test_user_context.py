@@ -0,0 +1,46 @@
+# tests/test_user_context.py
+
+import time
+
+import app.models as models
+from app.writer import run_write
+from tests.conftest import make_lecturer
+
+
+def _make_user(app, email, lecturer_id):
+    with app.app_context():
+        def create():
+            return models.get_db().execute(
+                "INSERT INTO users (fio, email, password, role, lecturer_id) VALUES (?, ?, '', 'lecturer', ?)",
+                (email, email, lecturer_id)).lastrowid
+        return run_write(create)
+
+
+def test_delete_lecturer_invalidates_linked_user(app):
+    lecturer_id = make_lecturer(app, 'Удаляемый Кэшев')
+    user_id = _make_user(app, 'deleted-lecturer@university.ru', lecturer_id)
+    with app.app_context():
+        assert models.get_user_context(user_id)['lecturer_id'] == lecturer_id
+        models.delete_lecturer(lecturer_id)
+        assert models.get_user_context(user_id)['lecturer_id'] is None
+
+
+def test_merge_lecturers_invalidates_linked_user(app):
+    duplicate_id = make_lecturer(app, 'Дубль Кэшев')
+    target_id = make_lecturer(app, 'Основной Кэшев')
+    user_id = _make_user(app, 'merged-lecturer@university.ru', duplicate_id)
+    with app.app_context():
+        assert models.get_user_context(user_id)['lecturer_id'] == duplicate_id
+        models.merge_lecturers(duplicate_id, target_id)
+        assert models.get_user_context(user_id)['lecturer_id'] == target_id
+
+
+def test_expired_user_contexts_are_pruned(app):
+    stale = time.monotonic() - 1
+    models._user_context_cache.update({-1: (stale, None), -2: (stale, None)})
+    models._user_context_prune[0] = 0.0
+    models.invalidate_user_context(1)  # промах: чистка идёт при вставке
+    with app.app_context():
+        models.get_user_context(1)
+    assert -1 not in models._user_context_cache and -2 not in models._user_context_cache
+    assert 1 in models._user_context_cache
@@ -0,0 +1,15 @@
+# tests/test_utils.py
+
+import random
+import string
+
+from app.utils import generate_password
+
+
+def test_generate_password_does_not_depend_on_random_seed():
+    random.seed(0)
+    first = generate_password(10)
+    random.seed(0)
+    second = generate_password(10)
+    assert first != second
+    assert len(first) == 10 and set(first) <= set(string.ascii_letters + string.digits)
@@ -0,0 +1,32 @@
+# tests/test_viewmodels.py
+
+import pytest
+from flask import render_template_string
+
+import app.models as models
+from app.viewmodels import TemplateDatabaseAccess
+
+
+@pytest.fixture
+def strict(app):
+    app.config['TEMPLATE_STRICT_DB'] = True
+    yield app
+    app.config['TEMPLATE_STRICT_DB'] = False
+
+
+def _count_users():
+    return models.get_db(write=False).execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def test_strict_mode_rejects_queries_from_templates(strict):
+    with strict.test_request_context('/'):
+        with pytest.raises(TemplateDatabaseAccess):
+            render_template_string('{{ count() }}', count=_count_users)
+
+
+def test_failed_render_does_not_leave_strict_mode_on(strict):
+    with strict.test_request_context('/'):
+        with pytest.raises(ZeroDivisionError):
+            render_template_string('{{ 1 // 0 }}')
+        # Остаток запроса (например, обработчик ошибки) снова может читать БД
+        assert _count_users() > 0
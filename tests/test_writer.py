@@ -0,0 +1,76 @@
+# tests/test_writer.py
+
+import sqlite3
+
+import pytest
+
+import app.models as models
+from app import writer
+from app.writer import _Operation, _execute_batch, _writer_connect, after_commit, get_coordinator, run_write
+
+
+def _rollback_everything():
+    # Конфликт с OR ROLLBACK завершает всю транзакцию писателя
+    models.get_db().execute("INSERT OR ROLLBACK INTO users (id, email) VALUES (1, 'dup@example.com')")
+
+
+def _count(app, sql, params=()):
+    with app.app_context():
+        return models.get_db(write=False).execute(sql, params).fetchone()[0]
+
+
+def test_writer_survives_lost_transaction(app):
+    with app.app_context():
+        with pytest.raises(sqlite3.IntegrityError):
+            run_write(_rollback_everything)
+        assert get_coordinator().thread.is_alive()
+        # Следующие записи выполняются как обычно
+        run_write(lambda: models.get_db().execute(
+            "INSERT INTO faq (question, answer) VALUES ('после сбоя?', 'да')"))
+    assert _count(app, "SELECT COUNT(*) FROM faq WHERE question = 'после сбоя?'") == 1
+
+
+def test_lost_transaction_fails_whole_batch(app):
+    conn = writer._local.conn = _writer_connect()
+    try:
+        ok = _Operation(lambda: conn.execute("INSERT INTO faq (question, answer) VALUES ('в пачке', '')"))
+        bad = _Operation(lambda: conn.execute(
+            "INSERT OR ROLLBACK INTO users (id, email) VALUES (1, 'dup@example.com')"))
+        after = _Operation(lambda: conn.execute("INSERT INTO faq (question, answer) VALUES ('после', '')"))
+        _execute_batch(conn, [ok, bad, after], 0, 0)
+        for op in (ok, bad, after):
+            with pytest.raises(sqlite3.IntegrityError):
+                op.future.result(0)
+        assert not conn.in_transaction
+    finally:
+        writer._local.conn = None
+        conn.close()
+    assert _count(app, "SELECT COUNT(*) FROM faq WHERE question IN ('в пачке', 'после')") == 0
+
+
+def test_failing_after_commit_callback_keeps_result(app):
+    def op():
+        models.get_db().execute("INSERT INTO faq (question, answer) VALUES ('с обработчиком', '')")
+        after_commit(lambda: 1 / 0)
+        return 'ok'
+
+    with app.app_context():
+        assert run_write(op) == 'ok'
+        assert get_coordinator().thread.is_alive()
+        assert run_write(lambda: 42) == 42
+    assert _count(app, "SELECT COUNT(*) FROM faq WHERE question = 'с обработчиком'") == 1
+
+
+def test_failed_operation_rolls_back_only_itself(app):
+    conn = writer._local.conn = _writer_connect()
+    try:
+        ok = _Operation(lambda: conn.execute("INSERT INTO faq (question, answer) VALUES ('уцелевшая', '')"))
+        bad = _Operation(lambda: conn.execute("INSERT INTO no_such_table VALUES (1)"))
+        _execute_batch(conn, [ok, bad], 0, 0)
+        ok.future.result(0)
+        with pytest.raises(sqlite3.OperationalError):
+            bad.future.result(0)
+    finally:
+        writer._local.conn = None
+        conn.close()
+    assert _count(app, "SELECT COUNT(*) FROM faq WHERE question = 'уцелевшая'") == 1